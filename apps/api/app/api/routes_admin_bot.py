@@ -15,8 +15,9 @@ from app.services.admin_settings_service import (
     get_bool, set_bool,
     ADMIN_TASKS_TG_ENABLED_KEY, BONUS_TG_ENABLED_KEY, FINANCE_TG_ENABLED_KEY, ATTENDANCE_TG_ENABLED_KEY,
 )
-from app.services.bonus_metrics_service import compute_bonus_daily_context, compute_bonus_periodic_context
-from app.services.template_engine import render
+from app.services.metrics_engine import compute_daily_contexts, compute_periodic_contexts
+from app.services.metrics_reports import CHANNELS, daily_message, periodic_message, send_channel_report
+from app.services.sla_watchdog import sla_watchdog
 from app.services.telegram_notify import send_bonus_to_both
 
 IST = timezone("Europe/Istanbul")
@@ -73,14 +74,43 @@ def status(db: Session = Depends(get_db)):
     }
 
 # ---------------- Dahili ----------------
+def _must_channel_enabled(db: Session, channel: str):
+    if not get_bool(db, CHANNELS[channel][1], False):
+        raise HTTPException(status_code=400, detail=f"{channel} notifications disabled")
+
 def _must_bonus_enabled(db: Session):
-    if not get_bool(db, BONUS_TG_ENABLED_KEY, False):
-        raise HTTPException(status_code=400, detail="bonus notifications disabled")
+    _must_channel_enabled(db, "bonus")
 
-def _send_bonus_or_400(message: str):
-    if not send_bonus_to_both(message):
+def _send_or_400(channel: str, message: str):
+    if not send_channel_report(channel, message):
         raise HTTPException(status_code=400, detail="send failed")
 
+def _parse_day_or_yesterday(d: str | None) -> date:
+    if d:
+        try: y,m,dd = map(int, d.split("-")); return date(y,m,dd)
+        except Exception: raise HTTPException(status_code=400, detail="d format YYYY-MM-DD")
+    return (datetime.now(IST) - timedelta(days=1)).date()
+
+def _parse_end_or_now(end: str | None) -> datetime:
+    if end:
+        try: return IST.localize(datetime.strptime(end, "%Y-%m-%dT%H:%M"))
+        except Exception: raise HTTPException(status_code=400, detail="end format YYYY-MM-DDTHH:MM")
+    return datetime.now(IST)
+
+def _trigger_daily(db: Session, channel: str, d: str | None, sla_first_sec: int):
+    _must_channel_enabled(db, channel)
+    target = _parse_day_or_yesterday(d)
+    ctx = compute_daily_contexts(db, target, sla_first_sec=sla_first_sec, channels=(channel,))[channel]
+    _send_or_400(channel, daily_message(db, channel, ctx, sla_first_sec=sla_first_sec))
+    return {"ok": True, "date": ctx["date_label"]}
+
+def _trigger_periodic(db: Session, channel: str, end: str | None, kt30_sec: int):
+    _must_channel_enabled(db, channel)
+    end_ist = _parse_end_or_now(end)
+    ctx = compute_periodic_contexts(db, end_ist, hours=2, kt30_sec=kt30_sec, channels=(channel,))[channel]
+    _send_or_400(channel, periodic_message(db, channel, ctx, kt30_sec=kt30_sec))
+    return {"ok": True, "window": f"{ctx['win_start']}-{ctx['win_end']}", "date": ctx["date_label"]}
+
 # ---------------- BONUS: Gün Sonu ----------------
 @router.post("/trigger/bonus/daily", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
 def trigger_bonus_daily(
@@ -88,47 +118,7 @@ def trigger_bonus_daily(
     sla_first_sec: int = Query(60, ge=1, le=3600),
     db: Session = Depends(get_db),
 ):
-    _must_bonus_enabled(db)
-    now_ist = datetime.now(IST)
-    if d:
-        try: y,m,dd = map(int, d.split("-")); target = date(y,m,dd)
-        except Exception: raise HTTPException(status_code=400, detail="d format YYYY-MM-DD")
-    else:
-        target = (now_ist - timedelta(days=1)).date()
-
-    ctx = compute_bonus_daily_context(db, target, sla_first_sec=sla_first_sec)
-
-    slow_text = "\n".join(
-        [f"- {i.get('full_name','-')} — {int(i.get('gt60_cnt') or 0)} işlem" for i in ctx["slow_list"]]
-    ) or "- —"
-    per_emp_text = "\n".join(
-        [f"- {i.get('full_name','-')} — {int(i.get('close_cnt') or 0)} işlem • Ø "
-         f"{(str(int(round(i['avg_first_emp'])))+' sn') if i.get('avg_first_emp') is not None else '—'}"
-         for i in ctx["per_emp"]]
-    ) or "- —"
-
-    msg = render(
-        db, "bonus_daily_v2",
-        {
-            "date": ctx["date_label"],
-            "total_close": ctx["total_close"],
-            "avg_first": (ctx["avg_first_sec"] if ctx["avg_first_sec"] is not None else "—"),
-            "gt60_total": ctx["gt60_total"],
-            "slow_list_text": slow_text,
-            "per_emp_text": per_emp_text,
-        },
-        fallback=(
-            "📊 *BONUS GÜN SONU RAPORU — {date}*\n"
-            "- *Toplam Kapanış:* {total_close}\n"
-            "- *Ø İlk Yanıt:* {avg_first} sn\n"
-            "- *60 sn üzeri işlemler:* {gt60_total}\n\n"
-            "⚠️ *Geç Yanıt Verenler (60 sn üzeri)*\n{slow_list_text}\n\n"
-            "👥 *Personel Bazlı İşlem Sayıları*\n{per_emp_text}"
-        ),
-        channel="bonus",
-    )
-    _send_bonus_or_400(msg)
-    return {"ok": True, "date": ctx["date_label"]}
+    return _trigger_daily(db, "bonus", d, sla_first_sec)
 
 # ---------------- BONUS: 2 Saatlik ----------------
 @router.post("/trigger/bonus/periodic", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
@@ -137,42 +127,24 @@ def trigger_bonus_periodic(
     kt30_sec: int = Query(30, ge=1, le=3600),
     db: Session = Depends(get_db),
 ):
-    _must_bonus_enabled(db)
-    if end:
-        try: end_ist = IST.localize(datetime.strptime(end, "%Y-%m-%dT%H:%M"))
-        except Exception: raise HTTPException(status_code=400, detail="end format YYYY-MM-DDTHH:MM")
-    else:
-        end_ist = datetime.now(IST)
+    return _trigger_periodic(db, "bonus", end, kt30_sec)
 
-    ctx = compute_bonus_periodic_context(db, end_ist, hours=2, kt30_sec=kt30_sec)
+# ---------------- FİNANS: Gün Sonu / 2 Saatlik ----------------
+@router.post("/trigger/finance/daily", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
+def trigger_finance_daily(
+    d: str | None = Query(None, description="YYYY-MM-DD (default: yesterday IST)"),
+    sla_first_sec: int = Query(60, ge=1, le=3600),
+    db: Session = Depends(get_db),
+):
+    return _trigger_daily(db, "finans", d, sla_first_sec)
 
-    per_emp_text = "\n".join(
-        [f"- {i.get('full_name','-')} — *{int(i.get('close_cnt') or 0)}* işlem" for i in ctx.get("per_emp", [])]
-    ) or "- —"
-    slow30_list = ctx.get("slow_30", [])
-    slow30_text = "\n".join(
-        [f"- {i.get('full_name','-')} — *{int(i.get('gt30_cnt') or 0)}* işlem" for i in slow30_list]
-    )
-    slow30_block = f"\n\n⚠️ *{kt30_sec} sn üzeri İlk KT*\n{slow30_text}" if slow30_text else ""
-
-    msg = render(
-        db, "bonus_periodic_v2",
-        {
-            "date": ctx["date_label"],
-            "win_start": ctx["win_start"], "win_end": ctx["win_end"],
-            "total_close": ctx["total_close"],
-            "per_emp_text": per_emp_text,
-            "slow30_block": slow30_block,
-        },
-        fallback=(
-            "⏱️ *BONUS 2 SAATLİK RAPOR* — *{date} {win_start}–{win_end}*\n\n"
-            "• *Toplam Kapanış:* {total_close}\n\n"
-            "👤 *Personel Bazında*\n{per_emp_text}{slow30_block}"
-        ),
-        channel="bonus",
-    )
-    _send_bonus_or_400(msg)
-    return {"ok": True, "window": f"{ctx['win_start']}-{ctx['win_end']}", "date": ctx["date_label"]}
+@router.post("/trigger/finance/periodic", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
+def trigger_finance_periodic(
+    end: str | None = Query(None, description="IST bitiş (YYYY-MM-DDTHH:MM); default=now"),
+    kt30_sec: int = Query(30, ge=1, le=3600),
+    db: Session = Depends(get_db),
+):
+    return _trigger_periodic(db, "finans", end, kt30_sec)
 
 # ---------------- BONUS: Gün içi İlk KT aşımı — TELEGRAM'a gönder (origin METNİ + cevaplayan AD) ----------------
 def _today_edges_utc():
@@ -183,6 +155,11 @@ def _today_edges_utc():
 def _mmss(seconds: float) -> str:
     s = max(0, int(round(seconds))); return f"{s//60:02d}:{s%60:02d}"
 
+# Anlık uyarılar ingest'e bağlı sla_watchdog'dan gelir; aşağıdaki uç gün içi özet (geriye dönük tarama)
+@router.get("/sla-watchdog", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
+def sla_watchdog_status():
+    return sla_watchdog.snapshot()
+
 class KtOverSendResp(BaseModel):
     model_config = ConfigDict(from_attributes=False)
     threshold_sec: int
@@ -210,29 +187,13 @@ def trigger_bonus_kt_over_today(
     # Origin metnini raw_messages.json'dan, cevaplayan adını employees.full_name'den al.
     sql = """
     WITH
-    o_ev AS (
-      SELECT DISTINCT ON (e.correlation_id)
-             e.correlation_id AS corr,
-             e.ts AS origin_ts,
-             e.chat_id, e.msg_id
-      FROM events e
-      WHERE e.source_channel='bonus' AND e.type='origin'
-      ORDER BY e.correlation_id, e.ts ASC
-    ),
-    fr_ev AS (
-      SELECT DISTINCT ON (e.correlation_id)
-             e.correlation_id AS corr,
-             e.ts AS first_ts,
-             e.employee_id
-      FROM events e
-      WHERE e.source_channel='bonus' AND e.type='reply_first'
-      ORDER BY e.correlation_id, e.ts ASC
-    ),
     base AS (
-      SELECT f.corr, f.first_ts, o.origin_ts, o.chat_id, o.msg_id, f.employee_id
-      FROM fr_ev f
-      JOIN o_ev o ON o.corr = f.corr
-      WHERE f.first_ts >= :frm AND f.first_ts <= :to
+      SELECT t.correlation_id AS corr, t.first_reply_ts AS first_ts, t.origin_ts,
+             t.chat_id, t.origin_msg_id AS msg_id, t.first_reply_emp AS employee_id
+      FROM threads t
+      WHERE t.source_channel='bonus'
+        AND t.first_reply_ts >= :frm AND t.first_reply_ts <= :to
+        AND t.origin_ts IS NOT NULL
     ),
     secs AS (
       SELECT b.*, EXTRACT(EPOCH FROM (b.first_ts - b.origin_ts)) AS first_sec
@@ -6,7 +6,7 @@ from datetime import datetime, timezone, timedelta
 
 from app.deps import get_db, RolesAllowed
 from app.models.events import Event
-from app.models.facts import FactDaily
+from app.models.facts import FactDaily, FactMonthly
 
 router = APIRouter(prefix="/employees", tags=["employees-view"])
 
@@ -51,10 +51,8 @@ def employee_daily(
     to: str | None = Query(None),
     db: Session = Depends(get_db),
 ):
-    # facts_daily.actor_key yerine ileride employee_id kolonu açarız; şimdilik actor_key = employee_id formatına geçmedik.
-    # Geçici çözüm: facts_daily tarafını employee_id ile tutmadıysak bu uç sadece events’ten derive edilenleri gösterir.
-    # Eğer facts_daily.actor_key yerine employee_id’yi yazıyorsan aşağıdaki satırı ona göre değiştir.
-    q = db.query(FactDaily).filter(FactDaily.actor_key == employee_id).order_by(FactDaily.day.asc())
+    # employee_id derive'da / identity bind'da yazılır → (employee_id, day) index aralığı
+    q = db.query(FactDaily).filter(FactDaily.employee_id == employee_id).order_by(FactDaily.day.asc())
     # Tarih aralığı
     d_from = frm or None
     d_to = to or None
@@ -66,6 +64,42 @@ def employee_daily(
     return [
         {
             "day": r.day.isoformat(),
+            "actor_key": r.actor_key,
+            "kpi_code": r.kpi_code,
+            "value": r.value,
+            "samples": r.samples,
+            "source": r.source,
+        }
+        for r in rows
+    ]
+
+def _parse_period(s: str | None):
+    if not s: return None
+    try:
+        return datetime.strptime(s, "%Y-%m").strftime("%Y-%m")
+    except Exception:
+        raise HTTPException(status_code=400, detail="period must be YYYY-MM")
+
+@router.get("/{employee_id}/monthly", dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))])
+def employee_monthly(
+    employee_id: str,
+    frm: str | None = Query(None, alias="from", description="YYYY-MM"),
+    to: str | None = Query(None, description="YYYY-MM (dahil)"),
+    db: Session = Depends(get_db),
+):
+    # Yalnızca facts_monthly rollup'ı okunur (facts_daily taranmaz); (employee_id, period) index aralığı
+    q = db.query(FactMonthly).filter(FactMonthly.employee_id == employee_id)
+    p_from = _parse_period(frm)
+    p_to = _parse_period(to)
+    if p_from:
+        q = q.filter(FactMonthly.period >= p_from)
+    if p_to:
+        q = q.filter(FactMonthly.period <= p_to)
+    rows = q.order_by(FactMonthly.period.asc(), FactMonthly.kpi_code.asc()).all()
+    return [
+        {
+            "period": r.period,
+            "actor_key": r.actor_key,
             "kpi_code": r.kpi_code,
             "value": r.value,
             "samples": r.samples,
@@ -1,14 +1,19 @@
 # apps/api/app/api/routes_identities.py
 from fastapi import APIRouter, Depends, HTTPException, Query
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from sqlalchemy import insert, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
 from datetime import datetime, timedelta, timezone
 
 from app.deps import get_db, RolesAllowed
 from app.models.identities import EmployeeIdentity
 from app.models.models import Employee
-from app.models.events import Event
+from app.services.employee_ids import allocate_rd_ids
+from app.services.facts_service import rekey_facts
+from app.services.identity_resolver import identity_cache
+from app.services.threads_service import attribute_actor_events
+from app.services.report_cache import report_cache
 
 router = APIRouter(prefix="/identities", tags=["identities"])
 
@@ -24,31 +29,20 @@ def _parse_actor_key(key: str):
         return ("uname", key.split(":", 1)[1])
     return (None, None)
 
-def _next_rd_id(db: Session) -> str:
-    last = (
-        db.query(Employee)
-        .filter(Employee.employee_id.like("RD-%"))
-        .order_by(Employee.employee_id.desc())
-        .first()
-    )
-    last_num = 0
-    if last and last.employee_id.startswith("RD-"):
-        try:
-            last_num = int(last.employee_id.split("-", 1)[1])
-        except Exception:
-            last_num = 0
-    next_num = last_num + 1
-    return f"RD-{next_num:03d}"
-
 # ---------------- models ----------------
 class BindIn(BaseModel):
     actor_key: str
     create_full_name: str | None = None
     employee_id: str | None = None            # boşsa RD-xxx otomatik
     create_department: str | None = None      # "Call Center" | "Canlı" | "Finans" | "Bonus" | "Admin"
-    retro_days: int = 14
+    retro_days: int | None = Field(14, ge=0)  # None → tüm geçmiş
 
 # --------------- endpoints ----------------
+@router.get("/cache/stats", dependencies=[Depends(RolesAllowed("super_admin", "admin"))])
+def identity_cache_stats():
+    """Ingest yolundaki actor_key cache'inin hit/miss sayaçları."""
+    return identity_cache.stats()
+
 @router.get("/pending", dependencies=[Depends(RolesAllowed("super_admin", "admin"))])
 def list_pending(
     limit: int = 50,
@@ -111,7 +105,7 @@ def bind_identity(
             db.add(emp)
     else:
         # RD-xxx üret
-        emp_id = _next_rd_id(db)
+        emp_id = allocate_rd_ids(db)[0]
         full_name = (create_full_name or rec.hint_name or f"Personel {emp_id}").strip() or f"Personel {emp_id}"
         emp = Employee(
             employee_id=emp_id,
@@ -135,20 +129,49 @@ def bind_identity(
     rec.status = "confirmed"
     db.add(rec)
 
-    # 5) Geriye dönük eventlere employee_id yaz
-    if kind and retro_days > 0:
-        since = datetime.now(timezone.utc) - timedelta(days=retro_days)
-        if kind == "uid":
-            q = db.query(Event).filter(and_(Event.from_user_id == tg_uid, Event.ts >= since))
-        else:
-            q = db.query(Event).filter(and_(Event.from_username == tg_uname, Event.ts >= since))
-        for e in q.all():
-            if not e.employee_id:
-                e.employee_id = emp.employee_id
-                db.add(e)
+    # 5) Geriye dönük eventlere employee_id yaz (tek UPDATE; retro_days None → tüm geçmiş, 0 → hiç)
+    attributed = {"events": 0, "threads": 0}
+    if kind and (retro_days is None or retro_days > 0):
+        since = datetime.now(timezone.utc) - timedelta(days=retro_days) if retro_days else None
+        attributed = attribute_actor_events(
+            db, emp.employee_id, from_user_id=tg_uid, from_username=tg_uname, since=since
+        )
+
+    # 6) facts_daily/monthly: actor'ın tüm geçmiş satırları employee_id'ye bağlanır (retro_days'ten bağımsız)
+    db.flush()
+    rekeyed = rekey_facts(db, [actor_key])
 
+    report_cache.bump(db)  # geçmiş eventlerin employee_id'si değişti (aynı transaction)
     db.commit()
-    return {"ok": True, "actor_key": actor_key, "employee_id": emp.employee_id, "retro_days": retro_days}
+    identity_cache.invalidate([actor_key])
+    return {
+        "ok": True, "actor_key": actor_key, "employee_id": emp.employee_id, "retro_days": retro_days,
+        "events_updated": attributed["events"], "threads_updated": attributed["threads"],
+        "facts_rekeyed": rekeyed["facts_daily"],
+    }
+
+# Aralıktaki eventlerin actor_key'leri; her key için en yeni eventi (DISTINCT ON) ipucu kaynağıdır:
+# mesai payload'ındaki 'person' > yoksa username. Kaydı olan key'ler anti-join ile elenir.
+_DISCOVER_SQL = text("""
+SELECT DISTINCT ON (a.actor_key)
+  a.actor_key,
+  COALESCE(
+    CASE WHEN a.source_channel = 'mesai' THEN NULLIF(a.payload_json ->> 'person', '') END,
+    NULLIF(ltrim(a.from_username, '@'), '')
+  ) AS hint_name
+FROM (
+  SELECT e.ts, e.source_channel, e.payload_json, e.from_username,
+    CASE
+      WHEN e.from_user_id IS NOT NULL AND e.from_user_id <> 0 THEN 'uid:' || e.from_user_id
+      WHEN COALESCE(e.from_username, '') <> '' THEN 'uname:' || e.from_username
+    END AS actor_key
+  FROM events e
+  WHERE CAST(:since AS TIMESTAMP) IS NULL OR e.ts >= :since
+) a
+WHERE a.actor_key IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM employee_identities ei WHERE ei.actor_key = a.actor_key)
+ORDER BY a.actor_key, a.ts DESC
+""")
 
 @router.api_route("/backfill-from-events", methods=["GET", "POST"], dependencies=[Depends(RolesAllowed("super_admin", "admin"))])
 def backfill_from_events(
@@ -168,71 +191,39 @@ def backfill_from_events(
     if since_days > 0:
         since_ts = datetime.now(timezone.utc) - timedelta(days=since_days)
 
-    # 2) eventleri çek
-    q = db.query(Event.from_user_id, Event.from_username, Event.source_channel, Event.payload_json, Event.ts)
-    if since_ts:
-        q = q.filter(Event.ts >= since_ts)
-    q = q.order_by(Event.ts.desc())
-    evs = q.all()
-
-    # 3) var olan keys
-    existing_keys = {r.actor_key for r in db.query(EmployeeIdentity.actor_key).all()}
-
-    found: dict[str, tuple[str | None, str | None]] = {}
-
-    for uid, uname, ch, payload, _ in evs:
-        # actor_key
-        key = None
-        if uid:
-            key = f"uid:{uid}"
-        elif uname:
-            key = f"uname:{uname}"
-        if not key or key in existing_keys or key in found:
-            continue
-
-        # hint: mesai person adı > yoksa username
-        hint_name = None
-        if ch == "mesai":
-            try:
-                hint_name = (payload or {}).get("person") or None
-            except Exception:
-                hint_name = None
-        if not hint_name and uname:
-            hint_name = str(uname).lstrip("@")
-
-        found[key] = (hint_name, ch)
+    # 2) yeni actor_key'ler + ipuçları (SQL'de; yalnızca identity kaydı olmayanlar döner)
+    found = {r.actor_key: r.hint_name for r in db.execute(_DISCOVER_SQL, {"since": since_ts})}
 
     pending_inserted = 0
     auto_created = 0
-
-    for key, (hint_name, _ch) in found.items():
-        if not auto_create:
-            db.add(EmployeeIdentity(actor_key=key, status="pending", hint_name=hint_name))
-            pending_inserted += 1
-        else:
-            emp_id = _next_rd_id(db)
-            full_name = (hint_name or f"Personel {emp_id}").strip()
-            emp = Employee(
-                employee_id=emp_id,
-                full_name=full_name,
-                email=None,
-                department=None,
-                title=None,
-                hired_at=None,
-                status="active",
-            )
-            db.add(emp)
-            db.flush()
-            db.add(EmployeeIdentity(actor_key=key, employee_id=emp.employee_id, status="confirmed", hint_name=hint_name))
-            auto_created += 1
+    created_keys: list[str] = []
+
+    if found and not auto_create:
+        rows = [{"actor_key": k, "status": "pending", "hint_name": h, "hint_team": None} for k, h in found.items()]
+        db.execute(pg_insert(EmployeeIdentity).on_conflict_do_nothing(constraint="uq_identity_actor_key"), rows)
+        pending_inserted = len(rows)
+    elif found:
+        emp_rows, id_rows = [], []
+        for (key, hint_name), emp_id in zip(found.items(), allocate_rd_ids(db, len(found))):
+            emp_rows.append({
+                "employee_id": emp_id,
+                "full_name": (hint_name or f"Personel {emp_id}").strip(),
+                "email": None, "department": None, "title": None, "hired_at": None, "status": "active",
+            })
+            id_rows.append({"actor_key": key, "employee_id": emp_id, "status": "confirmed", "hint_name": hint_name})
+        db.execute(insert(Employee), emp_rows)
+        db.execute(insert(EmployeeIdentity), id_rows)
+        auto_created = len(emp_rows)
+        created_keys = list(found)
+        rekey_facts(db, created_keys)
 
     db.commit()
+    identity_cache.invalidate(list(found.keys()))
     return {
         "ok": True,
         "since_days": since_days,
         "pending_inserted": pending_inserted,
         "auto_created_employees": auto_created,
-        "scanned_events": len(evs),
         "new_actor_keys": len(found),
     }
 
@@ -256,6 +247,7 @@ def enrich_hints_for_pending(
         return {"ok": True, "updated": 0, "reason": "no pending"}
 
     updated = 0
+    updated_keys: list[str] = []
     from datetime import datetime, timedelta, timezone
     since_ts = None
     if since_days > 0:
@@ -324,6 +316,8 @@ def enrich_hints_for_pending(
             rec.hint_name = name_hint
             db.add(rec)
             updated += 1
+            updated_keys.append(rec.actor_key)
 
     db.commit()
+    identity_cache.invalidate(updated_keys)
     return {"ok": True, "updated": updated}
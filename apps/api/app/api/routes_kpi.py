@@ -0,0 +1,53 @@
+# apps/api/app/api/routes_kpi.py
+from datetime import datetime, timedelta
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from app.core.kpi_catalog import CATALOG_VERSION, KPI_CATALOG
+from app.deps import get_db, RolesAllowed
+from app.services.kpi_scoring import kpi_score_cache, leaderboard
+from app.services.metrics_engine import IST
+
+router = APIRouter(prefix="/kpi", tags=["kpi"])
+
+
+def _parse_day(s: str | None, default):
+    if not s:
+        return default
+    try:
+        return datetime.strptime(s, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+
+
+@router.get("/catalog", dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))])
+def kpi_catalog():
+    return {"version": CATALOG_VERSION, "items": [k._asdict() for k in KPI_CATALOG.values()]}
+
+
+@router.get("/leaderboard", dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))])
+def kpi_leaderboard(
+    frm: str | None = Query(None, description="YYYY-MM-DD (varsayılan: son 30 gün)"),
+    to: str | None = Query(None, description="YYYY-MM-DD (dahil, varsayılan: dün)"),
+    department: str | None = Query(None),
+    limit: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    """facts_daily'den katalog hedef/ağırlıklarıyla KPI skorları ve genel skor sıralaması."""
+    yesterday = datetime.now(IST).date() - timedelta(days=1)
+    d_to = _parse_day(to, yesterday)
+    d_from = _parse_day(frm, d_to - timedelta(days=29))
+    if d_from > d_to or (d_to - d_from).days > 366:
+        raise HTTPException(status_code=400, detail="invalid range (max 366 days)")
+    return {
+        "frm": d_from.isoformat(),
+        "to": d_to.isoformat(),
+        "catalog_version": CATALOG_VERSION,
+        "items": leaderboard(db, d_from, d_to, limit=limit, department=department),
+    }
+
+
+@router.get("/cache/stats", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
+def kpi_cache_stats():
+    return kpi_score_cache.stats()
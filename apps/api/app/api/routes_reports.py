@@ -1,13 +1,29 @@
 # apps/api/app/api/routes_reports.py
-from fastapi import APIRouter, Depends, Query, HTTPException
+import csv
+import io
+import json
+from urllib.parse import urlencode
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import BigInteger, case, func, tuple_
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
-from statistics import mean
 from typing import Literal, Dict, List, Tuple
 
+from app.core.config import settings
+from app.db.session import SessionLocal
 from app.deps import get_db, RolesAllowed
-from app.models.events import Event, RawMessage
+from app.models.events import Thread
 from app.models.models import Employee
+from app.services.close_time_service import (
+    compute_close_time_rows, page_close_time_rows, team_baseline_cache,
+)
+from app.services.metrics_engine import IST, _ist_day_edges_utc, compute_daily_series
+from app.services.response_time_service import (
+    DEFAULT_BUCKET_EDGES, compute_response_time_distribution,
+)
+from app.services.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from app.services.report_cache import CachedReport, report_cache, data_version, is_closed_range
 
 router = APIRouter(prefix="/reports", tags=["reports"])
 
@@ -21,51 +37,46 @@ def _parse_date(s: str | None):
     except Exception:
         raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
 
-def _sign_emoji(pct: float | None) -> str:
-    if pct is None:
-        return "⚪"
-    if pct > 3:
-        return "🔴⬆️"
-    if pct < -3:
-        return "🟢⬇️"
-    return "⚪"  # ±3%
-
-def _root_origin_ts(chat_id: int, start_msg_id: int, db: Session, cache: Dict[Tuple[int,int], datetime | None]) -> datetime | None:
-    """Reply zincirini yukarı takip edip kök origin ts döndürür."""
-    current_id = start_msg_id
-    visited = set()
-    while True:
-        key = (chat_id, current_id)
-        if key in cache:
-            return cache[key]
-        if key in visited:
-            cache[key] = None
-            return None
-        visited.add(key)
-
-        raw: RawMessage | None = (
-            db.query(RawMessage)
-            .filter(RawMessage.chat_id == chat_id, RawMessage.msg_id == current_id)
-            .first()
-        )
-        if not raw:
-            cache[key] = None
-            return None
+def _cached(request: Request, response: Response, db: Session, dt_to: datetime | None, compute):
+    """
+    Sonuç cache'i + ETag. compute() → (gövde, ek header'lar).
+    dt_to verilirse ve geçmişte kalmışsa aralık kapalı sayılır (versiyon yalnızca bump ile değişir).
+    If-None-Match eşleşirse hesaplamadan 304 döner.
+    """
+    closed = dt_to is not None and is_closed_range(dt_to)
+    key = request.url.path + "?" + urlencode(sorted(request.query_params.multi_items()))
+    etag = report_cache.etag_for(key, data_version(db, closed))
+    cc = f"private, max-age={settings.REPORT_CACHE_CLOSED_MAX_AGE_SEC}" if closed else "private, no-cache"
+    headers = {"ETag": etag, "Cache-Control": cc}
+
+    inm = request.headers.get("if-none-match") or ""
+    if etag in [t.strip() for t in inm.split(",")]:
+        report_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    hit = report_cache.get(key, etag)
+    if hit is None:
+        body, extra = compute()
+        hit = CachedReport(etag, body, extra)
+        report_cache.put(key, hit, closed)
+    response.headers.update({**hit.headers, **headers})
+    return hit.body
+
+def _page_headers(next_cursor: str | None) -> Dict[str, str]:
+    # Gövde liste olarak kalır (frontend uyumu); devam token'ı header'da
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+def _close_time_page(rows: list, order: str, limit: int, offset: int, cursor: str | None):
+    try:
+        page, next_cursor = page_close_time_rows(rows, order, limit, offset, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return page, _page_headers(next_cursor)
 
-        try:
-            j = raw.json or {}
-            rt = j.get("message") or j.get("edited_message") or j.get("channel_post") or j.get("edited_channel_post") or {}
-            replied = rt.get("reply_to_message") or {}
-            parent_id = replied.get("message_id")
-        except Exception:
-            parent_id = None
-
-        if parent_id:
-            current_id = int(parent_id)
-            continue
-        else:
-            cache[(chat_id, start_msg_id)] = raw.ts
-            return raw.ts
+@router.get("/cache/stats", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
+def report_cache_stats():
+    """Rapor sonuç cache'inin hit/miss/304 sayaçları (+ close-time ekip bazı gün kovaları)."""
+    return {**report_cache.stats(), "team_baseline": team_baseline_cache.stats()}
 
 # ---------- BONUS: kişi bazlı kapanış ve ilk yanıt raporu (sn) ----------
 @router.get(
@@ -73,12 +84,15 @@ def _root_origin_ts(chat_id: int, start_msg_id: int, db: Session, cache: Dict[Tu
     dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
 )
 def bonus_close_time(
+    request: Request,
+    response: Response,
     frm: str | None = Query(None, description="YYYY-MM-DD (default: son 7 gün)"),
     to: str | None = Query(None, description="YYYY-MM-DD (exclusive, default: bugün+1)"),
     order: Literal["avg_asc","avg_desc","cnt_desc"] = Query("avg_asc"),
     limit: int = Query(500, ge=1, le=500),
     offset: int = Query(0, ge=0),
     min_kt: int = Query(5, ge=0, le=1000, description="En az kaç reply_first (KT) olan personel dahil edilsin"),
+    cursor: str | None = Query(None, description="Önceki yanıttaki X-Next-Cursor (verilirse offset yok sayılır)"),
     db: Session = Depends(get_db),
 ):
     """
@@ -91,127 +105,16 @@ def bonus_close_time(
     dt_to = _parse_date(to) or (datetime.now(timezone.utc) + timedelta(days=1))
     dt_from = _parse_date(frm) or (dt_to - timedelta(days=7))
 
-    trend_to = datetime.now(timezone.utc) + timedelta(days=1)
-    trend_from = trend_to - timedelta(days=7)
-
-    # Bonus çalışanları
-    bonus_emp_rows = db.query(Employee.employee_id, Employee.full_name, Employee.department)\
-                       .filter(Employee.department == "Bonus").all()
-    bonus_emp_ids = {r[0] for r in bonus_emp_rows}
-    emp_info = {r[0]: (r[1] or r[0], r[2] or "Bonus") for r in bonus_emp_rows}
-    if not bonus_emp_ids:
-        return []
-
-    close_types = ("reply_close", "approve", "reject")
-
-    first_rows: List[Event] = (
-        db.query(Event)
-        .filter(
-            Event.source_channel == "bonus",
-            Event.type == "reply_first",
-            Event.employee_id.isnot(None),
-            Event.employee_id.in_(bonus_emp_ids),
-            Event.ts >= dt_from, Event.ts < dt_to,
-        ).order_by(Event.ts.asc()).all()
-    )
-    close_rows: List[Event] = (
-        db.query(Event)
-        .filter(
-            Event.source_channel == "bonus",
-            Event.type.in_(close_types),
-            Event.employee_id.isnot(None),
-            Event.employee_id.in_(bonus_emp_ids),
-            Event.ts >= dt_from, Event.ts < dt_to,
-        ).order_by(Event.ts.asc()).all()
-    )
-    if not first_rows and not close_rows:
-        return []
-
-    # Kişi bazında metrikler + KT sayacı
-    root_cache: Dict[Tuple[int,int], datetime | None] = {}
-    per_emp_first_secs: Dict[str, List[float]] = {}
-    per_emp_close_secs: Dict[str, List[float]] = {}
-    per_emp_first_count: Dict[str, int] = {}
-
-    for e in first_rows:
-        rts = _root_origin_ts(e.chat_id, e.msg_id, db, root_cache)
-        if not rts: 
-            continue
-        sec = (e.ts - rts).total_seconds()
-        if sec >= 0:
-            per_emp_first_secs.setdefault(e.employee_id, []).append(sec)
-            per_emp_first_count[e.employee_id] = per_emp_first_count.get(e.employee_id, 0) + 1  # KT++
-
-    for e in close_rows:
-        rts = _root_origin_ts(e.chat_id, e.msg_id, db, root_cache)
-        if not rts: 
-            continue
-        sec = (e.ts - rts).total_seconds()
-        if sec >= 0:
-            per_emp_close_secs.setdefault(e.employee_id, []).append(sec)
-
-    if not per_emp_close_secs:
-        return []
-
-    # Ekip Ø (trend baz)
-    team_close_trend_rows: List[Event] = (
-        db.query(Event)
-        .filter(
-            Event.source_channel == "bonus",
-            Event.type.in_(close_types),
-            Event.employee_id.isnot(None),
-            Event.employee_id.in_(bonus_emp_ids),
-            Event.ts >= trend_from, Event.ts < trend_to,
-        ).all()
-    )
-    team_root_cache: Dict[Tuple[int,int], datetime | None] = {}
-    team_secs: List[float] = []
-    for e in team_close_trend_rows:
-        rts = _root_origin_ts(e.chat_id, e.msg_id, db, team_root_cache)
-        if not rts: 
-            continue
-        sec = (e.ts - rts).total_seconds()
-        if sec >= 0:
-            team_secs.append(sec)
-    team_avg_close_sec = mean(team_secs) if team_secs else None
-
-    rows = []
-    for emp_id, close_secs in per_emp_close_secs.items():
-        # KT eşiği
-        kt_cnt = per_emp_first_count.get(emp_id, 0)
-        if min_kt > 0 and kt_cnt < min_kt:
-            continue
-
-        full_name, dept = emp_info.get(emp_id, (emp_id, "Bonus"))
-        avg_close_sec = mean(close_secs)
-        first_secs = per_emp_first_secs.get(emp_id, [])
-        avg_first_sec = mean(first_secs) if first_secs else None
-        trend_pct = None
-        if team_avg_close_sec and team_avg_close_sec > 0:
-            trend_pct = round(((avg_close_sec - team_avg_close_sec) / team_avg_close_sec) * 100, 0)
-
-        rows.append({
-            "employee_id": emp_id,
-            "full_name": full_name,
-            "department": dept,
-            "count_total": len(close_secs),
-            "avg_first_sec": int(round(avg_first_sec)) if avg_first_sec is not None else None,
-            "avg_close_sec": int(round(avg_close_sec)),
-            "trend": {
-                "emoji": _sign_emoji(trend_pct),
-                "pct": trend_pct,
-                "team_avg_close_sec": int(round(team_avg_close_sec)) if team_avg_close_sec else None,
-            }
-        })
-
-    if order == "avg_desc":
-        rows.sort(key=lambda r: (r["avg_close_sec"],), reverse=True)
-    elif order == "cnt_desc":
-        rows.sort(key=lambda r: (r["count_total"], r["avg_close_sec"]), reverse=True)
-    else:
-        rows.sort(key=lambda r: (r["avg_close_sec"], -r["count_total"]))
+    def compute():
+        # Yalnızca Bonus departmanı personeli
+        rows = compute_close_time_rows(
+            db, "bonus", dt_from, dt_to,
+            order=order, min_kt=min_kt, department="Bonus", default_department="Bonus",
+        )
+        return _close_time_page(rows, order, limit, offset, cursor)
 
-    return rows[offset: offset + limit]
+    # ekip bazı bugünün kovasını içerir → kapalı aralık sayılmaz
+    return _cached(request, response, db, None, compute)
 
 # ---------- FINANS: kişi bazlı kapanış ve ilk yanıt raporu (sn) ----------
 @router.get(
@@ -219,12 +122,15 @@ def bonus_close_time(
     dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
 )
 def finance_close_time(
+    request: Request,
+    response: Response,
     frm: str | None = Query(None, description="YYYY-MM-DD (default: son 7 gün)"),
     to: str | None = Query(None, description="YYYY-MM-DD (exclusive, default: bugün+1)"),
     order: Literal["avg_asc","avg_desc","cnt_desc"] = Query("avg_asc"),
     limit: int = Query(500, ge=1, le=500),  # Bonus ile aynı sınırlar
     offset: int = Query(0, ge=0),
     min_kt: int = Query(5, ge=0, le=1000, description="En az kaç reply_first (KT) olan personel dahil edilsin"),
+    cursor: str | None = Query(None, description="Önceki yanıttaki X-Next-Cursor (verilirse offset yok sayılır)"),
     db: Session = Depends(get_db),
 ):
     """
@@ -236,270 +142,240 @@ def finance_close_time(
     dt_to = _parse_date(to) or (datetime.now(timezone.utc) + timedelta(days=1))
     dt_from = _parse_date(frm) or (dt_to - timedelta(days=7))
 
-    trend_to = datetime.now(timezone.utc) + timedelta(days=1)
-    trend_from = trend_to - timedelta(days=7)
+    def compute():
+        rows = compute_close_time_rows(
+            db, "finans", dt_from, dt_to,
+            order=order, min_kt=min_kt, department=None, default_department="-",
+        )
+        return _close_time_page(rows, order, limit, offset, cursor)
 
-    close_types = ("reply_close", "approve", "reject")
+    return _cached(request, response, db, None, compute)
 
-    # İsim/departman lookup
-    all_emp_rows = db.query(Employee.employee_id, Employee.full_name, Employee.department).all()
-    emp_info: Dict[str, Tuple[str, str]] = {r[0]: (r[1] or r[0], r[2] or "-") for r in all_emp_rows}
+# ---------- Süre dağılımı: percentile + histogram (ilk yanıt / sonuçlandırma) ----------
+def _parse_edges(buckets: str | None) -> List[int]:
+    if not buckets:
+        return list(DEFAULT_BUCKET_EDGES)
+    try:
+        edges = sorted({int(x) for x in buckets.split(",") if x.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="buckets must be comma separated seconds")
+    if not edges or edges[0] <= 0 or len(edges) > 50:
+        raise HTTPException(status_code=400, detail="buckets must be 1..50 positive seconds")
+    return edges
+
+def _response_time(request, response, db, channel, frm, to, buckets, department):
+    dt_to = _parse_date(to) or (datetime.now(timezone.utc) + timedelta(days=1))
+    dt_from = _parse_date(frm) or (dt_to - timedelta(days=7))
+    edges = _parse_edges(buckets)
 
-    first_rows: List[Event] = (
-        db.query(Event)
-        .filter(
-            Event.source_channel == "finans",
-            Event.type == "reply_first",
-            Event.employee_id.isnot(None),
-            Event.ts >= dt_from, Event.ts < dt_to,
-        ).order_by(Event.ts.asc()).all()
-    )
-    close_rows: List[Event] = (
-        db.query(Event)
-        .filter(
-            Event.source_channel == "finans",
-            Event.type.in_(close_types),
-            Event.employee_id.isnot(None),
-            Event.ts >= dt_from, Event.ts < dt_to,
-        ).order_by(Event.ts.asc()).all()
-    )
-    if not first_rows and not close_rows:
-        return []
-
-    # Kişi bazında metrikler + KT sayacı
-    root_cache: Dict[Tuple[int,int], datetime | None] = {}
-    per_emp_first_secs: Dict[str, List[float]] = {}
-    per_emp_close_secs: Dict[str, List[float]] = {}
-    per_emp_first_count: Dict[str, int] = {}
-
-    for e in first_rows:
-        rts = _root_origin_ts(e.chat_id, e.msg_id, db, root_cache)
-        if not rts: 
-            continue
-        sec = (e.ts - rts).total_seconds()
-        if sec >= 0:
-            per_emp_first_secs.setdefault(e.employee_id, []).append(sec)
-            per_emp_first_count[e.employee_id] = per_emp_first_count.get(e.employee_id, 0) + 1  # KT++
-
-    for e in close_rows:
-        rts = _root_origin_ts(e.chat_id, e.msg_id, db, root_cache)
-        if not rts: 
-            continue
-        sec = (e.ts - rts).total_seconds()
-        if sec >= 0:
-            per_emp_close_secs.setdefault(e.employee_id, []).append(sec)
-
-    if not per_emp_close_secs:
-        return []
-
-    # Ekip Ø (trend baz)
-    team_close_trend_rows: List[Event] = (
-        db.query(Event)
-        .filter(
-            Event.source_channel == "finans",
-            Event.type.in_(close_types),
-            Event.employee_id.isnot(None),
-            Event.ts >= trend_from, Event.ts < trend_to,
-        ).all()
-    )
-    team_root_cache: Dict[Tuple[int,int], datetime | None] = {}
-    team_secs: List[float] = []
-    for e in team_close_trend_rows:
-        rts = _root_origin_ts(e.chat_id, e.msg_id, db, team_root_cache)
-        if not rts: 
-            continue
-        sec = (e.ts - rts).total_seconds()
-        if sec >= 0:
-            team_secs.append(sec)
-    team_avg_close_sec = mean(team_secs) if team_secs else None
-
-    rows = []
-    for emp_id, close_secs in per_emp_close_secs.items():
-        # KT eşiği
-        kt_cnt = per_emp_first_count.get(emp_id, 0)
-        if min_kt > 0 and kt_cnt < min_kt:
-            continue
-
-        full_name, dept = emp_info.get(emp_id, (emp_id, "-"))
-        avg_close_sec = mean(close_secs)
-        first_secs = per_emp_first_secs.get(emp_id, [])
-        avg_first_sec = mean(first_secs) if first_secs else None
-        trend_pct = None
-        if team_avg_close_sec and team_avg_close_sec > 0:
-            trend_pct = round(((avg_close_sec - team_avg_close_sec) / team_avg_close_sec) * 100, 0)
-
-        rows.append({
-            "employee_id": emp_id,
-            "full_name": full_name,
-            "department": dept,
-            "count_total": len(close_secs),
-            "avg_first_sec": int(round(avg_first_sec)) if avg_first_sec is not None else None,
-            "avg_close_sec": int(round(avg_close_sec)),
-            "trend": {
-                "emoji": _sign_emoji(trend_pct),
-                "pct": trend_pct,
-                "team_avg_close_sec": int(round(team_avg_close_sec)) if team_avg_close_sec else None,
-            }
-        })
+    def compute():
+        return compute_response_time_distribution(db, channel, dt_from, dt_to, department, edges), {}
 
-    if order == "avg_desc":
-        rows.sort(key=lambda r: (r["avg_close_sec"],), reverse=True)
-    elif order == "cnt_desc":
-        rows.sort(key=lambda r: (r["count_total"], r["avg_close_sec"]), reverse=True)
-    else:
-        rows.sort(key=lambda r: (r["avg_close_sec"], -r["count_total"]))
+    return _cached(request, response, db, dt_to, compute)
 
-    return rows[offset: offset + limit]
+@router.get(
+    "/bonus/response-time",
+    dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
+)
+def bonus_response_time(
+    request: Request,
+    response: Response,
+    frm: str | None = Query(None, description="YYYY-MM-DD (default: son 7 gün)"),
+    to: str | None = Query(None, description="YYYY-MM-DD (exclusive, default: bugün+1)"),
+    buckets: str | None = Query(None, description="Histogram sınırları (sn), ör. 30,60,300,900"),
+    db: Session = Depends(get_db),
+):
+    """
+    BONUS — ilk yanıt ve sonuçlandırma sürelerinin dağılımı (ekip + kişi):
+    n, Ø, p50/p90/p95 ve sabit kovalı histogram. Yalnızca Bonus departmanı personeli.
+    """
+    return _response_time(request, response, db, "bonus", frm, to, buckets, "Bonus")
+
+@router.get(
+    "/finance/response-time",
+    dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
+)
+def finance_response_time(
+    request: Request,
+    response: Response,
+    frm: str | None = Query(None, description="YYYY-MM-DD (default: son 7 gün)"),
+    to: str | None = Query(None, description="YYYY-MM-DD (exclusive, default: bugün+1)"),
+    buckets: str | None = Query(None, description="Histogram sınırları (sn), ör. 30,60,300,900"),
+    db: Session = Depends(get_db),
+):
+    """FINANS — Bonus ile aynı şema; departman filtresi yok."""
+    return _response_time(request, response, db, "finans", frm, to, buckets, None)
+
+# ---------- Günlük seri (dashboard): IST günü başına toplam / Ø ilk yanıt / SLA aşımı ----------
+_SERIES_MAX_DAYS = 366
+
+def _daily_series(request, response, db, channel, frm, to, sla_first_sec):
+    today_ist = datetime.now(IST).date()
+    d_to = _parse_date(to).date() if to else today_ist
+    d_from = _parse_date(frm).date() if frm else d_to - timedelta(days=29)
+    if d_from > d_to or (d_to - d_from).days >= _SERIES_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"range must be 1..{_SERIES_MAX_DAYS} days")
+    range_end = _ist_day_edges_utc(d_to + timedelta(days=1))[0]
+
+    def compute():
+        return compute_daily_series(db, d_from, d_to, sla_first_sec, channels=(channel,))[channel], {}
+
+    return _cached(request, response, db, range_end, compute)
+
+@router.get(
+    "/bonus/daily-series",
+    dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
+)
+def bonus_daily_series(
+    request: Request,
+    response: Response,
+    frm: str | None = Query(None, description="YYYY-MM-DD (IST, dahil; default: to − 29 gün)"),
+    to: str | None = Query(None, description="YYYY-MM-DD (IST, dahil; default: bugün)"),
+    sla_first_sec: int = Query(60, ge=1, le=3600),
+    db: Session = Depends(get_db),
+):
+    """BONUS — gün sonu context'inin günlük serisi (toplam kapanış, Ø ilk yanıt, eşik üstü ilk yanıt)."""
+    return _daily_series(request, response, db, "bonus", frm, to, sla_first_sec)
+
+@router.get(
+    "/finance/daily-series",
+    dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
+)
+def finance_daily_series(
+    request: Request,
+    response: Response,
+    frm: str | None = Query(None, description="YYYY-MM-DD (IST, dahil; default: to − 29 gün)"),
+    to: str | None = Query(None, description="YYYY-MM-DD (IST, dahil; default: bugün)"),
+    sla_first_sec: int = Query(60, ge=1, le=3600),
+    db: Session = Depends(get_db),
+):
+    """FINANS — Bonus ile aynı şema."""
+    return _daily_series(request, response, db, "finans", frm, to, sla_first_sec)
 
 
 # apps/api/app/api/routes_reports.py
 # ... (dosyanızın mevcut içeriği aynen kalsın; bu bloğu en alta ekleyin) ...
 
-from sqlalchemy import func
+_DUR_NULL_LAST = {"dur_asc": 10**12, "dur_desc": -1}  # negatif/eksik süre hep sonda
+ThreadOrder = Literal["close_desc","close_asc","dur_asc","dur_desc"]
 
-CloseTypes = ("approve", "reply_close", "reject")
+def _threads_window(frm: str | None, to: str | None) -> Tuple[datetime, datetime]:
+    # Tarih aralığı (UTC)
+    dt_to = _parse_date(to) or (datetime.now(timezone.utc) + timedelta(days=1))
+    dt_from = _parse_date(frm) or (dt_to - timedelta(days=1))  # varsayılan: bugün
+    return dt_from, dt_to
+
+def _threads_query(db: Session, channel: str, dt_from: datetime, dt_to: datetime, order: str):
+    """
+    Aralıkta KAPANAN thread'ler (threads özetinden; ilk kapanış + origin + ilk yanıt tek satırda),
+    (sıralama anahtarı, corr) ile sıralı. (query, anahtar ifadesi, desc mi) döner.
+    """
+    # Sıralama anahtarı: kapanış zamanı ya da (tam sn) kapanış süresi
+    if order in _DUR_NULL_LAST:
+        sec = func.extract("epoch", Thread.first_close_ts - Thread.origin_ts)
+        key = case((sec >= 0, func.floor(sec).cast(BigInteger)), else_=_DUR_NULL_LAST[order])
+    else:
+        key = Thread.first_close_ts
+    desc = order in ("close_desc", "dur_desc")
+
+    q = (
+        db.query(Thread, key.label("sort_key"))
+        .filter(
+            Thread.source_channel == channel,
+            Thread.first_close_ts >= dt_from,
+            Thread.first_close_ts < dt_to,
+            Thread.origin_ts.isnot(None),  # origin yoksa süreleri hesaplayamayız
+        )
+    )
+    if desc:
+        q = q.order_by(key.desc(), Thread.correlation_id.desc())
+    else:
+        q = q.order_by(key.asc(), Thread.correlation_id.asc())
+    return q, key, desc
+
+def _employee_lookup(db: Session) -> Dict[str, Tuple[str, str]]:
+    # Personel isim/department lookup (tek sefer)
+    return {
+        e.employee_id: (e.full_name or e.employee_id, e.department or "-")
+        for e in db.query(Employee.employee_id, Employee.full_name, Employee.department).all()
+    }
+
+def _thread_row(t: Thread, emp_lookup: Dict[str, Tuple[str, str]], sla_sec: int) -> Dict:
+    origin_ts = t.origin_ts
+    first_reply_ts = t.first_reply_ts
+    first_close_ts = t.first_close_ts
+
+    first_resp = (first_reply_ts - origin_ts).total_seconds() if first_reply_ts else None
+    close_dur = (first_close_ts - origin_ts).total_seconds() if first_close_ts else None
+
+    emp_id = t.closer_emp
+    full_name, dept = emp_lookup.get(emp_id, (emp_id or "-", "-"))
+
+    return {
+        "corr": t.correlation_id,
+        "origin_ts": origin_ts,
+        "first_reply_ts": first_reply_ts,
+        "first_close_ts": first_close_ts,
+        "close_type": t.close_type,
+        "closer_employee_id": emp_id,
+        "closer_full_name": full_name,
+        "closer_department": dept,
+        "first_response_sec": int(first_resp) if first_resp is not None and first_resp >= 0 else None,
+        "close_sec": int(close_dur) if close_dur is not None and close_dur >= 0 else None,
+        "sla_breach": (close_dur is not None and close_dur > sla_sec),
+        "close_chat_id": t.chat_id,
+        "close_msg_id": t.first_close_msg_id,
+    }
 
 def _threads_core(
     db: Session,
     channel: Literal["bonus", "finans"],
     frm: str | None,
     to: str | None,
-    order: Literal["close_desc","close_asc","dur_asc","dur_desc"] = "close_desc",
+    order: ThreadOrder = "close_desc",
     limit: int = 200,
     offset: int = 0,
     sla_sec: int = 900,
-):
+    cursor: str | None = None,
+) -> Tuple[List[Dict], str | None]:
     """
     Thread bazlı rapor çekirdeği:
     - Aralık: KAPANIŞ tarihine göre (frm ≤ first_close_ts < to)
     - İlk kapanışı yapan kişi/close_type döner
     - Süreler: origin→first_reply ve origin→first_close
+    - Sayfalama: (sıralama anahtarı, corr) üzerinde keyset; yalnızca istenen sayfa çekilir
+    (satırlar, sonraki sayfa cursor'ı | None) döner.
     """
-    # Tarih aralığı (UTC)
-    dt_to = _parse_date(to) or (datetime.now(timezone.utc) + timedelta(days=1))
-    dt_from = _parse_date(frm) or (dt_to - timedelta(days=1))  # varsayılan: bugün
-
-    # 1) Bu aralıkta KAPANAN thread'leri yakala (ilk kapanış)
-    close_rows = (
-        db.query(
-            Event.correlation_id.label("corr"),
-            Event.employee_id.label("closer_emp"),
-            Event.type.label("close_type"),
-            Event.ts.label("close_ts"),
-            Event.chat_id.label("close_chat_id"),
-            Event.msg_id.label("close_msg_id"),
-        )
-        .filter(
-            Event.source_channel == channel,
-            Event.type.in_(CloseTypes),
-            Event.ts >= dt_from,
-            Event.ts < dt_to,
-        )
-        .order_by(Event.correlation_id.asc(), Event.ts.asc())
-        .all()
-    )
-
-    if not close_rows:
-        return []
-
-    # İlk kapanışları seç (corr başına ilk kayıt)
-    first_close_by_corr: Dict[str, Dict] = {}
-    for r in close_rows:
-        c = r.corr
-        if c not in first_close_by_corr:
-            first_close_by_corr[c] = {
-                "corr": c,
-                "first_close_ts": r.close_ts,
-                "close_type": r.close_type,
-                "closer_emp": r.closer_emp,
-                "close_chat_id": r.close_chat_id,
-                "close_msg_id": r.close_msg_id,
-            }
-
-    corrs = list(first_close_by_corr.keys())
-
-    # 2) Origin MIN(ts) (corr bazında)
-    origin_rows = (
-        db.query(
-            Event.correlation_id.label("corr"),
-            func.min(Event.ts).label("origin_ts"),
-        )
-        .filter(
-            Event.source_channel == channel,
-            Event.type == "origin",
-            Event.correlation_id.in_(corrs),
-        )
-        .group_by(Event.correlation_id)
-        .all()
-    )
-    origin_by_corr = {r.corr: r.origin_ts for r in origin_rows}
-
-    # 3) First reply MIN(ts) (corr bazında)
-    first_rows = (
-        db.query(
-            Event.correlation_id.label("corr"),
-            func.min(Event.ts).label("first_reply_ts"),
-        )
-        .filter(
-            Event.source_channel == channel,
-            Event.type == "reply_first",
-            Event.correlation_id.in_(corrs),
-        )
-        .group_by(Event.correlation_id)
-        .all()
-    )
-    first_by_corr = {r.corr: r.first_reply_ts for r in first_rows}
+    dt_from, dt_to = _threads_window(frm, to)
+    q, key, desc = _threads_query(db, channel, dt_from, dt_to, order)
 
-    # 4) Personel isim/department lookup (tek sefer)
-    emp_lookup = {
-        e.employee_id: (e.full_name or e.employee_id, e.department or "-")
-        for e in db.query(Employee.employee_id, Employee.full_name, Employee.department).all()
-    }
-
-    # 5) Satırları kur
-    rows = []
-    for corr, fc in first_close_by_corr.items():
-        origin_ts = origin_by_corr.get(corr)
-        if not origin_ts:
-            # origin yoksa süreleri hesaplayamayız; yine de satır döndürelim mi? -> Atlıyoruz.
-            continue
-
-        first_reply_ts = first_by_corr.get(corr)
-        first_close_ts = fc["first_close_ts"]
-
-        first_resp = (first_reply_ts - origin_ts).total_seconds() if first_reply_ts else None
-        close_dur = (first_close_ts - origin_ts).total_seconds() if first_close_ts else None
-
-        emp_id = fc["closer_emp"]
-        full_name, dept = emp_lookup.get(emp_id, (emp_id or "-", "-"))
-
-        rows.append({
-            "corr": corr,
-            "origin_ts": origin_ts,
-            "first_reply_ts": first_reply_ts,
-            "first_close_ts": first_close_ts,
-            "close_type": fc["close_type"],
-            "closer_employee_id": emp_id,
-            "closer_full_name": full_name,
-            "closer_department": dept,
-            "first_response_sec": int(first_resp) if first_resp is not None and first_resp >= 0 else None,
-            "close_sec": int(close_dur) if close_dur is not None and close_dur >= 0 else None,
-            "sla_breach": (close_dur is not None and close_dur > sla_sec),
-            "close_chat_id": fc["close_chat_id"],
-            "close_msg_id": fc["close_msg_id"],
+    if cursor:
+        try:
+            c = decode_cursor(cursor, order)
+            after_key = int(c["k"]) if order in _DUR_NULL_LAST else datetime.fromisoformat(c["k"])
+            after = tuple_(after_key, str(c["c"]))
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=400, detail="invalid cursor")
+        pos = tuple_(key, Thread.correlation_id)
+        q = q.filter(pos < after if desc else pos > after)
+    elif offset:
+        q = q.offset(offset)
+    fetched = q.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(fetched) > limit:
+        fetched = fetched[:limit]
+        last, last_key = fetched[-1]
+        next_cursor = encode_cursor({
+            "o": order,
+            "k": last_key if order in _DUR_NULL_LAST else last_key.isoformat(),
+            "c": last.correlation_id,
         })
+    if not fetched:
+        return [], None
 
-    # 6) Sıralama
-    if order == "close_asc":
-        rows.sort(key=lambda r: (r["first_close_ts"] or datetime.max))
-    elif order == "dur_asc":
-        rows.sort(key=lambda r: (r["close_sec"] if r["close_sec"] is not None else 10**12))
-    elif order == "dur_desc":
-        rows.sort(key=lambda r: (r["close_sec"] if r["close_sec"] is not None else -1), reverse=True)
-    else:  # close_desc
-        rows.sort(key=lambda r: (r["first_close_ts"] or datetime.min), reverse=True)
-
-    return rows[offset: offset + limit]
+    emp_lookup = _employee_lookup(db)
+    return [_thread_row(t, emp_lookup, sla_sec) for t, _ in fetched], next_cursor
 
 # ---------- THREAD RAPORLARI ----------
 @router.get(
@@ -507,35 +383,130 @@ def _threads_core(
     dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
 )
 def finance_threads(
+    request: Request,
+    response: Response,
     frm: str | None = Query(None, description="YYYY-MM-DD (default: bugün)"),
     to: str | None = Query(None, description="YYYY-MM-DD (exclusive)"),
-    order: Literal["close_desc","close_asc","dur_asc","dur_desc"] = Query("close_desc"),
+    order: ThreadOrder = Query("close_desc"),
     limit: int = Query(200, ge=1, le=500),
     offset: int = Query(0, ge=0),
     sla_sec: int = Query(900, ge=1, le=86400, description="SLA eşiği (sn)"),
+    cursor: str | None = Query(None, description="Önceki yanıttaki X-Next-Cursor (verilirse offset yok sayılır)"),
     db: Session = Depends(get_db),
 ):
     """
     Finans kanalı — thread bazlı günlük rapor.
     Kapanışa göre aralık; ilk kapanış & süreler & kişi bilgisi.
     """
-    return _threads_core(db, "finans", frm, to, order, limit, offset, sla_sec)
+    def compute():
+        rows, next_cursor = _threads_core(db, "finans", frm, to, order, limit, offset, sla_sec, cursor)
+        return rows, _page_headers(next_cursor)
+
+    return _cached(request, response, db, _threads_window(frm, to)[1], compute)
 
 @router.get(
     "/bonus/threads",
     dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
 )
 def bonus_threads(
+    request: Request,
+    response: Response,
     frm: str | None = Query(None, description="YYYY-MM-DD (default: bugün)"),
     to: str | None = Query(None, description="YYYY-MM-DD (exclusive)"),
-    order: Literal["close_desc","close_asc","dur_asc","dur_desc"] = Query("close_desc"),
+    order: ThreadOrder = Query("close_desc"),
     limit: int = Query(200, ge=1, le=500),
     offset: int = Query(0, ge=0),
     sla_sec: int = Query(900, ge=1, le=86400, description="SLA eşiği (sn)"),
+    cursor: str | None = Query(None, description="Önceki yanıttaki X-Next-Cursor (verilirse offset yok sayılır)"),
     db: Session = Depends(get_db),
 ):
     """
     Bonus kanalı — thread bazlı günlük rapor.
     Kapanışa göre aralık; ilk kapanış & süreler & kişi bilgisi.
     """
-    return _threads_core(db, "bonus", frm, to, order, limit, offset, sla_sec)
+    def compute():
+        rows, next_cursor = _threads_core(db, "bonus", frm, to, order, limit, offset, sla_sec, cursor)
+        return rows, _page_headers(next_cursor)
+
+    return _cached(request, response, db, _threads_window(frm, to)[1], compute)
+
+# ---------- THREAD EXPORT (streaming) ----------
+_EXPORT_COLUMNS = [
+    "corr", "origin_ts", "first_reply_ts", "first_close_ts", "close_type",
+    "closer_employee_id", "closer_full_name", "closer_department",
+    "first_response_sec", "close_sec", "sla_breach", "close_chat_id", "close_msg_id",
+]
+_EXPORT_CHUNK = 1000
+
+def _export_value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+def _iter_thread_export(channel: str, dt_from: datetime, dt_to: datetime, order: str, sla_sec: int, fmt: str):
+    """
+    Satırları server-side cursor ile (yield_per) parça parça üretir; bellek aralıktan bağımsız.
+    İstek oturumu yanıt akmadan kapanabileceği için kendi session'ını açar.
+    """
+    db = SessionLocal()
+    try:
+        emp_lookup = _employee_lookup(db)
+        q, _, _ = _threads_query(db, channel, dt_from, dt_to, order)
+
+        buf = io.StringIO()
+        writer = csv.writer(buf) if fmt == "csv" else None
+        if writer:
+            writer.writerow(_EXPORT_COLUMNS)
+
+        n = 0
+        for t, _ in q.yield_per(_EXPORT_CHUNK):
+            row = _thread_row(t, emp_lookup, sla_sec)
+            if writer:
+                writer.writerow([_export_value(row[c]) for c in _EXPORT_COLUMNS])
+            else:
+                buf.write(json.dumps({c: _export_value(row[c]) for c in _EXPORT_COLUMNS}, ensure_ascii=False))
+                buf.write("\n")
+            n += 1
+            if n % _EXPORT_CHUNK == 0:
+                yield buf.getvalue()
+                buf.seek(0); buf.truncate(0)
+        if buf.tell():
+            yield buf.getvalue()
+    finally:
+        db.close()
+
+def _threads_export(channel: str, frm: str | None, to: str | None, order: str, sla_sec: int, fmt: str):
+    dt_from, dt_to = _threads_window(frm, to)
+    media = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+    fname = f"{channel}_threads_{dt_from:%Y%m%d}_{dt_to:%Y%m%d}.{'csv' if fmt == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        _iter_thread_export(channel, dt_from, dt_to, order, sla_sec, fmt),
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{fname}"'},
+    )
+
+@router.get(
+    "/finance/threads/export",
+    dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
+)
+def finance_threads_export(
+    frm: str | None = Query(None, description="YYYY-MM-DD (default: bugün)"),
+    to: str | None = Query(None, description="YYYY-MM-DD (exclusive)"),
+    order: ThreadOrder = Query("close_asc"),
+    sla_sec: int = Query(900, ge=1, le=86400, description="SLA eşiği (sn)"),
+    format: Literal["ndjson","csv"] = Query("ndjson"),
+):
+    """Finans thread raporu — aralığın tamamı, sayfasız (NDJSON/CSV akış)."""
+    return _threads_export("finans", frm, to, order, sla_sec, format)
+
+@router.get(
+    "/bonus/threads/export",
+    dependencies=[Depends(RolesAllowed("super_admin","admin","manager"))],
+)
+def bonus_threads_export(
+    frm: str | None = Query(None, description="YYYY-MM-DD (default: bugün)"),
+    to: str | None = Query(None, description="YYYY-MM-DD (exclusive)"),
+    order: ThreadOrder = Query("close_asc"),
+    sla_sec: int = Query(900, ge=1, le=86400, description="SLA eşiği (sn)"),
+    format: Literal["ndjson","csv"] = Query("ndjson"),
+):
+    """Bonus thread raporu — aralığın tamamı, sayfasız (NDJSON/CSV akış)."""
+    return _threads_export("bonus", frm, to, order, sla_sec, format)
@@ -1,10 +1,11 @@
 # apps/api/app/api/routes_telegram.py
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime, timezone
 import re
 
-from app.deps import get_db
+from app.deps import get_db, RolesAllowed
 from app.core.config import settings
 from app.models.events import RawMessage, Event
 
@@ -13,32 +14,16 @@ from app.services.identity_resolver import (
     actor_key as make_key,
     resolve_employee_id,
     ensure_pending,
+    publish_staged,
 )
+from app.services.reply_roots import root_for
+from app.services.sla_watchdog import sla_watchdog
+from app.services.threads_service import upsert_thread_events
+from app.services.message_classifier import classifier, normalize
+from app.services.telegram_ingest import ingest_writer, queue_mode_enabled
 
 router = APIRouter(prefix="/integrations/telegram", tags=["integrations"])
 
-def _norm(s: str) -> str:
-    return (s or "").lower()\
-        .replace("ı","i").replace("ş","s").replace("ğ","g")\
-        .replace("ç","c").replace("ö","o").replace("ü","u")
-
-def _first_match(text: str) -> bool:
-    s = _norm(text)
-    return (
-        re.search(r"(?:^|\s)k(?:\s|$)", s)
-        or re.search(r"\bk\s*t+\b", s)
-        or re.search(r"\bkt+\b", s)
-        or "bakiyorum" in s
-        or "ilgileniyorum" in s
-        or re.search(r"kontrol(\s+ediyorum)?", s)
-    )
-
-APPROVE_PAT = [r"\bonay\b", r"onayland[ıi]", r"\btamam\b", r"\bok\b", "✅", "👍"]
-REJECT_PAT  = [r"\bred\b", r"\biptal\b", r"\bolumsuz\b", r"\bhata\b", "❌", "🚫"]
-
-def _is_approve(text: str) -> bool: return any(re.search(p, _norm(text)) for p in APPROVE_PAT)
-def _is_reject(text: str) -> bool:  return any(re.search(p, _norm(text)) for p in REJECT_PAT)
-
 def _idset(csv: str) -> set[int]:
     return set(int(x.strip()) for x in (csv or "").split(",") if x.strip())
 
@@ -52,12 +37,8 @@ def _channel_tag(chat_id: int) -> str:
     if MESAI_ID and chat_id == MESAI_ID: return "mesai"
     return "other"
 
-@router.post("/webhook/{secret}")
-async def webhook(secret: str, request: Request, db: Session = Depends(get_db)):
-    if secret != settings.TELEGRAM_WEBHOOK_SECRET:
-        raise HTTPException(status_code=403, detail="forbidden")
-
-    upd = await request.json()
+def _parse_update(upd: dict) -> dict | None:
+    """Telegram update'ini yazılacak tek kayda çevirir (DB'ye dokunmaz)."""
     msg = (
         upd.get("message")
         or upd.get("edited_message")
@@ -65,7 +46,7 @@ async def webhook(secret: str, request: Request, db: Session = Depends(get_db)):
         or upd.get("edited_channel_post")
     )
     if not msg:
-        return {"ok": True}
+        return None
 
     chat_id = int((msg.get("chat") or {}).get("id"))
     msg_id  = int(msg.get("message_id"))
@@ -83,20 +64,6 @@ async def webhook(secret: str, request: Request, db: Session = Depends(get_db)):
     kind        = "reply" if msg.get("reply_to_message") else "msg"
     channel_tag = _channel_tag(chat_id)
 
-    # raw_messages (idempotent)
-    if not db.query(RawMessage).filter_by(chat_id=chat_id, msg_id=msg_id).first():
-        db.add(RawMessage(
-            update_id=upd.get("update_id"),
-            chat_id=chat_id,
-            msg_id=msg_id,
-            from_user_id=from_uid,
-            from_username=from_uname,
-            ts=ts,
-            channel_tag=channel_tag,
-            kind=kind,
-            json=upd
-        ))
-
     # correlation
     origin = msg.get("reply_to_message") or None
     origin_id = origin.get("message_id") if origin else msg_id
@@ -110,10 +77,7 @@ async def webhook(secret: str, request: Request, db: Session = Depends(get_db)):
         if not origin:
             ev_type, payload = "origin", {"talep_text": text_norm}
         else:
-            if _first_match(text_norm): ev_type = "reply_first"
-            elif _is_reject(text_norm): ev_type = "reject"
-            elif _is_approve(text_norm): ev_type = "approve"
-            else: ev_type = "reply_close"
+            ev_type = classifier.classify(text_norm, is_reply=True)
             payload = {"text": text_norm}
 
     elif channel_tag == "mesai":
@@ -123,7 +87,7 @@ async def webhook(secret: str, request: Request, db: Session = Depends(get_db)):
             text_norm
         )
         if m:
-            raw_op = _norm(m.group("op"))
+            raw_op = normalize(m.group("op"))
             is_giris = "giris" in raw_op
             ev_type = "check_in" if is_giris else "check_out"
 
@@ -146,27 +110,109 @@ async def webhook(secret: str, request: Request, db: Session = Depends(get_db)):
         if from_uname:   name_hint = from_uname.lstrip("@")
         elif from_full:  name_hint = from_full
 
+    return {
+        "update_id": upd.get("update_id"),
+        "chat_id": chat_id,
+        "msg_id": msg_id,
+        "from_user_id": from_uid,
+        "from_username": from_uname,
+        "ts": ts,
+        "channel_tag": channel_tag,
+        "kind": kind,
+        "json": upd,
+        "correlation_id": correlation_id,
+        "parent_msg_id": origin_id if origin else None,
+        "ev_type": ev_type,
+        "payload": payload,
+        "actor_key": make_key(from_uid, from_uname),
+        "name_hint": name_hint,
+    }
+
+def _store_sync(db: Session, rec: dict) -> tuple[bool, bool]:
+    """
+    Tek update'i yazar; (raw_yeni_mi, event_yeni_mi) döner.
+    Ön-SELECT yok: uq_rawmsg_chat_msg / uq_event_corr_type üzerinde
+    INSERT ... ON CONFLICT DO NOTHING RETURNING → tekrar gelen teslimatlar no-op.
+    """
+    root_msg_id = root_for(db, rec["chat_id"], rec["msg_id"], rec["parent_msg_id"])
+    raw_id = db.execute(
+        pg_insert(RawMessage)
+        .values(
+            update_id=rec["update_id"],
+            chat_id=rec["chat_id"],
+            msg_id=rec["msg_id"],
+            from_user_id=rec["from_user_id"],
+            from_username=rec["from_username"],
+            ts=rec["ts"],
+            channel_tag=rec["channel_tag"],
+            kind=rec["kind"],
+            parent_msg_id=rec["parent_msg_id"],
+            root_msg_id=root_msg_id,
+            json=rec["json"],
+        )
+        .on_conflict_do_nothing(constraint="uq_rawmsg_chat_msg")
+        .returning(RawMessage.id)
+    ).scalar()
+
     # Kimlik atama
-    key = make_key(from_uid, from_uname)
+    key = rec["actor_key"]
     employee_id = resolve_employee_id(db, key) if key != "unknown" else None
     if not employee_id and key != "unknown":
-        ensure_pending(db, key, name_hint=name_hint, team_hint=None)
-
-    # events (idempotent)
-    exists = db.query(Event).filter_by(correlation_id=correlation_id, type=ev_type).first()
-    if not exists:
-        db.add(Event(
-            source_channel=channel_tag,
-            type=ev_type,
-            chat_id=chat_id,
-            msg_id=msg_id,
-            correlation_id=correlation_id,
-            ts=ts,
-            from_user_id=from_uid,
-            from_username=from_uname,
-            employee_id=employee_id,
-            payload_json=payload
-        ))
+        ensure_pending(db, key, name_hint=rec["name_hint"], team_hint=None)
+
+    ev_row = {
+        "source_channel": rec["channel_tag"],
+        "type": rec["ev_type"],
+        "chat_id": rec["chat_id"],
+        "msg_id": rec["msg_id"],
+        "correlation_id": rec["correlation_id"],
+        "parent_msg_id": rec["parent_msg_id"],
+        "root_msg_id": root_msg_id,
+        "ts": rec["ts"],
+        "from_user_id": rec["from_user_id"],
+        "from_username": rec["from_username"],
+        "employee_id": employee_id,
+        "payload_json": rec["payload"],
+    }
+    ev_id = db.execute(
+        pg_insert(Event)
+        .values(**ev_row)
+        .on_conflict_do_nothing(constraint="uq_event_corr_type")
+        .returning(Event.id)
+    ).scalar()
+    if ev_id is not None:
+        upsert_thread_events(db, [ev_row])
 
     db.commit()
-    return {"ok": True, "stored": True, "type": ev_type, "channel": channel_tag}
+    publish_staged(db)
+    if ev_id is not None:
+        sla_watchdog.observe([ev_row])
+    return raw_id is not None, ev_id is not None
+
+@router.post("/webhook/{secret}")
+async def webhook(secret: str, request: Request, db: Session = Depends(get_db)):
+    if secret != settings.TELEGRAM_WEBHOOK_SECRET:
+        raise HTTPException(status_code=403, detail="forbidden")
+
+    upd = await request.json()
+    rec = _parse_update(upd)
+    if not rec:
+        return {"ok": True}
+
+    # queue modu: sadece kuyruğa at, yazımı arka plan writer yapar
+    if queue_mode_enabled() and ingest_writer.submit(rec):
+        return {"ok": True, "queued": True, "type": rec["ev_type"], "channel": rec["channel_tag"]}
+
+    raw_new, event_new = _store_sync(db, rec)
+    return {
+        "ok": True,
+        "stored": event_new,
+        "raw_new": raw_new,
+        "event_new": event_new,
+        "type": rec["ev_type"],
+        "channel": rec["channel_tag"],
+    }
+
+@router.get("/ingest/stats", dependencies=[Depends(RolesAllowed("super_admin","admin"))])
+def ingest_stats():
+    return {"mode": settings.TG_INGEST_MODE, **ingest_writer.snapshot()}
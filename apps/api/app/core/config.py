@@ -20,6 +20,36 @@ class Settings(BaseSettings):
     TG_FINANS_CHAT_IDS: str = ""
     TG_MESAI_CHAT_ID: str = ""             # tek ID (string bıraktık)
 
+    # Webhook ingest modu: "sync" (istek içinde yaz) | "queue" (kuyruğa at, arka planda toplu yaz)
+    TG_INGEST_MODE: str = "sync"
+    TG_INGEST_BATCH_SIZE: int = 200        # bu kadar update birikince flush
+    TG_INGEST_FLUSH_MS: int = 500          # ya da ilk update'ten bu kadar ms sonra flush
+    TG_INGEST_QUEUE_MAX: int = 10000       # kuyruk dolarsa istek içinde (sync) yazılır
+
+    # actor_key → employee_id in-process cache (identity_resolver)
+    IDENTITY_CACHE_SIZE: int = 20000
+    IDENTITY_CACHE_TTL_SEC: int = 300
+
+    # /reports sonuç cache'i (report_cache): LRU boyutu, açık aralık TTL'i,
+    # "to" bu kadar sn geçmişte kalınca aralık kapalı sayılır (veri versiyonu bump'ına kadar yeniden hesaplanmaz);
+    # kapalı sonuçlar sunucuda CLOSED_TTL, tarayıcıda CLOSED_MAX_AGE sn tutulur
+    REPORT_CACHE_SIZE: int = 256
+    REPORT_CACHE_TTL_SEC: int = 600
+    REPORT_CACHE_CLOSED_GRACE_SEC: int = 3600
+    REPORT_CACHE_CLOSED_TTL_SEC: int = 21600
+    REPORT_CACHE_CLOSED_MAX_AGE_SEC: int = 300
+    # close-time ekip bazı: bugünün (açık gün) toplam/adet kovası bu kadar sn tutulur
+    TEAM_BASELINE_TODAY_TTL_SEC: int = 60
+    # KPI skor motoru: (aralık, katalog versiyonu) başına sonuç cache'i
+    KPI_SCORE_CACHE_SIZE: int = 64
+
+    # İlk yanıt SLA bekçisi (sla_watchdog): origin + eşik dolunca kanal grubuna anlık uyarı;
+    # restart'ta son N saatin yanıtsız origin'lerinden yeniden kurulur
+    SLA_WATCHDOG_ENABLED: bool = True
+    SLA_WATCHDOG_FIRST_SEC: int = 30
+    SLA_WATCHDOG_CHANNELS: str = "bonus,finans"
+    SLA_WATCHDOG_REBUILD_HOURS: int = 6
+
     # .env desteği ve fazla env'leri görmezden gel
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
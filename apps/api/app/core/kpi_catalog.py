@@ -0,0 +1,33 @@
+# apps/api/app/core/kpi_catalog.py
+"""
+KPI kataloğu (docs/kpi-catalog.md V1) — skorlama motorunun tek kaynağı.
+Hedef/ağırlık değişince CATALOG_VERSION kendiliğinden değişir (skor cache anahtarı).
+"""
+import hashlib
+from typing import Dict, NamedTuple
+
+
+class KpiDef(NamedTuple):
+    code: str
+    name: str
+    direction: str      # higher_is_better | lower_is_better
+    target: float
+    weight: float
+    unit: str
+    source: str         # telegram | manual | mixed
+    agg: str            # aralık değeri: "mean" (samples ağırlıklı ort.) | "daily" (aktif gün başına toplam)
+    visible: bool = True
+
+
+KPI_CATALOG: Dict[str, KpiDef] = {k.code: k for k in (
+    # Telegram-türev
+    KpiDef("KPI_FIRST_SEC", "İlk Yanıt Süresi", "lower_is_better", 120, 0.4, "saniye", "telegram", "mean"),
+    KpiDef("KPI_CLOSE_SEC", "Kapanış Süresi", "lower_is_better", 600, 0.3, "saniye", "telegram", "mean"),
+    KpiDef("KPI_KT_COUNT", "Günlük KT Sayısı", "higher_is_better", 10, 0.2, "adet", "telegram", "daily"),
+    KpiDef("KPI_FIN_REJECT_RATE", "Finans Red Oranı", "lower_is_better", 0.05, 0.1, "oran", "telegram", "mean"),
+    # Manuel (manager)
+    KpiDef("KPI_QUALITY_SCORE", "Kalite Puanı", "higher_is_better", 85, 0.3, "puan", "manual", "mean"),
+    KpiDef("KPI_EXCEPTION_COUNT", "SLA İstisna Sayısı", "lower_is_better", 0, 0.1, "adet", "manual", "daily"),
+)}
+
+CATALOG_VERSION = hashlib.sha1(repr(sorted(KPI_CATALOG.items())).encode()).hexdigest()[:12]
@@ -0,0 +1,193 @@
+# apps/api/app/jobs/facts_backfill.py
+"""
+facts_daily geçmiş doldurma: tarih aralığını günlere böler, günleri sınırlı bir thread
+havuzunda (her işçi kendi DB oturumu) derive_daily_facts ile paralel yeniden hesaplar.
+
+Her gün kendi transaction'ında commit edilir; aynı transaction'da job_checkpoints'e
+işlenir → yarıda kesilirse --resume ile yalnızca kalan günler çalışır.
+Resume olmadan aralığın checkpoint'leri silinip tüm günler yeniden hesaplanır
+(yeni KPI / sınıflandırma düzeltmesi sonrası). Günler idempotent olduğundan tekrar güvenlidir.
+Sonunda aralığın ayları facts_monthly'de tek oturumda yeniden toplanır.
+
+    python -m app.jobs.facts_backfill --from 2025-01-01 --to 2025-12-31 [--workers 4] [--resume]
+"""
+from __future__ import annotations
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy import text
+
+from app.db.session import SessionLocal
+from app.services.facts_rollup import period_of, recompute_months
+from app.services.facts_service import derive_daily_facts
+
+JOB_NAME = "facts_daily"
+MAX_WORKERS = 8   # engine havuzu (5 + 10 overflow) API isteklerine de yetsin
+
+_DONE_SQL = text("""
+SELECT day FROM job_checkpoints
+WHERE job = :job AND day >= :frm AND day <= :to
+""")
+
+_CLEAR_SQL = text("DELETE FROM job_checkpoints WHERE job = :job AND day >= :frm AND day <= :to")
+
+_MARK_SQL = text("""
+INSERT INTO job_checkpoints (job, day, rows, done_at)
+VALUES (:job, :day, :rows, NOW())
+ON CONFLICT (job, day) DO UPDATE SET rows = EXCLUDED.rows, done_at = EXCLUDED.done_at
+""")
+
+
+class BackfillProgress:
+    """Çalışan/son backfill'in durumu (endpoint ve CLI okur); sayaçlar lock altında güncellenir."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.state: Dict[str, Any] = {"running": False}
+
+    def begin(self, frm: date, to: date, total: int, skipped: int, workers: int) -> None:
+        with self._lock:
+            self.state = {
+                "running": True, "frm": frm.isoformat(), "to": to.isoformat(),
+                "total": total, "skipped": skipped, "done": 0, "failed": 0, "rows": 0,
+                "workers": workers, "started_at": time.time(), "finished_at": None, "errors": [],
+            }
+
+    def day_done(self, rows: int) -> None:
+        with self._lock:
+            self.state["done"] += 1
+            self.state["rows"] += rows
+
+    def day_failed(self, d: date, err: Exception) -> None:
+        with self._lock:
+            self.state["failed"] += 1
+            if len(self.state["errors"]) < 20:
+                self.state["errors"].append(f"{d.isoformat()}: {err}")
+
+    def end(self) -> None:
+        with self._lock:
+            self.state["running"] = False
+            self.state["finished_at"] = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            s = dict(self.state)
+        if "started_at" not in s:
+            return s
+        elapsed = (s["finished_at"] or time.time()) - s["started_at"]
+        left = s["total"] - s["skipped"] - s["done"] - s["failed"]
+        rate = s["done"] / elapsed if elapsed > 0 else 0.0
+        s["elapsed_sec"] = round(elapsed, 1)
+        s["eta_sec"] = round(left / rate, 1) if s["running"] and rate > 0 else None
+        return s
+
+
+progress = BackfillProgress()
+_start_lock = threading.Lock()
+
+
+def _days(frm: date, to: date) -> List[date]:
+    return [frm + timedelta(days=i) for i in range((to - frm).days + 1)]
+
+
+def _run_day(d: date) -> int:
+    db = SessionLocal()
+    try:
+        out = derive_daily_facts(db, d)
+        db.execute(_MARK_SQL, {"job": JOB_NAME, "day": d, "rows": out["upserted"]})
+        db.commit()
+        return out["upserted"]
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def backfill_facts_daily(
+    frm: date,
+    to: date,
+    workers: int = 4,
+    resume: bool = False,
+    on_day: Callable[[Dict[str, Any]], None] | None = None,
+) -> Dict[str, Any]:
+    """[frm, to] günlerini paralel yeniden hesaplar; resume=True → checkpoint'li günler atlanır."""
+    workers = max(1, min(MAX_WORKERS, workers))
+    params = {"job": JOB_NAME, "frm": frm, "to": to}
+    with SessionLocal() as db:
+        if resume:
+            done = set(db.execute(_DONE_SQL, params).scalars())
+        else:
+            db.execute(_CLEAR_SQL, params)
+            db.commit()
+            done = set()
+
+    days = _days(frm, to)
+    todo = [d for d in days if d not in done]
+    progress.begin(frm, to, total=len(days), skipped=len(days) - len(todo), workers=workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="facts-backfill") as pool:
+            futures = {pool.submit(_run_day, d): d for d in todo}
+            for fut in as_completed(futures):
+                d = futures[fut]
+                try:
+                    progress.day_done(fut.result())
+                except Exception as e:
+                    progress.day_failed(d, e)
+                if on_day:
+                    on_day(progress.snapshot())
+        # aylık rollup: işçiler aynı ayı eşzamanlı yazmasın diye gün sonunda değil burada
+        with SessionLocal() as db:
+            recompute_months(db, {period_of(d) for d in days})
+            db.commit()
+    finally:
+        progress.end()
+    return progress.snapshot()
+
+
+def start_background(frm: date, to: date, workers: int = 4, resume: bool = False) -> bool:
+    """Endpoint için: backfill'i ayrı thread'de başlatır; zaten çalışıyorsa False."""
+    with _start_lock:
+        if progress.snapshot().get("running"):
+            return False
+        # asıl begin() thread içinde; arada ikinci isteğin girmemesi için önce işaretle
+        progress.begin(frm, to, total=0, skipped=0, workers=workers)
+
+    def _target() -> None:
+        try:
+            backfill_facts_daily(frm, to, workers=workers, resume=resume)
+        except Exception as e:
+            progress.day_failed(frm, e)
+            progress.end()
+            print(f"[facts-backfill] err: {e}")
+
+    threading.Thread(target=_target, name="facts-backfill", daemon=True).start()
+    return True
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--from", dest="frm", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--to", dest="to", required=True, help="YYYY-MM-DD (dahil)")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--resume", action="store_true", help="checkpoint'li günleri atla")
+    args = ap.parse_args()
+
+    def _print(s: Dict[str, Any]) -> None:
+        n = s["done"] + s["failed"]
+        if n % 10 == 0 or n == s["total"] - s["skipped"]:
+            print(f"[facts-backfill] {n}/{s['total'] - s['skipped']} gün, rows={s['rows']}, "
+                  f"failed={s['failed']}, eta={s['eta_sec']}s", flush=True)
+
+    out = backfill_facts_daily(
+        datetime.strptime(args.frm, "%Y-%m-%d").date(),
+        datetime.strptime(args.to, "%Y-%m-%d").date(),
+        workers=args.workers,
+        resume=args.resume,
+        on_day=_print,
+    )
+    print(out)
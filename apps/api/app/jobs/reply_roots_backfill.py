@@ -0,0 +1,110 @@
+# apps/api/app/jobs/reply_roots_backfill.py
+"""
+raw_messages / events için parent_msg_id + root_msg_id geçmiş doldurma.
+
+Tabloyu id aralıklarıyla (chunk) dolaşır, her chunk ayrı transaction'da commit edilir;
+yarıda kesilirse tekrar çalıştırmak güvenlidir (yalnızca root_msg_id IS NULL satırlara dokunur).
+
+    python -m app.jobs.reply_roots_backfill [--chunk 20000]
+"""
+from __future__ import annotations
+import argparse
+from sqlalchemy import text
+from app.db.session import engine
+from app.services.report_cache import report_cache
+
+_REPLY_PARENT_SQL = """
+UPDATE raw_messages
+SET parent_msg_id = NULLIF(COALESCE(
+      json->'message'->'reply_to_message'->>'message_id',
+      json->'edited_message'->'reply_to_message'->>'message_id',
+      json->'channel_post'->'reply_to_message'->>'message_id',
+      json->'edited_channel_post'->'reply_to_message'->>'message_id'
+    ), '')::int
+WHERE id >= :lo AND id < :hi
+  AND root_msg_id IS NULL AND parent_msg_id IS NULL
+"""
+
+# reply olmayan mesaj kendi kökü
+_SELF_ROOT_SQL = """
+UPDATE raw_messages SET root_msg_id = msg_id
+WHERE id >= :lo AND id < :hi
+  AND root_msg_id IS NULL AND parent_msg_id IS NULL
+"""
+
+# parent'ı raw'da olmayan reply → zincir burada biter, kök = parent
+_ORPHAN_ROOT_SQL = """
+UPDATE raw_messages c SET root_msg_id = c.parent_msg_id
+WHERE c.id >= :lo AND c.id < :hi
+  AND c.root_msg_id IS NULL AND c.parent_msg_id IS NOT NULL
+  AND NOT EXISTS (
+    SELECT 1 FROM raw_messages p WHERE p.chat_id = c.chat_id AND p.msg_id = c.parent_msg_id
+  )
+"""
+
+# bir seviye yukarı: parent'ın kökü biliniyorsa onu devral
+_PROPAGATE_SQL = """
+UPDATE raw_messages c SET root_msg_id = p.root_msg_id
+FROM raw_messages p
+WHERE c.id >= :lo AND c.id < :hi
+  AND c.root_msg_id IS NULL AND c.parent_msg_id IS NOT NULL
+  AND p.chat_id = c.chat_id AND p.msg_id = c.parent_msg_id
+  AND p.root_msg_id IS NOT NULL
+"""
+
+_EVENTS_SQL = """
+UPDATE events e SET parent_msg_id = r.parent_msg_id, root_msg_id = r.root_msg_id
+FROM raw_messages r
+WHERE e.id >= :lo AND e.id < :hi
+  AND e.root_msg_id IS NULL
+  AND r.chat_id = e.chat_id AND r.msg_id = e.msg_id
+  AND r.root_msg_id IS NOT NULL
+"""
+
+
+def _id_bounds(conn, table: str):
+    row = conn.execute(text(f"SELECT MIN(id), MAX(id) FROM {table}")).first()
+    return (row[0], row[1]) if row and row[0] is not None else (None, None)
+
+
+def _run_chunked(sql: str, table: str, chunk: int) -> int:
+    with engine.connect() as conn:
+        lo, hi = _id_bounds(conn, table)
+    if lo is None:
+        return 0
+    total = 0
+    start = lo
+    while start <= hi:
+        with engine.begin() as conn:
+            total += conn.execute(text(sql), {"lo": start, "hi": start + chunk}).rowcount or 0
+        start += chunk
+    return total
+
+
+def backfill_reply_roots(chunk: int = 20000, max_depth: int = 200) -> dict:
+    chunk = max(1000, chunk)
+    out = {
+        "parents": _run_chunked(_REPLY_PARENT_SQL, "raw_messages", chunk),
+        "self_roots": _run_chunked(_SELF_ROOT_SQL, "raw_messages", chunk),
+        "orphan_roots": _run_chunked(_ORPHAN_ROOT_SQL, "raw_messages", chunk),
+        "propagated": 0,
+        "passes": 0,
+    }
+    # Her geçiş zinciri bir seviye çözer; yeni satır güncellenmeyince dur (döngüler NULL kalır)
+    for _ in range(max_depth):
+        n = _run_chunked(_PROPAGATE_SQL, "raw_messages", chunk)
+        out["passes"] += 1
+        out["propagated"] += n
+        if n == 0:
+            break
+    out["events"] = _run_chunked(_EVENTS_SQL, "events", chunk)
+    with engine.begin() as conn:
+        report_cache.bump(conn)  # events.root_msg_id değişti → rapor sonuçları
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunk", type=int, default=20000)
+    args = ap.parse_args()
+    print(backfill_reply_roots(chunk=args.chunk))
@@ -0,0 +1,143 @@
+# apps/api/app/jobs/threads_rebuild.py
+"""
+threads tablosunu events'ten yeniden kurar (geçmiş doldurma / tutarlılık onarımı).
+
+Ingest yolu threads'i canlı tutar; bu komut ilk kurulumda ve gerekirse onarım için çalıştırılır.
+since verilirse yalnızca o tarihten sonra eventi olan correlation_id'ler yeniden hesaplanır.
+Canlı ingest ile aynı anda çalışabilir: satırlar ingest upsert'iyle aynı kurallarla birleştirilir
+(threads_service.MERGE_SET_SQL: erken ts kazanır, mevcut değer silinmez / ileri kaydırılmaz).
+Tekrar çalıştırmak güvenlidir.
+
+    python -m app.jobs.threads_rebuild [--since-days 30]
+"""
+from __future__ import annotations
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text, bindparam
+from app.db.session import SessionLocal, engine
+from app.services.admin_settings_service import get_setting, set_setting
+from app.services.report_cache import report_cache
+from app.services.threads_service import CLOSE_TYPES, MERGE_SET_SQL, THREAD_EVENT_TYPES
+
+# İlk kurulum tamamlandı mı (boş DB'de her açılışta tekrar denenmesin)
+THREADS_BUILT_KEY = "threads_initial_build_at"
+
+_REBUILD_SQL = f"""
+WITH
+k AS (
+  SELECT DISTINCT ON (e.correlation_id) e.correlation_id, e.source_channel, e.chat_id
+  FROM events e
+  WHERE e.type IN :thread_types
+    AND (CAST(:since AS TIMESTAMP) IS NULL OR e.correlation_id IN (
+          SELECT s.correlation_id FROM events s WHERE s.ts >= :since AND s.type IN :thread_types))
+  ORDER BY e.correlation_id, e.ts, e.id
+),
+o AS (
+  SELECT DISTINCT ON (e.correlation_id) e.correlation_id, e.ts, e.msg_id
+  FROM events e JOIN k ON k.correlation_id = e.correlation_id
+  WHERE e.type = 'origin'
+  ORDER BY e.correlation_id, e.ts, e.id
+),
+f AS (
+  SELECT DISTINCT ON (e.correlation_id) e.correlation_id, e.ts, e.employee_id
+  FROM events e JOIN k ON k.correlation_id = e.correlation_id
+  WHERE e.type = 'reply_first'
+  ORDER BY e.correlation_id, e.ts, e.id
+),
+c AS (
+  SELECT DISTINCT ON (e.correlation_id) e.correlation_id, e.ts, e.type, e.employee_id, e.msg_id
+  FROM events e JOIN k ON k.correlation_id = e.correlation_id
+  WHERE e.type IN :close_types
+  ORDER BY e.correlation_id, e.ts, e.id
+),
+-- daha erkene kayan ilk yanıt / kapanış zamanlarının eski saatleri → metrics_hourly tazelemesi
+prev AS (
+  INSERT INTO metrics_hourly_dirty (source_channel, hour)
+  SELECT DISTINCT t.source_channel, date_trunc('hour', v.ts)
+  FROM k
+  JOIN threads t ON t.correlation_id = k.correlation_id
+  LEFT JOIN f ON f.correlation_id = k.correlation_id
+  LEFT JOIN c ON c.correlation_id = k.correlation_id
+  CROSS JOIN LATERAL (VALUES
+    (CASE WHEN t.first_reply_ts > f.ts THEN t.first_reply_ts END),
+    (CASE WHEN t.first_close_ts > c.ts THEN t.first_close_ts END)
+  ) AS v(ts)
+  WHERE v.ts IS NOT NULL
+  ON CONFLICT DO NOTHING
+)
+INSERT INTO threads AS t (
+  correlation_id, source_channel, chat_id,
+  origin_ts, origin_msg_id,
+  first_reply_ts, first_reply_emp,
+  first_close_ts, close_type, closer_emp, first_close_msg_id,
+  updated_at
+)
+SELECT k.correlation_id, k.source_channel, k.chat_id,
+       o.ts, o.msg_id,
+       f.ts, f.employee_id,
+       c.ts, c.type, c.employee_id, c.msg_id,
+       now() AT TIME ZONE 'UTC'
+FROM k
+LEFT JOIN o ON o.correlation_id = k.correlation_id
+LEFT JOIN f ON f.correlation_id = k.correlation_id
+LEFT JOIN c ON c.correlation_id = k.correlation_id
+ON CONFLICT (correlation_id) DO UPDATE SET
+{MERGE_SET_SQL}
+"""
+
+_STMT = text(_REBUILD_SQL).bindparams(
+    bindparam("thread_types", expanding=True),
+    bindparam("close_types", expanding=True),
+)
+
+
+def rebuild_threads(since: datetime | None = None) -> dict:
+    with engine.begin() as conn:
+        n = conn.execute(
+            _STMT,
+            {"since": since, "thread_types": list(THREAD_EVENT_TYPES), "close_types": list(CLOSE_TYPES)},
+        ).rowcount or 0
+        report_cache.bump(conn)
+    return {"threads": n, "since": since.isoformat() if since else None}
+
+
+
+def initial_build() -> dict | None:
+    """
+    threads geçmişi hiç kurulmadıysa (admin_settings işareti yok) events'ten kurar; işaret yalnızca
+    başarılı rebuild'den sonra yazılır (hata → sonraki açılışta tekrar). Karar tabloya bakmaz: açılışta
+    canlı ingest'in eklediği satırlar geçmişin kurulduğu anlamına gelmez, birleştirme onları korur.
+    Birden çok worker aynı anda açılırsa yalnızca transaction kilidini alan kurar.
+    """
+    with SessionLocal() as db:
+        if get_setting(db, THREADS_BUILT_KEY):
+            return None
+        if not db.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('threads_initial_build'))")).scalar():
+            return None
+        if get_setting(db, THREADS_BUILT_KEY):  # kilidi beklerken başka worker bitirmiş olabilir
+            return None
+        out = rebuild_threads()
+        set_setting(db, THREADS_BUILT_KEY, datetime.now(timezone.utc).isoformat())  # commit → kilit bırakılır
+        return out
+
+
+def start_initial_build() -> None:
+    """Startup için: ilk kurulumu arka planda yapar (büyük DB'de açılışı/health check'i bloklamaz)."""
+    def _target() -> None:
+        try:
+            out = initial_build()
+            if out is not None:
+                print(f"[threads] initial build: {out}")
+        except Exception as e:
+            print(f"[threads] initial build err: {e}")
+
+    threading.Thread(target=_target, name="threads-initial-build", daemon=True).start()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--since-days", type=int, default=0, help="0 = tüm geçmiş")
+    args = ap.parse_args()
+    since = datetime.now(timezone.utc) - timedelta(days=args.since_days) if args.since_days > 0 else None
+    print(rebuild_threads(since=since))
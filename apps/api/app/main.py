@@ -6,7 +6,7 @@ from sqlalchemy import text
 
 from app.core.config import settings
 from app.db.base import Base
-from app.db.session import engine
+from app.db.session import engine, SessionLocal
 
 # MODELLER
 import app.models.events
@@ -64,9 +64,23 @@ try:
 except Exception as e:
     print(f"[livechat-supervise] router not loaded: {e}")
 
+# ⬇️ KPI skor router (opsiyonel: numpy)
+_kpi_router = None
+try:
+    from app.api.routes_kpi import router as kpi_router
+    _kpi_router = kpi_router
+except Exception as e:
+    print(f"[kpi] router not loaded: {e}")
+
 # Scheduler
 from app.scheduler.admin_tasks_jobs import start_scheduler
 
+# Telegram ingest kuyruğu (TG_INGEST_MODE=queue)
+from app.services.telegram_ingest import ingest_writer, queue_mode_enabled
+from app.services.sla_watchdog import sla_watchdog
+from app.services.report_cache import report_cache
+from app.jobs.threads_rebuild import start_initial_build
+
 app = FastAPI(title=settings.APP_NAME)
 
 # ---------------- CORS (PROD origin + local) ----------------
@@ -100,12 +114,80 @@ MIGRATIONS_SQL = [
     "ALTER TABLE IF EXISTS raw_messages ALTER COLUMN from_user_id TYPE BIGINT USING from_user_id::bigint;",
     "ALTER TABLE IF EXISTS events       ALTER COLUMN from_user_id TYPE BIGINT USING from_user_id::bigint;",
 
+    # Reply zinciri kolonları (geçmiş: /jobs/backfill/reply-roots)
+    "ALTER TABLE IF EXISTS raw_messages ADD COLUMN IF NOT EXISTS parent_msg_id INTEGER;",
+    "ALTER TABLE IF EXISTS raw_messages ADD COLUMN IF NOT EXISTS root_msg_id INTEGER;",
+    "ALTER TABLE IF EXISTS events       ADD COLUMN IF NOT EXISTS parent_msg_id INTEGER;",
+    "ALTER TABLE IF EXISTS events       ADD COLUMN IF NOT EXISTS root_msg_id INTEGER;",
+    "CREATE INDEX IF NOT EXISTS ix_rawmsg_chat_root ON raw_messages(chat_id, root_msg_id);",
+    "CREATE INDEX IF NOT EXISTS ix_events_chat_root ON events(chat_id, root_msg_id);",
+
+    # Kanal + zaman penceresi taramaları (close-time, threads rebuild --since)
+    "CREATE INDEX IF NOT EXISTS ix_events_ch_ts ON events(source_channel, ts);",
+
+    # metrics_hourly: kapatana yazılan ilk yanıt süreleri pencereye bağlı, rollup'tan çıkarıldı (canlı okunur)
+    "ALTER TABLE IF EXISTS metrics_hourly"
+    " DROP COLUMN IF EXISTS close_first_cnt, DROP COLUMN IF EXISTS close_first_sum,"
+    " DROP COLUMN IF EXISTS close_first_over_30, DROP COLUMN IF EXISTS close_first_over_60;",
+
+    # metrics_hourly kirli saat taraması (threads.updated_at > watermark)
+    "CREATE INDEX IF NOT EXISTS ix_threads_updated_at ON threads(updated_at);",
+    "CREATE INDEX IF NOT EXISTS ix_threads_ch_origin_waiting ON threads(source_channel, origin_ts)"
+    " WHERE first_reply_ts IS NULL AND first_close_ts IS NULL;",
+
+    # facts_daily: (actor_key, day, kpi_code) tekil (derive_daily upsert'i); eski tekrarlarda en yeni satır kalır
+    "DO $$ BEGIN "
+    "  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname='uq_facts_daily_actor_day_kpi') THEN "
+    "    DELETE FROM facts_daily a USING facts_daily b "
+    "     WHERE a.actor_key = b.actor_key AND a.day = b.day AND a.kpi_code = b.kpi_code AND a.id < b.id; "
+    "    ALTER TABLE facts_daily ADD CONSTRAINT uq_facts_daily_actor_day_kpi UNIQUE (actor_key, day, kpi_code); "
+    "  END IF; "
+    "END $$;",
+    # facts_monthly: (actor_key, period, kpi_code) tekil (facts_rollup upsert'i)
+    "DO $$ BEGIN "
+    "  IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname='uq_facts_monthly_actor_period_kpi') THEN "
+    "    DELETE FROM facts_monthly a USING facts_monthly b "
+    "     WHERE a.actor_key = b.actor_key AND a.period = b.period AND a.kpi_code = b.kpi_code AND a.id < b.id; "
+    "    ALTER TABLE facts_monthly ADD CONSTRAINT uq_facts_monthly_actor_period_kpi UNIQUE (actor_key, period, kpi_code); "
+    "  END IF; "
+    "END $$;",
+    # facts_*: employee_id (onaylı identity) → personel kartı tek index aralığı
+    "ALTER TABLE IF EXISTS facts_daily ADD COLUMN IF NOT EXISTS employee_id VARCHAR(64);",
+    "ALTER TABLE IF EXISTS facts_monthly ADD COLUMN IF NOT EXISTS employee_id VARCHAR(64);",
+    "CREATE INDEX IF NOT EXISTS ix_facts_daily_emp_day ON facts_daily(employee_id, day);",
+    "CREATE INDEX IF NOT EXISTS ix_facts_monthly_emp_period ON facts_monthly(employee_id, period);",
+    "CREATE INDEX IF NOT EXISTS ix_facts_daily_inserted_at ON facts_daily(inserted_at);",
+    # events: bind sırasında actor'ın eşlenmemiş eventleri (tek UPDATE, index aralığı)
+    "CREATE INDEX IF NOT EXISTS ix_events_unattributed_uid ON events(from_user_id, ts) WHERE employee_id IS NULL;",
+    "CREATE INDEX IF NOT EXISTS ix_events_unattributed_uname ON events(from_username, ts) WHERE employee_id IS NULL;",
+    "UPDATE facts_daily f SET employee_id = ei.employee_id FROM employee_identities ei"
+    " WHERE f.employee_id IS NULL AND ei.actor_key = f.actor_key AND ei.status = 'confirmed';",
+    "UPDATE facts_monthly f SET employee_id = ei.employee_id FROM employee_identities ei"
+    " WHERE f.employee_id IS NULL AND ei.actor_key = f.actor_key AND ei.status = 'confirmed';",
+    # Gün bazlı backfill işlerinin tamamlanan günleri (resume)
+    "CREATE TABLE IF NOT EXISTS job_checkpoints ("
+    " job VARCHAR(64) NOT NULL,"
+    " day DATE NOT NULL,"
+    " rows INTEGER NOT NULL DEFAULT 0,"
+    " done_at TIMESTAMP NOT NULL DEFAULT NOW(),"
+    " PRIMARY KEY (job, day)"
+    ");",
+    # RD-xxx personel id'leri (services.employee_ids); mevcut en büyük RD numarasının gerisinde kalmasın
+    "CREATE SEQUENCE IF NOT EXISTS employee_rd_seq;",
+    "DO $$ DECLARE m BIGINT; BEGIN "
+    "  SELECT COALESCE(MAX(CAST(substring(employee_id FROM '^RD-([0-9]+)$') AS BIGINT)), 0) INTO m "
+    "    FROM employees WHERE employee_id LIKE 'RD-%'; "
+    "  IF m > 0 AND m >= (SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM employee_rd_seq) THEN "
+    "    PERFORM setval('employee_rd_seq', m, true); "
+    "  END IF; "
+    "END $$;",
+
     "ALTER TABLE IF EXISTS employees ADD COLUMN IF NOT EXISTS department VARCHAR(32);",
     "ALTER TABLE IF EXISTS employees ADD COLUMN IF NOT EXISTS telegram_username VARCHAR(255);",
     "ALTER TABLE IF EXISTS employees ADD COLUMN IF NOT EXISTS telegram_user_id BIGINT;",
     "ALTER TABLE IF EXISTS employees ADD COLUMN IF NOT EXISTS phone VARCHAR(32);",
     "ALTER TABLE IF EXISTS employees ADD COLUMN IF NOT EXISTS salary_gross NUMERIC;",
-    "ALTER TABLE IF NOT EXISTS employees ADD COLUMN IF NOT EXISTS notes TEXT;",
+    "ALTER TABLE IF EXISTS employees ADD COLUMN IF NOT EXISTS notes TEXT;",
 
     "DO $$ BEGIN "
     "  IF EXISTS (SELECT 1 FROM information_schema.columns "
@@ -187,6 +269,16 @@ def run_startup_migrations():
             except Exception as e:
                 print(f"[startup-migration] skip/err: {e}")
 
+    # yeni sürüm: önceki süreçlerin rapor sonuçları/ETag'leri geçersiz (hesaplama değişmiş olabilir)
+    try:
+        with engine.begin() as conn:
+            report_cache.bump(conn)
+    except Exception as e:
+        print(f"[report-cache] bump err: {e}")
+
+    # threads özeti ilk deploy'da boşsa events'ten arka planda kurulur (sonrasını ingest günceller)
+    start_initial_build()
+
     # Scheduler
     try:
         if os.getenv("RUN_SCHEDULER", "1") == "1":
@@ -197,12 +289,36 @@ def run_startup_migrations():
     except Exception as e:
         print(f"[scheduler] start err: {e}")
 
+    # Telegram ingest writer
+    if queue_mode_enabled():
+        ingest_writer.start()
+        print(f"[tg-ingest] queue mode (batch={ingest_writer.batch_size}, flush={ingest_writer.flush_sec}s)")
+
+    # İlk yanıt SLA bekçisi: restart'ta son N saatin yanıtsız origin'lerinden kurulur
+    if settings.SLA_WATCHDOG_ENABLED:
+        try:
+            sla_watchdog.start()
+            with SessionLocal() as db:
+                n = sla_watchdog.rebuild(db)
+            print(f"[sla-watchdog] started (first={sla_watchdog.first_sec}s, rebuilt={n})")
+        except Exception as e:
+            print(f"[sla-watchdog] start err: {e}")
+
     # LiveChat env kontrol (log)
     if os.getenv("TEXT_BASE64_TOKEN"):
         print("[livechat] env ok (TEXT_BASE64_TOKEN set)")
     else:
         print("[livechat] TEXT_BASE64_TOKEN not set; /livechat ve /report uçları 401 dönebilir")
 
+@app.on_event("shutdown")
+def drain_ingest_queue():
+    # Kabul edilmiş (200 dönülmüş) hiçbir update kaybolmasın
+    if ingest_writer.running:
+        ingest_writer.stop()
+        print(f"[tg-ingest] drained: {ingest_writer.snapshot()}")
+    # kuyruk boşaldıktan sonra (son eventler bekçiye işlenmiş olur)
+    sla_watchdog.stop()
+
 @app.get("/healthz")
 def healthz():
     return {"ok": True}
@@ -230,6 +346,9 @@ app.include_router(admin_notify_router)
 app.include_router(shifts_router)                # /shifts
 app.include_router(shift_assignments_router)     # /shift-assignments
 app.include_router(shift_weeks_router)           # /shift-weeks
+if _kpi_router:
+    app.include_router(_kpi_router)              # /kpi/*
+
 if _livechat_router:
     print("[livechat] router included at /livechat")
     app.include_router(_livechat_router)         # /livechat
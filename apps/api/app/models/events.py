@@ -1,6 +1,6 @@
 # apps/api/app/models/events.py
 from datetime import datetime
-from sqlalchemy import BigInteger, Integer, String, DateTime, JSON, UniqueConstraint
+from sqlalchemy import BigInteger, Integer, Float, String, DateTime, JSON, UniqueConstraint, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 
@@ -17,10 +17,16 @@ class RawMessage(Base):
     ts: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     channel_tag: Mapped[str] = mapped_column(String(24))   # bonus|finans|mesai|other
     kind: Mapped[str] = mapped_column(String(24))          # msg|reply|edit|channel_post
+    # Reply zinciri: doğrudan yanıtlanan mesaj ve zincirin kökü (reply olmayan ilk mesaj)
+    parent_msg_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    root_msg_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     json: Mapped[dict] = mapped_column(JSON)
     inserted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("chat_id", "msg_id", name="uq_rawmsg_chat_msg"),)
+    __table_args__ = (
+        UniqueConstraint("chat_id", "msg_id", name="uq_rawmsg_chat_msg"),
+        Index("ix_rawmsg_chat_root", "chat_id", "root_msg_id"),
+    )
 
 
 class Event(Base):
@@ -32,6 +38,8 @@ class Event(Base):
     chat_id: Mapped[int] = mapped_column(BigInteger, index=True)
     msg_id: Mapped[int] = mapped_column(Integer)
     correlation_id: Mapped[str] = mapped_column(String(128), index=True)  # f"{chat_id}:{origin_msg_id}"
+    parent_msg_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    root_msg_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     ts: Mapped[datetime] = mapped_column(DateTime, index=True, nullable=False)
     # Telegram UID'leri için BIGINT
     from_user_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
@@ -41,4 +49,75 @@ class Event(Base):
     payload_json: Mapped[dict] = mapped_column(JSON)
     inserted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    __table_args__ = (UniqueConstraint("correlation_id", "type", name="uq_event_corr_type"),)
+    __table_args__ = (
+        UniqueConstraint("correlation_id", "type", name="uq_event_corr_type"),
+        Index("ix_events_chat_root", "chat_id", "root_msg_id"),
+        Index("ix_events_ch_ts", "source_channel", "ts"),
+        # /identities/bind geriye dönük atama: yalnızca henüz eşlenmemiş eventler
+        Index("ix_events_unattributed_uid", "from_user_id", "ts", postgresql_where=text("employee_id IS NULL")),
+        Index("ix_events_unattributed_uname", "from_username", "ts", postgresql_where=text("employee_id IS NULL")),
+    )
+
+
+class Thread(Base):
+    """
+    correlation_id başına thread özeti (events'ten türetilir).
+    Ingest sırasında upsert edilir (services.threads_service); geçmiş için /jobs/threads/rebuild.
+    """
+    __tablename__ = "threads"
+
+    correlation_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    source_channel: Mapped[str] = mapped_column(String(16))
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    origin_ts: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    origin_msg_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    first_reply_ts: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    first_reply_emp: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    first_close_ts: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    close_type: Mapped[str | None] = mapped_column(String(24), nullable=True)
+    closer_emp: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    first_close_msg_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_threads_ch_first_reply", "source_channel", "first_reply_ts"),
+        Index("ix_threads_ch_first_close", "source_channel", "first_close_ts"),
+        Index("ix_threads_updated_at", "updated_at"),
+        # SLA bekçisi yeniden kurulumu: yanıt/kapanış bekleyen origin'ler
+        Index(
+            "ix_threads_ch_origin_waiting", "source_channel", "origin_ts",
+            postgresql_where=text("first_reply_ts IS NULL AND first_close_ts IS NULL"),
+        ),
+    )
+
+
+class MetricsHourly(Base):
+    """
+    (kanal, saat [UTC], personel) başına threads toplamları; periyodik/günlük raporlar bunu toplar.
+    employee_id = '' → atanmamış (closer/first_reply personeli yok).
+    close_cnt: o saatte kapanan thread'ler (kapatan kişiye yazılır)
+    first_*: o saatte ilk yanıtı gelen thread'ler (ilk yanıtlayan kişiye yazılır)
+    over_N: süre > N sn. Tazeleme: services.metrics_rollup.
+    """
+    __tablename__ = "metrics_hourly"
+
+    source_channel: Mapped[str] = mapped_column(String(16), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    employee_id: Mapped[str] = mapped_column(String(64), primary_key=True)
+    close_cnt: Mapped[int] = mapped_column(Integer, default=0)
+    first_cnt: Mapped[int] = mapped_column(Integer, default=0)
+    first_sum: Mapped[float] = mapped_column(Float, default=0)
+    first_over_30: Mapped[int] = mapped_column(Integer, default=0)
+    first_over_60: Mapped[int] = mapped_column(Integer, default=0)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
+class MetricsHourlyDirty(Base):
+    """
+    threads'te ilk yanıt / kapanış zamanı değişen satırların ESKİ saatleri (güncel saatler
+    threads.updated_at ile bulunur). Bir sonraki metrics_hourly tazelemesi bu saatleri de yeniden yazar.
+    """
+    __tablename__ = "metrics_hourly_dirty"
+
+    source_channel: Mapped[str] = mapped_column(String(16), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
@@ -1,12 +1,13 @@
 from datetime import datetime, date
-from sqlalchemy import Integer, String, Date, DateTime, Float
+from sqlalchemy import Integer, String, Date, DateTime, Float, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from app.db.base import Base
 
 class FactDaily(Base):
     __tablename__ = "facts_daily"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    actor_key: Mapped[str] = mapped_column(String(128), index=True)  # "uid:123" | "uname:@nick" | ileride employee_id
+    actor_key: Mapped[str] = mapped_column(String(128), index=True)  # "uid:123" | "uname:nick"
+    employee_id: Mapped[str | None] = mapped_column(String(64), nullable=True)  # onaylı identity (bind'da yeniden yazılır)
     day: Mapped[date] = mapped_column(Date, index=True)
     kpi_code: Mapped[str] = mapped_column(String(64), index=True)    # KPI_FIRST_SEC | KPI_CLOSE_SEC | KPI_KT_COUNT
     value: Mapped[float] = mapped_column(Float)
@@ -14,13 +15,25 @@ class FactDaily(Base):
     source: Mapped[str] = mapped_column(String(16), default="telegram")
     inserted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        UniqueConstraint("actor_key", "day", "kpi_code", name="uq_facts_daily_actor_day_kpi"),
+        Index("ix_facts_daily_emp_day", "employee_id", "day"),
+        Index("ix_facts_daily_inserted_at", "inserted_at"),
+    )
+
 class FactMonthly(Base):
     __tablename__ = "facts_monthly"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     actor_key: Mapped[str] = mapped_column(String(128), index=True)
+    employee_id: Mapped[str | None] = mapped_column(String(64), nullable=True)
     period: Mapped[str] = mapped_column(String(7), index=True)       # "YYYY-MM"
     kpi_code: Mapped[str] = mapped_column(String(64), index=True)
-    value: Mapped[float] = mapped_column(Float)
+    value: Mapped[float] = mapped_column(Float)                      # süre KPI'ları: samples ağırlıklı ort.; adetler: toplam
     samples: Mapped[int] = mapped_column(Integer, default=0)
     source: Mapped[str] = mapped_column(String(16), default="telegram")
     inserted_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("actor_key", "period", "kpi_code", name="uq_facts_monthly_actor_period_kpi"),
+        Index("ix_facts_monthly_emp_period", "employee_id", "period"),
+    )
@@ -14,19 +14,14 @@ from app.services.admin_tasks_service import (
 )
 from app.services.attendance_service import attendance_check_and_report
 
-# BONUS: metrics + template + telegram
-from app.services.bonus_metrics_service import (
-    compute_bonus_daily_context,
-    compute_bonus_periodic_context,
-)
-from app.services.template_engine import render
-# ⬇️ Bonus raporlarını hem genel gruba hem BONUS_TG_CHAT_ID'ye yollamak için
-from app.services.telegram_notify import send_bonus_to_both
+# BONUS/FİNANS: metrics engine + mesaj + telegram (genel grup + kanal grubu)
+from app.services.metrics_engine import compute_daily_contexts, compute_periodic_contexts
+from app.services.metrics_reports import enabled_channels, daily_message, periodic_message, send_channel_report
+from app.services.metrics_rollup import refresh_metrics_hourly
 
 # Settings
 from app.services.admin_settings_service import (
     get_bool,
-    BONUS_TG_ENABLED_KEY,
     ADMIN_TASKS_TG_ENABLED_KEY,
     ATTENDANCE_TG_ENABLED_KEY,
 )
@@ -103,88 +98,38 @@ def job_attendance_daily_2000(db):
     attendance_check_and_report(db, date(now.year, now.month, now.day))
 
 
-# --------- BONUS: Gün Sonu (00:15, dün) ---------
+# --------- Saatlik rollup (metrics_hourly) ---------
+@_with_db
+def job_metrics_hourly_refresh(db):
+    # Toggle'dan bağımsız; raporlar rollup'ı yalnızca okur (watermark sonrası farkı threads'ten canlı alır)
+    refresh_metrics_hourly(db)
+
+
+# --------- BONUS + FİNANS: Gün Sonu (00:15, dün) ---------
 @_with_db
-def job_bonus_day_end_0015(db):
-    if not _enabled(db, BONUS_TG_ENABLED_KEY):
+def job_metrics_day_end_0015(db):
+    channels = enabled_channels(db)
+    if not channels:
         return
     y = datetime.now(IST) - timedelta(days=1)
     target = date(y.year, y.month, y.day)
-    ctx = compute_bonus_daily_context(db, target, sla_first_sec=60)
-
-    slow_text = "\n".join(
-        [f"- {i.get('full_name','-')} — {int(i.get('gt60_cnt') or 0)} işlem" for i in ctx["slow_list"]]
-    ) or "- —"
-    per_emp_text = "\n".join(
-        [
-            f"- {i.get('full_name','-')} — {int(i.get('close_cnt') or 0)} işlem • Ø "
-            f"{(str(int(round(i['avg_first_emp'])))+' sn') if i.get('avg_first_emp') is not None else '—'}"
-            for i in ctx["per_emp"]
-        ]
-    ) or "- —"
-
-    msg = render(
-        db,
-        "bonus_daily_v2",
-        {
-            "date": ctx["date_label"],
-            "total_close": ctx["total_close"],
-            "avg_first": (ctx["avg_first_sec"] if ctx["avg_first_sec"] is not None else "—"),
-            "gt60_total": ctx["gt60_total"],
-            "slow_list_text": slow_text,
-            "per_emp_text": per_emp_text,
-        },
-        fallback=(
-            "📊 *BONUS GÜN SONU RAPORU — {date}*\n"
-            "- *Toplam Kapanış:* {total_close}\n"
-            "- *Ø İlk Yanıt:* {avg_first} sn\n"
-            "- *60 sn üzeri işlemler:* {gt60_total}\n\n"
-            "⚠️ *Geç Yanıt Verenler (60 sn üzeri)*\n{slow_list_text}\n\n"
-            "👥 *Personel Bazlı İşlem Sayıları*\n{per_emp_text}"
-        ),
-        channel="bonus",
-    )
-    # ⬇️ Hem genel hem BONUS gruba gönder
-    send_bonus_to_both(msg)
+    # Açık tüm kanallar tek DB geçişinde
+    ctxs = compute_daily_contexts(db, target, sla_first_sec=60, channels=channels)
+    for ch in channels:
+        # ⬇️ Hem genel hem kanal grubuna gönder
+        send_channel_report(ch, daily_message(db, ch, ctxs[ch], sla_first_sec=60))
 
 
-# --------- BONUS: 2 saatlik (çift saatler) ---------
+# --------- BONUS + FİNANS: 2 saatlik (çift saatler) ---------
 @_with_db
-def job_bonus_periodic_2h(db):
-    if not _enabled(db, BONUS_TG_ENABLED_KEY):
+def job_metrics_periodic_2h(db):
+    channels = enabled_channels(db)
+    if not channels:
         return
     end_ist = datetime.now(IST)
-    ctx = compute_bonus_periodic_context(db, end_ist, hours=2, kt30_sec=30)
-
-    per_emp_text = "\n".join(
-        [f"- {i.get('full_name','-')} — *{int(i.get('close_cnt') or 0)}* işlem" for i in ctx.get("per_emp", [])]
-    ) or "- —"
-    slow30_list = ctx.get("slow_30", [])
-    slow30_text = "\n".join(
-        [f"- {i.get('full_name','-')} — *{int(i.get('gt30_cnt') or 0)}* işlem" for i in slow30_list]
-    )
-    slow30_block = f"\n\n⚠️ *30 sn üzeri İlk KT*\n{slow30_text}" if slow30_text else ""
-
-    msg = render(
-        db,
-        "bonus_periodic_v2",
-        {
-            "date": ctx["date_label"],
-            "win_start": ctx["win_start"],
-            "win_end": ctx["win_end"],
-            "total_close": ctx["total_close"],
-            "per_emp_text": per_emp_text,
-            "slow30_block": slow30_block,
-        },
-        fallback=(
-            "⏱️ *BONUS 2 SAATLİK RAPOR* — *{date} {win_start}–{win_end}*\n\n"
-            "• *Toplam Kapanış:* {total_close}\n\n"
-            "👤 *Personel Bazında*\n{per_emp_text}{slow30_block}"
-        ),
-        channel="bonus",
-    )
-    # ⬇️ Hem genel hem BONUS gruba gönder
-    send_bonus_to_both(msg)
+    ctxs = compute_periodic_contexts(db, end_ist, hours=2, kt30_sec=30, channels=channels)
+    for ch in channels:
+        send_channel_report(ch, periodic_message(db, ch, ctxs[ch], kt30_sec=30))
 
 
 def start_scheduler():
@@ -200,14 +145,17 @@ def start_scheduler():
     # Attendance
     scheduler.add_job(job_attendance_daily_2000, "cron", hour=20, minute=0, id="attendance_2000", replace_existing=True)
 
-    # BONUS
-    scheduler.add_job(job_bonus_day_end_0015, "cron", hour=0, minute=15, id="bonus_day_end_0015", replace_existing=True)
+    # Saatlik rollup
+    scheduler.add_job(job_metrics_hourly_refresh, "interval", minutes=5, id="metrics_hourly_5m", replace_existing=True)
+
+    # BONUS + FİNANS
+    scheduler.add_job(job_metrics_day_end_0015, "cron", hour=0, minute=15, id="metrics_day_end_0015", replace_existing=True)
     scheduler.add_job(
-        job_bonus_periodic_2h,
+        job_metrics_periodic_2h,
         "cron",
         hour="0,2,4,6,8,10,12,14,16,18,20,22",
         minute=0,
-        id="bonus_periodic_2h",
+        id="metrics_periodic_2h",
         replace_existing=True,
     )
 
@@ -0,0 +1,306 @@
+# apps/api/app/services/close_time_service.py
+from __future__ import annotations
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Literal, Tuple
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.report_cache import is_closed_range, report_data_version
+
+CLOSE_TYPES = ("reply_close", "approve", "reject")
+
+# raw JSON'daki reply parent'ı (parent_msg_id henüz backfill edilmemiş satırlar için)
+_PARENT_EXPR = """COALESCE({a}.parent_msg_id, NULLIF(COALESCE(
+      {a}.json->'message'->'reply_to_message'->>'message_id',
+      {a}.json->'edited_message'->'reply_to_message'->>'message_id',
+      {a}.json->'channel_post'->'reply_to_message'->>'message_id',
+      {a}.json->'edited_channel_post'->'reply_to_message'->>'message_id'
+    ), '')::int)"""
+
+# Ortak gövde: {ev_filter} ile seçilen eventlerin kök origin'ine göre süresi (secs)
+_SECS_CTES = f"""
+WITH RECURSIVE
+ev AS (
+  SELECT e.id, e.type, e.chat_id, e.msg_id, e.ts, e.employee_id
+  FROM events e
+  WHERE e.source_channel = :ch
+    AND e.employee_id IS NOT NULL
+    AND (CAST(:dept AS TEXT) IS NULL
+         OR e.employee_id IN (SELECT em.employee_id FROM employees em WHERE em.department = :dept))
+    AND {{ev_filter}}
+),
+src AS (
+  -- event mesajının raw kaydı; yoksa kök bulunamaz (satır düşer)
+  SELECT ev.*, s.root_msg_id AS raw_root
+  FROM ev
+  JOIN raw_messages s ON s.chat_id = ev.chat_id AND s.msg_id = ev.msg_id
+),
+walk AS (
+  -- root_msg_id boş (backfill bekleyen) satırlar için zinciri SQL içinde yürü
+  SELECT src.id AS ev_id, s.chat_id, s.msg_id, {_PARENT_EXPR.format(a="s")} AS parent, 0 AS depth
+  FROM src
+  JOIN raw_messages s ON s.chat_id = src.chat_id AND s.msg_id = src.msg_id
+  WHERE src.raw_root IS NULL
+  UNION ALL
+  SELECT w.ev_id, p.chat_id, p.msg_id, {_PARENT_EXPR.format(a="p")}, w.depth + 1
+  FROM walk w
+  JOIN raw_messages p ON p.chat_id = w.chat_id AND p.msg_id = w.parent
+  WHERE w.parent IS NOT NULL AND w.depth < :max_depth
+),
+secs AS (
+  SELECT src.type, src.employee_id, src.ts,
+         EXTRACT(EPOCH FROM (src.ts - r.ts)) AS sec
+  FROM src
+  LEFT JOIN walk w ON src.raw_root IS NULL AND w.ev_id = src.id AND w.parent IS NULL
+  JOIN raw_messages r ON r.chat_id = src.chat_id AND r.msg_id = COALESCE(src.raw_root, w.msg_id)
+)"""
+
+_SQL = _SECS_CTES.format(
+    ev_filter="(e.type = 'reply_first' OR e.type IN :close_types) AND e.ts >= :frm AND e.ts < :to"
+) + """,
+per_emp AS (
+  SELECT employee_id,
+         COUNT(*)  FILTER (WHERE type = 'reply_first')  AS kt_cnt,
+         AVG(sec)  FILTER (WHERE type = 'reply_first')  AS avg_first_sec,
+         COUNT(*)  FILTER (WHERE type <> 'reply_first') AS close_cnt,
+         AVG(sec)  FILTER (WHERE type <> 'reply_first') AS avg_close_sec
+  FROM secs
+  WHERE sec >= 0
+  GROUP BY employee_id
+)
+SELECT p.employee_id, p.kt_cnt, p.avg_first_sec, p.close_cnt, p.avg_close_sec,
+       em.full_name, em.department
+FROM per_emp p
+LEFT JOIN employees em ON em.employee_id = p.employee_id
+WHERE p.close_cnt > 0 AND (:min_kt <= 0 OR p.kt_cnt >= :min_kt)
+"""
+
+# Ekip bazı: UTC gün başına close süresi toplamı/adedi
+_DAY_SQL = _SECS_CTES.format(
+    ev_filter="e.type IN :close_types AND e.ts >= :frm AND e.ts < :to"
+) + """
+SELECT CAST(date_trunc('day', ts) AS DATE) AS day, SUM(sec) AS sum_sec, COUNT(*) AS cnt
+FROM secs
+WHERE sec >= 0
+GROUP BY 1
+"""
+
+_STMT = text(_SQL).bindparams(bindparam("close_types", expanding=True))
+_DAY_STMT = text(_DAY_SQL).bindparams(bindparam("close_types", expanding=True))
+
+
+class TeamBaselineCache:
+    """
+    (kanal, departman, UTC gün) → (close süresi toplamı, adedi).
+    Kapanmış günler (gün sonu + REPORT_CACHE_CLOSED_GRACE_SEC geçmiş) süresiz tutulur,
+    bugün/yakın günler today_ttl_sec kadar. Rapor veri versiyonu (report_cache.bump) değişince tüm günler düşer.
+    """
+
+    def __init__(self, today_ttl_sec: float = 60.0):
+        self.today_ttl_sec = today_ttl_sec
+        self._data: Dict[Tuple[str, str | None, date], Tuple[float | None, float, int]] = {}
+        self._lock = threading.Lock()
+        self._version: str | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def sync(self, version: str) -> None:
+        with self._lock:
+            if self._version != version:
+                self._data.clear()
+                self._version = version
+
+    def get_many(self, channel: str, department: str | None, days: List[date]):
+        """Önbellekteki günler {day: (sum, cnt)} ve eksik günler listesi."""
+        now = time.monotonic()
+        found: Dict[date, Tuple[float, int]] = {}
+        missing: List[date] = []
+        with self._lock:
+            for d in days:
+                item = self._data.get((channel, department, d))
+                if item is None or (item[0] is not None and item[0] < now):
+                    missing.append(d)
+                else:
+                    found[d] = (item[1], item[2])
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, channel: str, department: str | None, d: date, sum_sec: float, cnt: int) -> None:
+        day_end = datetime(d.year, d.month, d.day, tzinfo=timezone.utc) + timedelta(days=1)
+        expires = None if is_closed_range(day_end) else time.monotonic() + self.today_ttl_sec
+        with self._lock:
+            self._data[(channel, department, d)] = (expires, sum_sec, cnt)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+team_baseline_cache = TeamBaselineCache(settings.TEAM_BASELINE_TODAY_TTL_SEC)
+
+
+def team_avg_close_sec(
+    db: Session,
+    channel: str,
+    department: str | None = None,
+    days: int = 7,
+    today: date | None = None,
+    max_depth: int = 100,
+) -> float | None:
+    """
+    Ekip Ø sonuçlandırma (trend bazı) = son `days` UTC günün (bugün dahil) toplam/adet birleşimi.
+    Yalnızca önbellekte olmayan günler tek sorguyla hesaplanır.
+    """
+    today = today or datetime.now(timezone.utc).date()
+    wanted = [today - timedelta(days=i) for i in range(days)]
+    team_baseline_cache.sync(report_data_version(db))
+    found, missing = team_baseline_cache.get_many(channel, department, wanted)
+    if missing:
+        lo, hi = min(missing), max(missing) + timedelta(days=1)
+        res = db.execute(
+            _DAY_STMT,
+            {
+                "ch": channel,
+                "frm": datetime(lo.year, lo.month, lo.day, tzinfo=timezone.utc),
+                "to": datetime(hi.year, hi.month, hi.day, tzinfo=timezone.utc),
+                "close_types": list(CLOSE_TYPES),
+                "dept": department,
+                "max_depth": max_depth,
+            },
+        ).mappings().all()
+        fresh = {r["day"]: (float(r["sum_sec"]), int(r["cnt"])) for r in res}
+        for d in missing:
+            s, c = fresh.get(d, (0.0, 0))
+            team_baseline_cache.put(channel, department, d, s, c)
+            found[d] = (s, c)
+
+    total = sum(s for s, _ in found.values())
+    cnt = sum(c for _, c in found.values())
+    return total / cnt if cnt else None
+
+
+def _sign_emoji(pct: float | None) -> str:
+    if pct is None:
+        return "⚪"
+    if pct > 3:
+        return "🔴⬆️"
+    if pct < -3:
+        return "🟢⬇️"
+    return "⚪"  # ±3%
+
+
+def _sort_key(r: Dict[str, Any], order: str) -> Tuple:
+    # Artan tuple sırası = istenen sıralama; employee_id toplam sıralama (cursor) için tie-breaker
+    if order == "avg_desc":
+        return (-r["avg_close_sec"], r["employee_id"])
+    if order == "cnt_desc":
+        return (-r["count_total"], -r["avg_close_sec"], r["employee_id"])
+    return (r["avg_close_sec"], -r["count_total"], r["employee_id"])
+
+
+# _sort_key ile aynı şekil: son eleman employee_id (str), öncekiler sayı
+_KEY_LEN = {"avg_desc": 2, "cnt_desc": 3}
+
+
+def _cursor_key(cursor: str, order: str) -> Tuple:
+    k = decode_cursor(cursor, order).get("k")
+    n = _KEY_LEN.get(order, 3)
+    if (
+        not isinstance(k, list) or len(k) != n
+        or not isinstance(k[-1], str)
+        or not all(isinstance(x, (int, float)) and not isinstance(x, bool) for x in k[:-1])
+    ):
+        raise ValueError("invalid cursor")
+    return tuple(k)
+
+
+def page_close_time_rows(
+    rows: List[Dict[str, Any]],
+    order: str,
+    limit: int,
+    offset: int = 0,
+    cursor: str | None = None,
+) -> Tuple[List[Dict[str, Any]], str | None]:
+    """
+    Sıralı satırlardan bir sayfa + sonraki sayfanın cursor'ı (yoksa None).
+    cursor verilirse offset yok sayılır; bozuk cursor → ValueError.
+    """
+    if cursor:
+        after = _cursor_key(cursor, order)
+        rest = [r for r in rows if _sort_key(r, order) > after]
+    else:
+        rest = rows[offset:]
+    page = rest[:limit]
+    next_cursor = None
+    if len(rest) > limit and page:
+        next_cursor = encode_cursor({"o": order, "k": list(_sort_key(page[-1], order))})
+    return page, next_cursor
+
+
+def compute_close_time_rows(
+    db: Session,
+    channel: Literal["bonus", "finans"],
+    dt_from: datetime,
+    dt_to: datetime,
+    order: str = "avg_asc",
+    min_kt: int = 0,
+    department: str | None = None,
+    default_department: str = "-",
+    max_depth: int = 100,
+    trend_days: int = 7,
+) -> List[Dict[str, Any]]:
+    """
+    Kanal bazlı kişi raporu (tek sorgu):
+    - Ø İlk Yanıt = reply_first.ts − kök origin.ts, KT = reply_first adedi
+    - Ø Sonuçlandırma = close.ts − kök origin.ts
+    - Ekip Ø (trend baz) = son trend_days UTC günün close ortalaması (günlük toplam/adet cache'i)
+    Kökler tüm eventler için birlikte çözülür (root_msg_id, yoksa recursive CTE).
+    department verilirse yalnızca o departmandaki personelin eventleri sayılır.
+    """
+    res = db.execute(
+        _STMT,
+        {
+            "ch": channel,
+            "frm": dt_from, "to": dt_to,
+            "close_types": list(CLOSE_TYPES),
+            "dept": department,
+            "min_kt": min_kt,
+            "max_depth": max_depth,
+        },
+    ).mappings().all()
+
+    team_avg = (
+        team_avg_close_sec(db, channel, department, days=trend_days, max_depth=max_depth) if res else None
+    )
+
+    rows: List[Dict[str, Any]] = []
+    for r in res:
+        avg_close_sec = float(r["avg_close_sec"])
+        avg_first_sec = float(r["avg_first_sec"]) if r["avg_first_sec"] is not None else None
+        trend_pct = None
+        if team_avg and team_avg > 0:
+            trend_pct = round(((avg_close_sec - team_avg) / team_avg) * 100, 0)
+
+        emp_id = r["employee_id"]
+        rows.append({
+            "employee_id": emp_id,
+            "full_name": r["full_name"] or emp_id,
+            "department": r["department"] or default_department,
+            "count_total": int(r["close_cnt"]),
+            "avg_first_sec": int(round(avg_first_sec)) if avg_first_sec is not None else None,
+            "avg_close_sec": int(round(avg_close_sec)),
+            "trend": {
+                "emoji": _sign_emoji(trend_pct),
+                "pct": trend_pct,
+                "team_avg_close_sec": int(round(team_avg)) if team_avg else None,
+            }
+        })
+
+    rows.sort(key=lambda r: _sort_key(r, order))
+    return rows
@@ -0,0 +1,31 @@
+# apps/api/app/services/employee_ids.py
+from __future__ import annotations
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+RD_SEQUENCE = "employee_rd_seq"
+
+# n numara tek round-trip'te ayrılır; elle girilmiş (routes_employees) RD-xxx ile çakışanlar elenir.
+# Biçim: en az 3 hane ("RD-007", "RD-1000").
+_ALLOCATE_SQL = text(f"""
+SELECT a.employee_id
+FROM (
+  SELECT 'RD-' || lpad(v::text, GREATEST(3, length(v::text)), '0') AS employee_id, v
+  FROM (SELECT nextval('{RD_SEQUENCE}') AS v FROM generate_series(1, :n)) s
+) a
+WHERE NOT EXISTS (SELECT 1 FROM employees e WHERE e.employee_id = a.employee_id)
+ORDER BY a.v
+""")
+
+
+def allocate_rd_ids(db: Session, n: int = 1) -> List[str]:
+    """
+    employee_rd_seq'ten n yeni RD-xxx id'si. nextval transaction'a bağlı değildir:
+    eşzamanlı bind/auto-create aynı id'yi alamaz; rollback'te numara boşa gider (boşluk normal).
+    """
+    out: List[str] = []
+    while len(out) < n:
+        out += db.execute(_ALLOCATE_SQL, {"n": n - len(out)}).scalars().all()
+    return out
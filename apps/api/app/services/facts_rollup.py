@@ -0,0 +1,110 @@
+# apps/api/app/services/facts_rollup.py
+from __future__ import annotations
+from datetime import date, datetime, timedelta
+from typing import Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.admin_settings_service import get_setting, set_setting
+from app.services.facts_service import K_KT
+
+# Toplanarak aylığa çıkan KPI'lar (adet); diğerleri samples ağırlıklı ortalama
+COUNT_KPIS = (K_KT,)
+
+FACTS_MONTHLY_WATERMARK_KEY = "facts_monthly_watermark"
+# facts_daily.inserted_at transaction başı NOW(); açık transaction'lar için pay
+_WM_OVERLAP = timedelta(minutes=5)
+
+# Verilen aylar (YYYY-MM) için facts_monthly'yi facts_daily'den yeniden yazar
+_RECOMPUTE_SQL = text("""
+INSERT INTO facts_monthly (actor_key, employee_id, period, kpi_code, value, samples, source, inserted_at)
+SELECT d.actor_key, MAX(d.employee_id), to_char(d.day, 'YYYY-MM') AS period, d.kpi_code,
+       CASE WHEN d.kpi_code = ANY(CAST(:count_kpis AS text[])) THEN SUM(d.value)
+            ELSE SUM(d.value * d.samples) / NULLIF(SUM(d.samples), 0) END,
+       SUM(d.samples),
+       MAX(d.source),
+       NOW()
+FROM facts_daily d
+WHERE d.day >= :lo AND d.day < :hi
+  AND to_char(d.day, 'YYYY-MM') = ANY(CAST(:periods AS text[]))
+GROUP BY d.actor_key, to_char(d.day, 'YYYY-MM'), d.kpi_code
+HAVING SUM(d.samples) > 0
+ON CONFLICT (actor_key, period, kpi_code) DO UPDATE SET
+  employee_id = EXCLUDED.employee_id,
+  value       = EXCLUDED.value,
+  samples     = EXCLUDED.samples,
+  source      = EXCLUDED.source,
+  inserted_at = EXCLUDED.inserted_at
+""")
+
+# Aynı aylarda artık facts_daily karşılığı olmayan satırlar
+_DELETE_STALE_SQL = text("""
+DELETE FROM facts_monthly m
+WHERE m.period = ANY(CAST(:periods AS text[]))
+  AND NOT EXISTS (
+    SELECT 1 FROM facts_daily d
+    WHERE d.actor_key = m.actor_key AND d.kpi_code = m.kpi_code
+      AND d.day >= to_date(m.period || '-01', 'YYYY-MM-DD')
+      AND d.day < to_date(m.period || '-01', 'YYYY-MM-DD') + interval '1 month'
+      AND d.samples > 0
+  )
+""")
+
+_DELETE_ORPHAN_PERIODS_SQL = text(
+    "DELETE FROM facts_monthly WHERE NOT (period = ANY(CAST(:periods AS text[])))"
+)
+
+# inserted_at > since olan günlük satırların ayları (since None → tüm geçmiş)
+_DIRTY_PERIODS_SQL = text("""
+SELECT DISTINCT to_char(day, 'YYYY-MM')
+FROM facts_daily
+WHERE CAST(:since AS TIMESTAMP) IS NULL OR inserted_at > :since
+""")
+
+
+def period_of(d: date) -> str:
+    return d.strftime("%Y-%m")
+
+
+def _month_start(period: str) -> date:
+    y, m = map(int, period.split("-"))
+    return date(y, m, 1)
+
+
+def recompute_months(db: Session, periods: Iterable[str]) -> int:
+    """Verilen ayların facts_monthly satırlarını facts_daily'den yeniden yazar. Commit çağırana aittir."""
+    ps: List[str] = sorted(set(periods))
+    if not ps:
+        return 0
+    last = _month_start(ps[-1])
+    params = {
+        "periods": ps,
+        "count_kpis": list(COUNT_KPIS),
+        "lo": _month_start(ps[0]),
+        "hi": date(last.year + last.month // 12, last.month % 12 + 1, 1),
+    }
+    n = db.execute(_RECOMPUTE_SQL, params).rowcount or 0
+    db.execute(_DELETE_STALE_SQL, params)
+    return n
+
+
+def refresh_facts_monthly(db: Session, full: bool = False) -> dict:
+    """
+    facts_monthly'yi artımlı günceller: watermark'tan beri değişen facts_daily satırlarının ayları
+    yeniden hesaplanır; watermark yoksa ya da full=True ise tüm aylar. Sonunda commit eder.
+    (derive/backfill kendi aylarını doğrudan recompute_months ile günceller; bu, toplu onarım içindir.)
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('facts_monthly'))"))
+    started = db.execute(text("SELECT LOCALTIMESTAMP")).scalar()
+
+    wm_raw = "" if full else get_setting(db, FACTS_MONTHLY_WATERMARK_KEY, "")
+    since = datetime.fromisoformat(wm_raw) if wm_raw else None
+
+    periods = list(db.execute(_DIRTY_PERIODS_SQL, {"since": since}).scalars())
+    rows = recompute_months(db, periods)
+    if since is None:
+        # tam yenilemede günlük karşılığı kalmamış aylar da temizlenir
+        db.execute(_DELETE_ORPHAN_PERIODS_SQL, {"periods": periods})
+    set_setting(db, FACTS_MONTHLY_WATERMARK_KEY, (started - _WM_OVERLAP).isoformat())  # commit
+    return {"periods": len(periods), "rows": rows, "since": since.isoformat() if since else None}
@@ -0,0 +1,145 @@
+# apps/api/app/services/facts_service.py
+from __future__ import annotations
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+K_FIRST = "KPI_FIRST_SEC"
+K_CLOSE = "KPI_CLOSE_SEC"
+K_KT    = "KPI_KT_COUNT"
+K_FIN_REJECT = "KPI_FIN_REJECT_RATE"
+
+FACT_CHANNELS = ("bonus", "finans")
+FACT_SOURCE = "telegram"
+
+# facts_daily veri versiyonu (admin_settings): yazan her iş aynı transaction'da artırır → skor cache anahtarı
+FACTS_DATA_VERSION_KEY = "facts_data_version"
+
+_FACTS_VERSION_SQL = text("SELECT value FROM admin_settings WHERE key = :k")
+_BUMP_FACTS_SQL = text("""
+INSERT INTO admin_settings (key, value, updated_at) VALUES (:k, '1', NOW())
+ON CONFLICT (key) DO UPDATE SET value = CAST(CAST(admin_settings.value AS BIGINT) + 1 AS TEXT), updated_at = NOW()
+""")
+
+# events.from_user_id / from_username → "uid:123" | "uname:nick" | "unknown"
+_ACTOR_EXPR = """CASE
+    WHEN e.from_user_id IS NOT NULL AND e.from_user_id <> 0 THEN 'uid:' || e.from_user_id
+    WHEN COALESCE(e.from_username, '') <> '' THEN 'uname:' || e.from_username
+    ELSE 'unknown' END"""
+
+# Gün [start, end) içindeki reply_first / kapanış eventlerinden (actor, kpi) ortalamaları:
+#   FIRST_SEC: reply_first.ts − origin.ts          (actor = yanıtlayan)
+#   CLOSE_SEC: kapanış.ts − (reply_first ?? origin).ts (actor = kapatan)
+#   KT_COUNT : geçerli FIRST_SEC örnek sayısı
+#   FIN_REJECT_RATE: finans reject / (approve + reject)   (actor = kapatan; samples = approve + reject)
+# Negatif süreler atlanır; employee_id onaylı identity eşlemesinden gelir (yoksa NULL).
+# (actor_key, day, kpi_code) çakışmasında satır güncellenir → tekrar çalıştırılabilir.
+_UPSERT_SQL = text(f"""
+WITH
+ev AS (
+  SELECT e.correlation_id, e.source_channel, e.type, e.ts, {_ACTOR_EXPR} AS actor
+  FROM events e
+  WHERE e.ts >= :start AND e.ts < :end
+    AND e.source_channel = ANY(CAST(:chs AS text[]))
+    AND e.type IN ('reply_first', 'reply_close', 'approve', 'reject')
+),
+m AS (
+  SELECT ev.actor, '{K_FIRST}' AS kpi, EXTRACT(EPOCH FROM (ev.ts - o.ts)) AS sec
+  FROM ev
+  JOIN events o ON o.correlation_id = ev.correlation_id AND o.type = 'origin'
+  WHERE ev.type = 'reply_first'
+  UNION ALL
+  SELECT ev.actor, '{K_CLOSE}', EXTRACT(EPOCH FROM (ev.ts - COALESCE(f.ts, o.ts)))
+  FROM ev
+  LEFT JOIN events f ON f.correlation_id = ev.correlation_id AND f.type = 'reply_first'
+  LEFT JOIN events o ON o.correlation_id = ev.correlation_id AND o.type = 'origin'
+  WHERE ev.type <> 'reply_first' AND COALESCE(f.ts, o.ts) IS NOT NULL
+),
+ok AS (SELECT * FROM m WHERE sec >= 0),
+agg AS (
+  SELECT actor, kpi, AVG(sec) AS value, COUNT(*) AS samples FROM ok GROUP BY actor, kpi
+  UNION ALL
+  SELECT actor, '{K_KT}', COUNT(*), COUNT(*) FROM ok WHERE kpi = '{K_FIRST}' GROUP BY actor
+  UNION ALL
+  SELECT actor, '{K_FIN_REJECT}', AVG(CASE WHEN type = 'reject' THEN 1.0 ELSE 0.0 END), COUNT(*)
+  FROM ev WHERE source_channel = 'finans' AND type IN ('approve', 'reject') GROUP BY actor
+)
+INSERT INTO facts_daily (actor_key, employee_id, day, kpi_code, value, samples, source, inserted_at)
+SELECT agg.actor, ei.employee_id, :day, agg.kpi, agg.value, agg.samples, :src, NOW()
+FROM agg
+LEFT JOIN employee_identities ei ON ei.actor_key = agg.actor AND ei.status = 'confirmed'
+ON CONFLICT (actor_key, day, kpi_code) DO UPDATE SET
+  employee_id = EXCLUDED.employee_id,
+  value       = EXCLUDED.value,
+  samples     = EXCLUDED.samples,
+  source      = EXCLUDED.source,
+  inserted_at = EXCLUDED.inserted_at
+RETURNING actor_key, kpi_code
+""")
+
+# Yeniden hesaplamada artık üretilmeyen (event'i silinmiş / taşınmış) eski satırlar
+_DELETE_STALE_SQL = text("""
+DELETE FROM facts_daily f
+WHERE f.day = :day AND f.source = :src
+  AND NOT EXISTS (
+    SELECT 1 FROM unnest(CAST(:actors AS text[]), CAST(:kpis AS text[])) AS k(actor_key, kpi_code)
+    WHERE k.actor_key = f.actor_key AND k.kpi_code = f.kpi_code
+  )
+""")
+
+
+def derive_daily_facts(db: Session, day: date) -> Dict[str, Any]:
+    """
+    Günün (UTC) facts_daily satırlarını events'ten tek INSERT ... SELECT ... ON CONFLICT ile yazar.
+    Aynı gün için tekrar çalıştırmak sonucu değiştirmez; facts veri versiyonu aynı transaction'da artar.
+    Commit çağırana aittir.
+    """
+    start = datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+    rows = db.execute(
+        _UPSERT_SQL,
+        {"start": start, "end": start + timedelta(days=1), "day": day, "chs": list(FACT_CHANNELS), "src": FACT_SOURCE},
+    ).all()
+    deleted = db.execute(
+        _DELETE_STALE_SQL,
+        {"day": day, "src": FACT_SOURCE, "actors": [r[0] for r in rows], "kpis": [r[1] for r in rows]},
+    ).rowcount or 0
+    if rows or deleted:
+        bump_facts_version(db)
+    return {"upserted": len(rows), "deleted": deleted, "actors": len({r[0] for r in rows})}
+
+
+# Onaylanan identity'lerin tüm geçmiş fact satırlarını employee_id'ye bağlar (tablo başına tek UPDATE;
+# inserted_at de yenilenir → monthly watermark değişikliği görür)
+_REKEY_SQL = {
+    table: text(f"""
+UPDATE {table} f SET employee_id = ei.employee_id, inserted_at = NOW()
+FROM employee_identities ei
+WHERE ei.actor_key = f.actor_key
+  AND ei.status = 'confirmed'
+  AND f.actor_key = ANY(CAST(:keys AS text[]))
+  AND f.employee_id IS DISTINCT FROM ei.employee_id
+""")
+    for table in ("facts_daily", "facts_monthly")
+}
+
+
+def rekey_facts(db: Session, actor_keys: List[str]) -> Dict[str, int]:
+    """/identities/bind sonrası: actor_key'lerin facts_daily/facts_monthly satırlarına employee_id yazar. Commit çağırana aittir."""
+    if not actor_keys:
+        return {t: 0 for t in _REKEY_SQL}
+    out = {t: db.execute(stmt, {"keys": list(actor_keys)}).rowcount or 0 for t, stmt in _REKEY_SQL.items()}
+    if out["facts_daily"]:
+        bump_facts_version(db)
+    return out
+
+
+def bump_facts_version(db: Session) -> None:
+    """facts_daily değişti: versiyonu çağıranın transaction'ında artırır (rollback'te geri alınır)."""
+    db.execute(_BUMP_FACTS_SQL, {"k": FACTS_DATA_VERSION_KEY})
+
+
+def facts_data_version(db: Session) -> str:
+    """DB'deki facts veri versiyonu (hiç bump edilmediyse "0")."""
+    return db.execute(_FACTS_VERSION_SQL, {"k": FACTS_DATA_VERSION_KEY}).scalar() or "0"
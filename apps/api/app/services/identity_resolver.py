@@ -1,17 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from sqlalchemy import event
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from app.core.config import settings
 from app.models.identities import EmployeeIdentity
 
+class _Entry(NamedTuple):
+    employee_id: str | None
+    status: str | None      # None → employee_identities'te kayıt yok (negatif cache)
+    has_hint: bool
+
+class IdentityCache:
+    """
+    actor_key → (employee_id, status, hint var mı?) için sınırlı LRU + TTL.
+    Eşleme nadiren değişir; değiştiren uçlar (/identities/bind, backfill, enrich-hints)
+    invalidate() çağırır. TTL, diğer worker'lardaki değişiklikler için emniyet payıdır.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl_sec: float = 300.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl_sec = ttl_sec
+        self._data: "OrderedDict[str, tuple[float, _Entry]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> _Entry | None:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_sec, entry)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, keys=None) -> None:
+        """keys=None → tüm cache."""
+        with self._lock:
+            if keys is None:
+                self._data.clear()
+            else:
+                for k in keys:
+                    self._data.pop(k, None)
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_sec": self.ttl_sec,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "invalidations": self.invalidations,
+            }
+
+identity_cache = IdentityCache(settings.IDENTITY_CACHE_SIZE, settings.IDENTITY_CACHE_TTL_SEC)
+
+def _entry_of(rec: EmployeeIdentity | None) -> _Entry:
+    if not rec:
+        return _Entry(None, None, False)
+    return _Entry(rec.employee_id, rec.status, bool(rec.hint_name))
+
+def _needs_write(entry: _Entry, name_hint: str | None) -> bool:
+    """Cache'e göre pending insert / ipucu güncellemesi gerekir mi?"""
+    return entry.status is None or (bool(name_hint) and not entry.has_hint)
+
+# Bu transaction'da yazılan (pending insert / ipucu) kayıtların cache girdileri commit'e kadar
+# session'da bekler: rollback olursa cache DB'de olmayan bir satırı "pending" sanmasın.
+_STAGED = "identity_cache_staged"
+
+def _stage(db: Session, key: str, entry: _Entry) -> None:
+    db.info.setdefault(_STAGED, {})[key] = entry
+
+@event.listens_for(Session, "after_rollback")
+def _drop_staged(session: Session) -> None:
+    session.info.pop(_STAGED, None)
+
+def publish_staged(db: Session) -> None:
+    """db.commit() sonrası çağrılır: bekleyen cache girdilerini identity_cache'e yazar."""
+    for key, entry in db.info.pop(_STAGED, {}).items():
+        identity_cache.put(key, entry)
+
 def actor_key(from_user_id: int | None, from_username: str | None) -> str:
     if from_user_id: return f"uid:{from_user_id}"
     if from_username: return f"uname:{from_username}"
     return "unknown"
 
 def resolve_employee_id(db: Session, key: str) -> str | None:
-    rec = db.query(EmployeeIdentity).filter(EmployeeIdentity.actor_key == key, EmployeeIdentity.status == "confirmed").first()
-    return rec.employee_id if rec else None
+    entry = identity_cache.get(key)
+    if entry is None:
+        rec = db.query(EmployeeIdentity).filter(EmployeeIdentity.actor_key == key).first()
+        entry = _entry_of(rec)
+        identity_cache.put(key, entry)
+    return entry.employee_id if entry.status == "confirmed" else None
 
 def ensure_pending(db: Session, key: str, name_hint: str | None = None, team_hint: str | None = None):
-    rec = db.query(EmployeeIdentity).filter(EmployeeIdentity.actor_key == key).first()
+    entry = identity_cache.get(key)
+    if entry is not None and not team_hint and not _needs_write(entry, name_hint):
+        return
+    # negatif cache: kayıt yok → SELECT'siz doğrudan ekle
+    rec = None
+    if entry is None or entry.status is not None:
+        rec = db.query(EmployeeIdentity).filter(EmployeeIdentity.actor_key == key).first()
     if rec:
         # ipucu güncelle
         changed = False
@@ -20,5 +129,69 @@ def ensure_pending(db: Session, key: str, name_hint: str | None = None, team_hin
         if team_hint and not rec.hint_team:
             rec.hint_team = team_hint; changed = True
         if changed: db.add(rec)
+        _stage(db, key, _Entry(rec.employee_id, rec.status, bool(rec.hint_name)))
     else:
-        db.add(EmployeeIdentity(actor_key=key, status="pending", hint_name=name_hint, hint_team=team_hint))
+        # eşzamanlı ekleme (batch writer / başka worker) olursa yut
+        db.execute(
+            pg_insert(EmployeeIdentity)
+            .values(actor_key=key, status="pending", hint_name=name_hint, hint_team=team_hint)
+            .on_conflict_do_nothing(constraint="uq_identity_actor_key")
+        )
+        _stage(db, key, _Entry(None, "pending", bool(name_hint)))
+
+def resolve_many(db: Session, hints: dict[str, str | None]) -> dict[str, str | None]:
+    """
+    Toplu ingest için: {actor_key: name_hint} → {actor_key: employee_id | None}.
+    Önce cache; kalanlar için tek SELECT. Kaydı olmayanları pending ekler, ipucu boş olanları doldurur.
+    Yazılan kayıtların cache girdileri commit sonrası publish_staged(db) ile yayınlanır.
+    """
+    keys = [k for k in hints if k and k != "unknown"]
+    if not keys:
+        return {}
+
+    entries: dict[str, _Entry] = {}
+    to_load = []
+    for key in keys:
+        entry = identity_cache.get(key)
+        if entry is None or (entry.status == "pending" and _needs_write(entry, hints.get(key))):
+            to_load.append(key)
+        else:
+            entries[key] = entry
+
+    loaded = set(to_load)
+    recs = {}
+    if to_load:
+        recs = {
+            r.actor_key: r
+            for r in db.query(EmployeeIdentity).filter(EmployeeIdentity.actor_key.in_(to_load)).all()
+        }
+        for key in to_load:
+            entries[key] = _entry_of(recs.get(key))
+
+    out: dict[str, str | None] = {}
+    new_rows = []
+    for key in keys:
+        entry = entries[key]
+        if entry.status == "confirmed":
+            out[key] = entry.employee_id
+            if key in loaded:
+                identity_cache.put(key, entry)
+            continue
+        out[key] = None
+        name_hint = hints.get(key)
+        rec = recs.get(key)
+        if rec:
+            if name_hint and not rec.hint_name:
+                rec.hint_name = name_hint
+                db.add(rec)
+            _stage(db, key, _Entry(rec.employee_id, rec.status, bool(rec.hint_name)))
+        elif entry.status is None:
+            new_rows.append({"actor_key": key, "status": "pending", "hint_name": name_hint, "hint_team": None})
+            _stage(db, key, _Entry(None, "pending", bool(name_hint)))
+    if new_rows:
+        # Eşzamanlı sync webhook aynı key'i eklemiş olabilir → çakışmayı yut
+        db.execute(
+            pg_insert(EmployeeIdentity).on_conflict_do_nothing(constraint="uq_identity_actor_key"),
+            new_rows,
+        )
+    return out
@@ -0,0 +1,177 @@
+# apps/api/app/services/kpi_scoring.py
+from __future__ import annotations
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.kpi_catalog import CATALOG_VERSION, KPI_CATALOG
+from app.services.facts_service import facts_data_version
+
+# Katalog sırası = skor matrisinin sütunları
+CODES: Tuple[str, ...] = tuple(KPI_CATALOG)
+_COL = {c: i for i, c in enumerate(CODES)}
+_TARGET = np.array([KPI_CATALOG[c].target for c in CODES], dtype=float)
+_WEIGHT = np.array([KPI_CATALOG[c].weight for c in CODES], dtype=float)
+_LOWER = np.array([KPI_CATALOG[c].direction == "lower_is_better" for c in CODES])
+_DAILY = np.array([KPI_CATALOG[c].agg == "daily" for c in CODES])
+
+# (personel, KPI) başına aralık toplamları; gün sayısı personelin aktif (herhangi bir fact'i olan) günleri
+_LOAD_SQL = text("""
+SELECT a.employee_id, a.kpi_code, a.vs, a.s, a.v, d.days
+FROM (
+  SELECT employee_id, kpi_code, SUM(value * samples) AS vs, SUM(samples) AS s, SUM(value) AS v
+  FROM facts_daily
+  WHERE day >= :frm AND day <= :to AND employee_id IS NOT NULL
+    AND kpi_code = ANY(CAST(:codes AS text[]))
+  GROUP BY employee_id, kpi_code
+) a
+JOIN (
+  SELECT employee_id, COUNT(DISTINCT day) AS days
+  FROM facts_daily
+  WHERE day >= :frm AND day <= :to AND employee_id IS NOT NULL
+    AND kpi_code = ANY(CAST(:codes AS text[]))
+  GROUP BY employee_id
+) d ON d.employee_id = a.employee_id
+""")
+
+_NAMES_SQL = text("""
+SELECT employee_id, full_name, department FROM employees
+WHERE employee_id = ANY(CAST(:ids AS text[]))
+""")
+
+
+def score_matrix(values: np.ndarray) -> np.ndarray:
+    """
+    Ham KPI değerleri (E×K, eksik = NaN) → 0..100 skorlar.
+      higher_is_better: v / hedef          (hedefte ve üstünde 100)
+      lower_is_better : hedef / v          (hedefte ve altında 100); hedef 0 → 100 / (1 + v)
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        higher = values / _TARGET
+        lower = np.where(_TARGET > 0, _TARGET / values, 1.0 / (1.0 + values))
+        lower = np.where(values <= 0, 1.0, lower)
+        s = np.where(_LOWER, lower, higher)
+    return np.where(np.isnan(values), np.nan, np.clip(s, 0.0, 1.0) * 100.0)
+
+
+def overall_scores(scores: np.ndarray) -> np.ndarray:
+    """Ağırlıklı genel skor; verisi olmayan KPI'ların ağırlığı paydan düşer (hiç yoksa NaN)."""
+    have = ~np.isnan(scores)
+    wsum = np.where(have, _WEIGHT, 0.0).sum(axis=1)
+    num = np.where(have, scores * _WEIGHT, 0.0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(wsum > 0, num / wsum, np.nan)
+
+
+def compute_scores(db: Session, frm: date, to: date) -> Dict[str, Any]:
+    """
+    [frm, to] için tüm personelin KPI değerleri, skorları ve genel skoru (tek vektörel geçiş).
+    Dönen diziler employee sırası ile hizalı; 'order' genel skora göre azalan sıralamadır.
+    """
+    rows = db.execute(_LOAD_SQL, {"frm": frm, "to": to, "codes": list(CODES)}).all()
+    emp_ids = sorted({r[0] for r in rows})
+    e_idx = {e: i for i, e in enumerate(emp_ids)}
+
+    n = len(rows)
+    ri = np.fromiter((e_idx[r[0]] for r in rows), dtype=np.int64, count=n)
+    ci = np.fromiter((_COL[r[1]] for r in rows), dtype=np.int64, count=n)
+    raw = np.array([(r[2] or 0.0, r[3] or 0, r[4] or 0.0, r[5] or 0) for r in rows], dtype=float).reshape(n, 4)
+
+    shape = (len(emp_ids), len(CODES))
+    vs = np.zeros(shape); s = np.zeros(shape); v = np.zeros(shape); days = np.zeros(shape)
+    present = np.zeros(shape, dtype=bool)
+    vs[ri, ci], s[ri, ci], v[ri, ci], days[ri, ci] = raw[:, 0], raw[:, 1], raw[:, 2], raw[:, 3]
+    present[ri, ci] = True
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = vs / s
+        daily = v / days
+    values = np.where(_DAILY, daily, mean)
+    values = np.where(present & np.isfinite(values), values, np.nan)
+
+    scores = score_matrix(values)
+    overall = overall_scores(scores)
+    order = np.argsort(np.where(np.isnan(overall), -np.inf, -overall), kind="stable")
+    order = order[~np.isnan(overall[order])]
+    return {"employees": emp_ids, "values": values, "scores": scores, "overall": overall, "order": order}
+
+
+class KpiScoreCache:
+    """
+    (aralık, katalog versiyonu) → compute_scores sonucu. Geçerlilik DB'deki facts veri versiyonuna bağlı:
+    derive/rekey (silmeler dahil) aynı transaction'da artırır → tüm worker'larda commit anında geçersiz.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = max(1, maxsize)
+        self._data: "OrderedDict[tuple, tuple[tuple, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, db: Session, frm: date, to: date) -> Dict[str, Any]:
+        key = (frm, to, CATALOG_VERSION)
+        fp = facts_data_version(db)
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] == fp:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+        res = compute_scores(db, frm, to)
+        with self._lock:
+            self._data[key] = (fp, res)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return res
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+kpi_score_cache = KpiScoreCache(settings.KPI_SCORE_CACHE_SIZE)
+
+
+def _round(x: float, nd: int = 2) -> float | None:
+    return None if np.isnan(x) else round(float(x), nd)
+
+
+def leaderboard(
+    db: Session, frm: date, to: date, limit: int = 50, department: str | None = None
+) -> List[Dict[str, Any]]:
+    """Genel skora göre sıralı liste (cache'li skorlar + isim/departman için tek sorgu)."""
+    res = kpi_score_cache.get_or_compute(db, frm, to)
+    emps, order = res["employees"], res["order"]
+    ids = [emps[i] for i in order]
+    meta = {r[0]: (r[1], r[2]) for r in db.execute(_NAMES_SQL, {"ids": ids})} if ids else {}
+
+    out: List[Dict[str, Any]] = []
+    for i in order:
+        emp = emps[i]
+        name, dept = meta.get(emp, (None, None))
+        if department and dept != department:
+            continue
+        out.append({
+            "rank": len(out) + 1,
+            "employee_id": emp,
+            "full_name": name,
+            "department": dept,
+            "overall": _round(res["overall"][i], 1),
+            "kpis": {
+                c: {"value": _round(res["values"][i, k]), "score": _round(res["scores"][i, k], 1)}
+                for k, c in enumerate(CODES)
+                if not np.isnan(res["values"][i, k])
+            },
+        })
+        if len(out) >= limit:
+            break
+    return out
@@ -0,0 +1,72 @@
+# apps/api/app/services/message_classifier.py
+from __future__ import annotations
+import re
+from typing import Iterable
+
+# TR-normalize: ı→i, ş→s, ğ→g, ç→c, ö→o, ü→u (lower() sonrası tek translate)
+_TR_TABLE = str.maketrans("ışğçöü", "isgcou")
+
+# Kurallar normalize edilmiş metin üzerinde çalışır (bkz. docs/event-rules.md §4)
+FIRST_RULES = (
+    r"(?:^|\s)k(?:\s|$)",          # tek harf "k"
+    r"\bk\s*t+\b",                 # "kt", "k t", "ktt"
+    r"\bkt+\b",
+    r"bakiyorum",
+    r"ilgileniyorum",
+    r"kontrol(?:\s+ediyorum)?",
+)
+APPROVE_RULES = (r"\bonay\b", r"onayland[ıi]", r"\btamam\b", r"\bok\b", "✅", "👍")
+REJECT_RULES  = (r"\bred\b", r"\biptal\b", r"\bolumsuz\b", r"\bhata\b", "❌", "🚫")
+
+
+def normalize(text: str | None) -> str:
+    return (text or "").lower().translate(_TR_TABLE)
+
+
+def _combine(rules: Iterable[str]) -> re.Pattern:
+    return re.compile("|".join(f"(?:{r})" for r in rules))
+
+
+class MessageClassifier:
+    """
+    Bonus/finans mesaj sınıflandırıcı.
+    Metni bir kez normalize eder; her sınıf için kurallar tek bir derlenmiş
+    pattern'dir. Öncelik: reply_first > reject > approve > reply_close.
+    """
+
+    def __init__(
+        self,
+        first_rules: Iterable[str] = FIRST_RULES,
+        approve_rules: Iterable[str] = APPROVE_RULES,
+        reject_rules: Iterable[str] = REJECT_RULES,
+    ):
+        self._first = _combine(first_rules)
+        self._approve = _combine(approve_rules)
+        self._reject = _combine(reject_rules)
+
+    normalize = staticmethod(normalize)
+
+    def classify(self, text: str | None, is_reply: bool) -> str:
+        """origin | reply_first | reject | approve | reply_close"""
+        if not is_reply:
+            return "origin"
+        s = normalize(text)
+        if self._first.search(s):
+            return "reply_first"
+        if self._reject.search(s):
+            return "reject"
+        if self._approve.search(s):
+            return "approve"
+        return "reply_close"
+
+    def is_first(self, text: str | None) -> bool:
+        return self._first.search(normalize(text)) is not None
+
+    def is_approve(self, text: str | None) -> bool:
+        return self._approve.search(normalize(text)) is not None
+
+    def is_reject(self, text: str | None) -> bool:
+        return self._reject.search(normalize(text)) is not None
+
+
+classifier = MessageClassifier()
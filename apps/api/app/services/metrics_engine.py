@@ -0,0 +1,370 @@
+# apps/api/app/services/metrics_engine.py
+from __future__ import annotations
+from datetime import datetime, date, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from pytz import timezone
+
+from app.services.metrics_rollup import ROLLUP_CHANNELS, ROLLUP_THRESHOLDS, rollup_cut
+
+IST = timezone("Europe/Istanbul")
+UTC = timezone("UTC")
+
+ENGINE_CHANNELS: Sequence[str] = ROLLUP_CHANNELS
+
+
+def _ist_day_edges_utc(d: date):
+    start_ist = IST.localize(datetime(d.year, d.month, d.day, 0, 0, 0))
+    end_ist = IST.localize(datetime(d.year, d.month, d.day, 23, 59, 59))
+    return start_ist.astimezone(UTC), end_ist.astimezone(UTC)
+
+
+def _ist_window_utc(end_ist: datetime, hours: int = 2):
+    end_ist = end_ist.astimezone(IST)
+    start_ist = end_ist - timedelta(hours=hours)
+    frm_utc = start_ist.astimezone(UTC)
+    to_utc = end_ist.astimezone(UTC)
+    return frm_utc, to_utc, start_ist.strftime("%H:%M"), end_ist.strftime("%H:%M")
+
+
+# ---------- Kaynak: (kanal, personel) başına toplamlar → m ----------
+# Okuma yolları yazmaz (rollup'ı scheduler / jobs ucu tazeler): :cut'tan (rollup_cut) önceki saatler
+# metrics_hourly'den, sonrası threads'ten canlı okunur. Rollup: saat satırları (eşik = hazır kolon).
+# Kapatana yazılan ilk yanıt süreleri (cf_*) pencereye bağlı (ilk yanıt da [frm, to) içinde olmalı)
+# → saat kovasında tutulamaz, her zaman threads'ten okunur (_LIVE_M: c + cr).
+_ROLLUP_M = """
+mr AS (
+  SELECT source_channel, employee_id, close_cnt,
+         0 AS cf_cnt, 0 AS cf_sum, 0 AS cf_over,
+         first_cnt, first_sum, first_over_{th} AS first_over
+  FROM metrics_hourly
+  WHERE source_channel = ANY(CAST(:chs AS text[])) AND hour >= :frm AND hour < :to AND hour < :cut
+)"""
+
+# Canlı: threads üzerinden aynı şekil, ts >= :cut (rollup'ta olmayan eşiklerde :cut = frm; eşik = :th)
+# fsec (kapanan thread'in ilk yanıt süresi) yalnızca ilk yanıt da pencere içindeyse sayılır.
+_CLOSE_FSEC = """CASE WHEN t.first_reply_ts >= :frm AND t.first_reply_ts < :to AND t.origin_ts IS NOT NULL
+              THEN EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts)) END"""
+
+_LIVE_M = f"""
+c AS (
+  -- pencerede kapanan thread'ler → kapatan kişi (+ pencere içi ilk yanıt süresi)
+  SELECT 'c' AS k, t.source_channel, COALESCE(t.closer_emp, '') AS emp, {_CLOSE_FSEC} AS fsec
+  FROM threads t
+  WHERE t.source_channel = ANY(CAST(:chs AS text[]))
+    AND t.first_close_ts >= GREATEST(:frm, :cut) AND t.first_close_ts < :to
+),
+cr AS (
+  -- rollup'tan okunan saatlerde kapananlar: yalnızca kapatana yazılan ilk yanıt süreleri (sayı mr'de)
+  SELECT 'r' AS k, t.source_channel, COALESCE(t.closer_emp, '') AS emp, {_CLOSE_FSEC} AS fsec
+  FROM threads t
+  WHERE t.source_channel = ANY(CAST(:chs AS text[]))
+    AND t.first_close_ts >= :frm AND t.first_close_ts < LEAST(:cut, :to)
+    AND t.first_reply_ts >= :frm AND t.first_reply_ts < :to AND t.origin_ts IS NOT NULL
+),
+f AS (
+  -- pencerede ilk yanıtı gelen thread'ler → ilk yanıtlayan kişi
+  SELECT 'f' AS k, t.source_channel, COALESCE(t.first_reply_emp, '') AS emp,
+         EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts)) AS fsec
+  FROM threads t
+  WHERE t.source_channel = ANY(CAST(:chs AS text[]))
+    AND t.first_reply_ts >= GREATEST(:frm, :cut) AND t.first_reply_ts < :to
+    AND t.origin_ts IS NOT NULL
+),
+ml AS (
+  SELECT source_channel, emp AS employee_id,
+         COUNT(*) FILTER (WHERE k = 'c') AS close_cnt,
+         COUNT(fsec) FILTER (WHERE k IN ('c', 'r')) AS cf_cnt,
+         COALESCE(SUM(fsec) FILTER (WHERE k IN ('c', 'r')), 0) AS cf_sum,
+         COUNT(*) FILTER (WHERE k IN ('c', 'r') AND fsec > :th) AS cf_over,
+         COUNT(*) FILTER (WHERE k = 'f') AS first_cnt,
+         COALESCE(SUM(fsec) FILTER (WHERE k = 'f'), 0) AS first_sum,
+         COUNT(*) FILTER (WHERE k = 'f' AND fsec > :th) AS first_over
+  FROM (SELECT * FROM c UNION ALL SELECT * FROM cr UNION ALL SELECT * FROM f) u
+  GROUP BY source_channel, emp
+)"""
+
+# ---------- Ortak gövde: kanal başına tek satır ----------
+_BODY = """
+e AS (
+  SELECT source_channel, employee_id,
+         SUM(close_cnt) AS close_cnt, SUM(cf_cnt) AS cf_cnt, SUM(cf_sum) AS cf_sum, SUM(cf_over) AS cf_over,
+         SUM(first_cnt) AS first_cnt, SUM(first_sum) AS first_sum, SUM(first_over) AS first_over
+  FROM m GROUP BY source_channel, employee_id
+),
+tot AS (
+  SELECT source_channel,
+         SUM(close_cnt) AS total_close,
+         SUM(first_sum) / NULLIF(SUM(first_cnt), 0) AS avg_first_sec,
+         SUM(first_over) AS gt_total
+  FROM e GROUP BY source_channel
+),
+en AS (
+  SELECT e.source_channel, em.full_name, e.close_cnt, e.cf_over,
+         CASE WHEN e.cf_cnt > 0 THEN e.cf_sum / e.cf_cnt END AS avg_first_emp
+  FROM e JOIN employees em ON em.employee_id = e.employee_id
+  WHERE e.employee_id <> ''
+)
+SELECT
+  ch.source_channel,
+  COALESCE(tot.total_close, 0) AS total_close,
+  tot.avg_first_sec,
+  COALESCE(tot.gt_total, 0) AS gt_total,
+  (
+    SELECT json_agg(x ORDER BY x.gt_cnt DESC, x.full_name ASC)
+    FROM (SELECT full_name, cf_over AS gt_cnt FROM en
+          WHERE en.source_channel = ch.source_channel AND cf_over > 0) x
+  ) AS slow_list,
+  (
+    SELECT json_agg(x ORDER BY x.close_cnt DESC, x.avg_first_emp ASC NULLS LAST, x.full_name ASC)
+    FROM (SELECT full_name, close_cnt, avg_first_emp FROM en
+          WHERE en.source_channel = ch.source_channel AND close_cnt > 0) x
+  ) AS per_emp,
+  (
+    SELECT json_agg(x ORDER BY x.close_cnt DESC, x.full_name ASC)
+    FROM (SELECT full_name, close_cnt FROM en
+          WHERE en.source_channel = ch.source_channel AND close_cnt > 0) x
+  ) AS per_emp_cnt,
+  (
+    SELECT json_agg(x ORDER BY x.gt_cnt DESC, x.full_name ASC)
+    FROM (SELECT full_name, SUM(cf_over) AS gt_cnt FROM en
+          WHERE en.source_channel = ch.source_channel
+          GROUP BY full_name HAVING SUM(cf_over) > 0) x
+  ) AS slow_by_name
+FROM unnest(CAST(:chs AS text[])) AS ch(source_channel)
+LEFT JOIN tot ON tot.source_channel = ch.source_channel
+"""
+
+# Import anında bir kez kurulur; kanal listesi dizi parametresi olduğundan SQL metni sabit kalır
+# (SQLAlchemy derlenmiş ifade cache'i her tikte aynı ifadeyi yeniden kullanır).
+_ROLLUP_STMTS = {
+    th: text("WITH" + _ROLLUP_M.format(th=th) + "," + _LIVE_M
+             + ",\nm AS (SELECT * FROM mr UNION ALL SELECT * FROM ml)," + _BODY)
+    for th in ROLLUP_THRESHOLDS
+}
+_LIVE_STMT = text("WITH" + _LIVE_M + ",\nm AS (SELECT * FROM ml)," + _BODY)
+
+
+def compute_channel_windows(
+    db: Session,
+    frm_utc: datetime,
+    to_utc: datetime,
+    threshold: int,
+    channels: Sequence[str] = ENGINE_CHANNELS,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    [frm, to) penceresinin kanal özetleri (tek sorgu, source_channel'a göre gruplu) → {kanal: satır}.
+    threshold rollup eşiklerinden biriyse rollup_cut öncesi metrics_hourly + sonrası threads, değilse
+    (ya da rollup henüz kurulmadıysa) tamamı threads.
+    """
+    params = {"chs": list(channels), "frm": frm_utc, "to": to_utc, "th": threshold}
+    cut = rollup_cut(db) if threshold in _ROLLUP_STMTS else None
+    if cut is not None:
+        stmt = _ROLLUP_STMTS[threshold]
+        params["cut"] = cut
+    else:
+        stmt = _LIVE_STMT
+        params["cut"] = frm_utc
+    return {r["source_channel"]: dict(r) for r in db.execute(stmt, params).mappings()}
+
+
+def _renamed(items, key: str):
+    return [{"full_name": i["full_name"], key: i["gt_cnt"]} for i in (items or [])]
+
+
+# ---------- Gün sonu context'leri ----------
+def compute_daily_contexts(
+    db: Session,
+    target_day: date,
+    sla_first_sec: int = 60,
+    channels: Sequence[str] = ENGINE_CHANNELS,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    IST gün özetleri, kanal başına (tek DB geçişi):
+    {
+      "bonus": {
+        "date_label": "27.09.2025",
+        "total_close": 454,
+        "avg_first_sec": 18,
+        "gt60_total": 22,
+        "slow_list": [{"full_name":"Ece","gt60_cnt":7}, ...],
+        "per_emp": [{"full_name":"Ece","close_cnt":126,"avg_first_emp":21}, ...]
+      },
+      "finans": {...}
+    }
+    Kapatana yazılan Ø ilk yanıt / eşik aşımı: gün içinde kapanan ve ilk yanıtı da gün içinde gelen
+    thread'lerin ilk yanıt süresi (eski bonus_metrics_service ile aynı).
+    """
+    frm_utc, _ = _ist_day_edges_utc(target_day)
+    rows = compute_channel_windows(db, frm_utc, frm_utc + timedelta(days=1), sla_first_sec, channels)
+    out: Dict[str, Dict[str, Any]] = {}
+    for ch in channels:
+        r = rows.get(ch) or {}
+        out[ch] = {
+            "date_label": target_day.strftime("%d.%m.%Y"),
+            "total_close": int(r.get("total_close") or 0),
+            "avg_first_sec": (None if r.get("avg_first_sec") is None else int(round(r["avg_first_sec"]))),
+            "gt60_total": int(r.get("gt_total") or 0),
+            "slow_list": _renamed(r.get("slow_list"), "gt60_cnt"),
+            "per_emp": r.get("per_emp") or [],
+        }
+    return out
+
+
+# ---------- Periyodik (2 saatlik) context'ler ----------
+def compute_periodic_contexts(
+    db: Session,
+    window_end_ist: Optional[datetime] = None,
+    hours: int = 2,
+    kt30_sec: int = 30,
+    channels: Sequence[str] = ENGINE_CHANNELS,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Son `hours` saatlik özet, kanal başına (tek DB geçişi):
+    {
+      "bonus": {
+        "date_label": "27.09.2025",
+        "win_start": "12:00",
+        "win_end": "14:00",
+        "total_close": 98,
+        "per_emp": [{"full_name":"Ahmet","close_cnt":34}, ...],
+        "slow_30": [{"full_name":"Ahmet","gt30_cnt":5}, ...]
+      },
+      "finans": {...}
+    }
+    Pencere tam saate hizalanır (14:00:05 → 12:00–14:00) → saatlik rollup kovalarıyla birebir.
+    """
+    end_ist = (window_end_ist or datetime.now(IST)).astimezone(IST).replace(minute=0, second=0, microsecond=0)
+    frm_utc, to_utc, win_start, win_end = _ist_window_utc(end_ist, hours=hours)
+    rows = compute_channel_windows(db, frm_utc, to_utc, kt30_sec, channels)
+    out: Dict[str, Dict[str, Any]] = {}
+    for ch in channels:
+        r = rows.get(ch) or {}
+        out[ch] = {
+            "date_label": end_ist.strftime("%d.%m.%Y"),
+            "win_start": win_start,
+            "win_end": win_end,
+            "total_close": int(r.get("total_close") or 0),
+            "per_emp": r.get("per_emp_cnt") or [],
+            "slow_30": _renamed(r.get("slow_by_name"), "gt30_cnt"),
+        }
+    return out
+
+
+# ---------- Gün serisi (dashboard): IST günü başına toplamlar ----------
+# Gün sınırları Python'da bir kez hesaplanır, dizi olarak bağlanır (d: gün, s/e: UTC [başlangıç, bitiş))
+_DAYS = "unnest(CAST(:days AS date[]), CAST(:starts AS timestamptz[]), CAST(:ends AS timestamptz[])) AS d(day, s, e)"
+
+# Rollup + canlı: :cut öncesi saatler metrics_hourly'den, sonrası threads'ten; gün başına toplamlar birleşir
+_SERIES_ROLLUP_SQL = """
+WITH
+r AS (
+  SELECT d.day, m.source_channel, SUM(m.close_cnt) AS cc,
+         SUM(m.first_sum) AS fs, SUM(m.first_cnt) AS fc, SUM(m.first_over_{th}) AS fo
+  FROM {days}
+  JOIN metrics_hourly m
+    ON m.source_channel = ANY(CAST(:chs AS text[])) AND m.hour >= d.s AND m.hour < d.e AND m.hour < :cut
+  GROUP BY d.day, m.source_channel
+),
+lc AS (
+  SELECT d.day, t.source_channel, COUNT(*) AS cc
+  FROM {days}
+  JOIN threads t
+    ON t.source_channel = ANY(CAST(:chs AS text[]))
+   AND t.first_close_ts >= GREATEST(d.s, :cut) AND t.first_close_ts < d.e
+  GROUP BY d.day, t.source_channel
+),
+lf AS (
+  SELECT d.day, t.source_channel,
+         SUM(EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts))) AS fs, COUNT(*) AS fc,
+         COUNT(*) FILTER (WHERE EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts)) > {th}) AS fo
+  FROM {days}
+  JOIN threads t
+    ON t.source_channel = ANY(CAST(:chs AS text[]))
+   AND t.first_reply_ts >= GREATEST(d.s, :cut) AND t.first_reply_ts < d.e
+  WHERE t.origin_ts IS NOT NULL
+  GROUP BY d.day, t.source_channel
+),
+u AS (
+  SELECT day, source_channel, cc, fs, fc, fo FROM r
+  UNION ALL SELECT day, source_channel, cc, 0, 0, 0 FROM lc
+  UNION ALL SELECT day, source_channel, 0, fs, fc, fo FROM lf
+)
+SELECT day, source_channel,
+       SUM(cc) AS total_close,
+       SUM(fs) / NULLIF(SUM(fc), 0) AS avg_first_sec,
+       SUM(fo) AS gt_total
+FROM u
+GROUP BY day, source_channel
+"""
+
+_SERIES_LIVE_SQL = f"""
+WITH
+c AS (
+  SELECT d.day, t.source_channel, COUNT(*) AS total_close
+  FROM {_DAYS}
+  JOIN threads t
+    ON t.source_channel = ANY(CAST(:chs AS text[])) AND t.first_close_ts >= d.s AND t.first_close_ts < d.e
+  GROUP BY d.day, t.source_channel
+),
+f AS (
+  SELECT d.day, t.source_channel,
+         AVG(EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts))) AS avg_first_sec,
+         COUNT(*) FILTER (WHERE EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts)) > :th) AS gt_total
+  FROM {_DAYS}
+  JOIN threads t
+    ON t.source_channel = ANY(CAST(:chs AS text[])) AND t.first_reply_ts >= d.s AND t.first_reply_ts < d.e
+  WHERE t.origin_ts IS NOT NULL
+  GROUP BY d.day, t.source_channel
+)
+SELECT COALESCE(c.day, f.day) AS day, COALESCE(c.source_channel, f.source_channel) AS source_channel,
+       c.total_close, f.avg_first_sec, f.gt_total
+FROM c FULL JOIN f ON f.day = c.day AND f.source_channel = c.source_channel
+"""
+
+_SERIES_ROLLUP_STMTS = {th: text(_SERIES_ROLLUP_SQL.format(th=th, days=_DAYS)) for th in ROLLUP_THRESHOLDS}
+_SERIES_LIVE_STMT = text(_SERIES_LIVE_SQL)
+
+
+def compute_daily_series(
+    db: Session,
+    day_from: date,
+    day_to: date,
+    sla_first_sec: int = 60,
+    channels: Sequence[str] = ENGINE_CHANNELS,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    [day_from, day_to] (dahil) IST günleri için günlük özet serisi, kanal başına (tek sorgu):
+    {"bonus": [{"date":"2025-09-27","date_label":"27.09.2025","total_close":454,
+                "avg_first_sec":18,"gt60_total":22}, ...], "finans": [...]}
+    Veri olmayan günler sıfır/None ile döner (seri kesintisiz).
+    """
+    days = [day_from + timedelta(days=i) for i in range((day_to - day_from).days + 1)]
+    starts = [_ist_day_edges_utc(d)[0] for d in days]
+    ends = starts[1:] + [_ist_day_edges_utc(day_to + timedelta(days=1))[0]]
+    params = {"chs": list(channels), "days": days, "starts": starts, "ends": ends}
+    cut = rollup_cut(db) if sla_first_sec in _SERIES_ROLLUP_STMTS else None
+    if cut is not None:
+        stmt = _SERIES_ROLLUP_STMTS[sla_first_sec]
+        params["cut"] = cut
+    else:
+        stmt = _SERIES_LIVE_STMT
+        params["th"] = sla_first_sec
+    found = {(r["source_channel"], r["day"]): r for r in db.execute(stmt, params).mappings()} if days else {}
+
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for ch in channels:
+        series = []
+        for d in days:
+            r = found.get((ch, d)) or {}
+            series.append({
+                "date": d.isoformat(),
+                "date_label": d.strftime("%d.%m.%Y"),
+                "total_close": int(r.get("total_close") or 0),
+                "avg_first_sec": (None if r.get("avg_first_sec") is None else int(round(r["avg_first_sec"]))),
+                "gt60_total": int(r.get("gt_total") or 0),
+            })
+        out[ch] = series
+    return out
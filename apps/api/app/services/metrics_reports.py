@@ -0,0 +1,92 @@
+# apps/api/app/services/metrics_reports.py
+from __future__ import annotations
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy.orm import Session
+
+from app.services.admin_settings_service import get_bool, BONUS_TG_ENABLED_KEY, FINANCE_TG_ENABLED_KEY
+from app.services.template_engine import render
+from app.services.telegram_notify import send_bonus_to_both, send_finance_to_both
+
+# Kanal → (mesaj etiketi, toggle anahtarı, gönderici)
+CHANNELS: Dict[str, tuple[str, str, Callable[[str], bool]]] = {
+    "bonus": ("BONUS", BONUS_TG_ENABLED_KEY, send_bonus_to_both),
+    "finans": ("FİNANS", FINANCE_TG_ENABLED_KEY, send_finance_to_both),
+}
+
+
+def enabled_channels(db: Session) -> List[str]:
+    """Telegram toggle'ı açık kanallar (her çağrıda DB'den)."""
+    return [ch for ch, (_, key, _) in CHANNELS.items() if get_bool(db, key, False)]
+
+
+def send_channel_report(channel: str, message: str) -> bool:
+    return CHANNELS[channel][2](message)
+
+
+def daily_message(db: Session, channel: str, ctx: Dict[str, Any], sla_first_sec: int = 60) -> str:
+    """Gün sonu mesajı; şablon: '<kanal>_daily_v2' (admin_notifications), yoksa fallback."""
+    label = CHANNELS[channel][0]
+    slow_text = "\n".join(
+        [f"- {i.get('full_name','-')} — {int(i.get('gt60_cnt') or 0)} işlem" for i in ctx["slow_list"]]
+    ) or "- —"
+    per_emp_text = "\n".join(
+        [
+            f"- {i.get('full_name','-')} — {int(i.get('close_cnt') or 0)} işlem • Ø "
+            f"{(str(int(round(i['avg_first_emp'])))+' sn') if i.get('avg_first_emp') is not None else '—'}"
+            for i in ctx["per_emp"]
+        ]
+    ) or "- —"
+
+    return render(
+        db,
+        f"{channel}_daily_v2",
+        {
+            "date": ctx["date_label"],
+            "total_close": ctx["total_close"],
+            "avg_first": (ctx["avg_first_sec"] if ctx["avg_first_sec"] is not None else "—"),
+            "gt60_total": ctx["gt60_total"],
+            "slow_list_text": slow_text,
+            "per_emp_text": per_emp_text,
+        },
+        fallback=(
+            f"📊 *{label} GÜN SONU RAPORU — {{date}}*\n"
+            "- *Toplam Kapanış:* {total_close}\n"
+            "- *Ø İlk Yanıt:* {avg_first} sn\n"
+            f"- *{sla_first_sec} sn üzeri işlemler:* {{gt60_total}}\n\n"
+            f"⚠️ *Geç Yanıt Verenler ({sla_first_sec} sn üzeri)*\n{{slow_list_text}}\n\n"
+            "👥 *Personel Bazlı İşlem Sayıları*\n{per_emp_text}"
+        ),
+        channel=channel,
+    )
+
+
+def periodic_message(db: Session, channel: str, ctx: Dict[str, Any], kt30_sec: int = 30) -> str:
+    """2 saatlik mesaj; şablon: '<kanal>_periodic_v2', yoksa fallback."""
+    label = CHANNELS[channel][0]
+    per_emp_text = "\n".join(
+        [f"- {i.get('full_name','-')} — *{int(i.get('close_cnt') or 0)}* işlem" for i in ctx.get("per_emp", [])]
+    ) or "- —"
+    slow30_text = "\n".join(
+        [f"- {i.get('full_name','-')} — *{int(i.get('gt30_cnt') or 0)}* işlem" for i in ctx.get("slow_30", [])]
+    )
+    slow30_block = f"\n\n⚠️ *{kt30_sec} sn üzeri İlk KT*\n{slow30_text}" if slow30_text else ""
+
+    return render(
+        db,
+        f"{channel}_periodic_v2",
+        {
+            "date": ctx["date_label"],
+            "win_start": ctx["win_start"],
+            "win_end": ctx["win_end"],
+            "total_close": ctx["total_close"],
+            "per_emp_text": per_emp_text,
+            "slow30_block": slow30_block,
+        },
+        fallback=(
+            f"⏱️ *{label} 2 SAATLİK RAPOR* — *{{date}} {{win_start}}–{{win_end}}*\n\n"
+            "• *Toplam Kapanış:* {total_close}\n\n"
+            "👤 *Personel Bazında*\n{per_emp_text}{slow30_block}"
+        ),
+        channel=channel,
+    )
@@ -0,0 +1,141 @@
+# apps/api/app/services/metrics_rollup.py
+from __future__ import annotations
+from datetime import datetime, timedelta, timezone
+from typing import List, Sequence
+
+from sqlalchemy import text, bindparam
+from sqlalchemy.orm import Session
+
+from app.services.admin_settings_service import get_setting, set_setting
+
+# Rollup'ta hazır tutulan süre eşikleri (sn); farklı eşik isteyen rapor canlı sorguya düşer
+ROLLUP_THRESHOLDS: Sequence[int] = (30, 60)
+ROLLUP_CHANNELS: Sequence[str] = ("bonus", "finans")
+
+METRICS_HOURLY_WATERMARK_KEY = "metrics_hourly_watermark"
+# Watermark, saatler ve threads.updated_at naive UTC: session TimeZone'dan bağımsız olsun diye
+# hepsi (now() AT TIME ZONE 'UTC') ile üretilir (LOCALTIMESTAMP / NOW() → timestamp yerel saattir)
+_UTC_NOW_SQL = text("SELECT now() AT TIME ZONE 'UTC'")
+# Açık ingest transaction'ları zamanı başlangıçta alır → watermark bu kadar geriden gelir
+_WM_OVERLAP = timedelta(minutes=5)
+# Geç gelen (daha erken ts'li) eventlerin taşıdığı eski saatler metrics_hourly_dirty ile izlenir;
+# son saatler yine de her seferinde yenilenir (emniyet payı)
+_RECENT_HOURS = 3
+
+
+def _over(k: str, n: int) -> str:
+    return f"COUNT(*) FILTER (WHERE k = '{k}' AND fsec > {n})"
+
+
+_RECOMPUTE_SQL = f"""
+WITH
+h AS (SELECT unnest(CAST(:hours AS timestamp[])) AS hour),
+c AS (
+  -- o saatte kapanan thread'ler → kapatan kişi (ilk yanıt süreleri pencereye bağlı: metrics_engine canlı okur)
+  SELECT 'c' AS k, t.source_channel, h.hour, COALESCE(t.closer_emp, '') AS emp, NULL::float AS fsec
+  FROM h
+  JOIN threads t ON t.first_close_ts >= h.hour AND t.first_close_ts < h.hour + interval '1 hour'
+  WHERE t.source_channel IN :chs
+),
+f AS (
+  -- o saatte ilk yanıtı gelen thread'ler → ilk yanıtlayan kişi
+  SELECT 'f' AS k, t.source_channel, h.hour, COALESCE(t.first_reply_emp, '') AS emp,
+         EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts)) AS fsec
+  FROM h
+  JOIN threads t ON t.first_reply_ts >= h.hour AND t.first_reply_ts < h.hour + interval '1 hour'
+  WHERE t.source_channel IN :chs AND t.origin_ts IS NOT NULL
+),
+u AS (SELECT * FROM c UNION ALL SELECT * FROM f)
+INSERT INTO metrics_hourly (
+  source_channel, hour, employee_id,
+  close_cnt, first_cnt, first_sum, first_over_30, first_over_60, updated_at
+)
+SELECT source_channel, hour, emp,
+       COUNT(*) FILTER (WHERE k = 'c'),
+       COUNT(*) FILTER (WHERE k = 'f'),
+       COALESCE(SUM(fsec) FILTER (WHERE k = 'f'), 0),
+       {_over('f', 30)}, {_over('f', 60)},
+       now() AT TIME ZONE 'UTC'
+FROM u
+GROUP BY source_channel, hour, emp
+"""
+
+_RECOMPUTE = text(_RECOMPUTE_SQL).bindparams(bindparam("chs", expanding=True))
+
+_DELETE = text(
+    "DELETE FROM metrics_hourly WHERE source_channel IN :chs AND hour = ANY(CAST(:hours AS timestamp[]))"
+).bindparams(bindparam("chs", expanding=True))
+
+# updated_at > since olan thread'lerin dokunduğu saatler (since None → tüm geçmiş)
+_DIRTY_HOURS = text("""
+SELECT DISTINCT date_trunc('hour', v.ts) AS hour
+FROM threads t
+CROSS JOIN LATERAL (VALUES (t.first_reply_ts), (t.first_close_ts)) AS v(ts)
+WHERE v.ts IS NOT NULL
+  AND t.source_channel IN :chs
+  AND (CAST(:since AS TIMESTAMP) IS NULL OR t.updated_at > :since)
+""").bindparams(bindparam("chs", expanding=True))
+
+
+# threads'ten taşınmış (eski) saatler: tazeleme başında alınır ve silinir (aynı transaction)
+_CLAIM_DIRTY = text(
+    "DELETE FROM metrics_hourly_dirty WHERE source_channel IN :chs RETURNING hour"
+).bindparams(bindparam("chs", expanding=True))
+
+# Rollup'ın güvenilir olduğu sınır: watermark saati, watermark'tan sonra değişen thread'lerin
+# en erken saati ve henüz tazelenmemiş eski saatlerin en erkeni
+_CUT_SQL = text("""
+SELECT LEAST(
+  date_trunc('hour', CAST(:wm AS TIMESTAMP)),
+  (SELECT MIN(date_trunc('hour', LEAST(t.first_reply_ts, t.first_close_ts)))
+     FROM threads t WHERE t.updated_at > :wm AND t.source_channel IN :chs),
+  (SELECT MIN(hour) FROM metrics_hourly_dirty WHERE source_channel IN :chs)
+)
+""").bindparams(bindparam("chs", expanding=True))
+
+
+def rollup_cut(db: Session) -> datetime | None:
+    """
+    Okuma yolları için (yazmaz, kilit almaz): bu UTC saatten ÖNCEKİ saatler metrics_hourly'de günceldir,
+    sonrası threads'ten canlı okunmalı. Rollup hiç kurulmadıysa (watermark yok) None → tamamen canlı.
+    """
+    wm_raw = get_setting(db, METRICS_HOURLY_WATERMARK_KEY, "")
+    if not wm_raw:
+        return None
+    cut = db.execute(_CUT_SQL, {"wm": datetime.fromisoformat(wm_raw), "chs": list(ROLLUP_CHANNELS)}).scalar()
+    return cut.replace(tzinfo=timezone.utc)
+
+
+def recompute_hours(db: Session, hours: List[datetime]) -> int:
+    """Verilen saatlerin (UTC, saat başı) satırlarını threads'ten yeniden yazar. Commit çağırana aittir."""
+    if not hours:
+        return 0
+    params = {"hours": sorted(set(hours)), "chs": list(ROLLUP_CHANNELS)}
+    db.execute(_DELETE, params)
+    return db.execute(_RECOMPUTE, params).rowcount or 0
+
+
+def refresh_metrics_hourly(db: Session, full: bool = False) -> dict:
+    """
+    metrics_hourly'yi artımlı günceller: son watermark'tan beri değişen thread'lerin saatleri,
+    metrics_hourly_dirty'deki eski saatler (+ son _RECENT_HOURS saat) yeniden hesaplanır.
+    Watermark yoksa ya da full=True ise tüm geçmiş. Eşzamanlı çağrılar advisory lock ile sıralanır;
+    sonunda commit eder. Yalnızca scheduler / jobs ucu çağırır (raporlar rollup_cut ile okur).
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('metrics_hourly'))"))
+    started = db.execute(_UTC_NOW_SQL).scalar()
+
+    wm_raw = "" if full else get_setting(db, METRICS_HOURLY_WATERMARK_KEY, "")
+    since = datetime.fromisoformat(wm_raw) if wm_raw else None
+
+    chs = list(ROLLUP_CHANNELS)
+    hours = [r[0] for r in db.execute(_CLAIM_DIRTY, {"chs": chs})]
+    hours += [r[0] for r in db.execute(_DIRTY_HOURS, {"since": since, "chs": chs})]
+    if since is not None:
+        cur = started.replace(minute=0, second=0, microsecond=0)
+        hours += [cur - timedelta(hours=i) for i in range(_RECENT_HOURS)]
+
+    rows = recompute_hours(db, hours)
+    set_setting(db, METRICS_HOURLY_WATERMARK_KEY, (started - _WM_OVERLAP).isoformat())  # commit
+    return {"hours": len(set(hours)), "rows": rows, "since": since.isoformat() if since else None}
+
@@ -0,0 +1,25 @@
+# apps/api/app/services/pagination.py
+from __future__ import annotations
+import base64
+import json
+from typing import Any, Dict
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(data: Dict[str, Any]) -> str:
+    """Opak devam token'ı: sıralama anahtarı + tie-breaker (url-safe base64 JSON)."""
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, order: str) -> Dict[str, Any]:
+    """Token'ı çözer; bozuksa ya da başka bir sıralamaya aitse ValueError."""
+    try:
+        pad = "=" * (-len(token) % 4)
+        data = json.loads(base64.urlsafe_b64decode(token + pad))
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(data, dict) or data.get("o") != order:
+        raise ValueError("cursor does not match order")
+    return data
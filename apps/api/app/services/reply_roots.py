@@ -0,0 +1,62 @@
+# apps/api/app/services/reply_roots.py
+from __future__ import annotations
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app.models.events import RawMessage
+
+Key = Tuple[int, int]  # (chat_id, msg_id)
+
+
+def _root_from_parent(parent_row: tuple | None, parent_msg_id: int) -> int | None:
+    """
+    parent_row = (root_msg_id,) ya da None.
+    - parent raw yoksa zincir orada biter → kök = parent (eski zincir takibiyle aynı: ts bulunamaz)
+    - parent'ın kökü henüz hesaplanmamışsa (backfill bekleyen eski kayıt) → None, backfill doldurur
+    """
+    if parent_row is None:
+        return parent_msg_id
+    return parent_row[0]
+
+
+def root_for(db: Session, chat_id: int, msg_id: int, parent_msg_id: int | None) -> int | None:
+    """Tek mesaj için kök msg_id (tek indexli SELECT)."""
+    if not parent_msg_id:
+        return msg_id
+    row = (
+        db.query(RawMessage.root_msg_id)
+        .filter(RawMessage.chat_id == chat_id, RawMessage.msg_id == parent_msg_id)
+        .first()
+    )
+    return _root_from_parent(tuple(row) if row else None, parent_msg_id)
+
+
+def roots_for_batch(db: Session, items: Iterable[Tuple[int, int, int | None]]) -> Dict[Key, int | None]:
+    """
+    (chat_id, msg_id, parent_msg_id) listesi için kökler.
+    Batch dışındaki parent'lar tek SELECT ile çekilir; batch içi zincirler sırayla çözülür.
+    """
+    items = sorted(items, key=lambda x: (x[0], x[1]))  # Telegram msg_id chat içinde artan
+    in_batch = {(c, m) for c, m, _ in items}
+    outside = {(c, p) for c, _, p in items if p and (c, p) not in in_batch}
+
+    parent_rows: Dict[Key, tuple] = {}
+    if outside:
+        for chat_id, msg_id, root in (
+            db.query(RawMessage.chat_id, RawMessage.msg_id, RawMessage.root_msg_id)
+            .filter(tuple_(RawMessage.chat_id, RawMessage.msg_id).in_(list(outside)))
+            .all()
+        ):
+            parent_rows[(chat_id, msg_id)] = (root,)
+
+    out: Dict[Key, int | None] = {}
+    for chat_id, msg_id, parent in items:
+        if not parent:
+            out[(chat_id, msg_id)] = msg_id
+        elif (chat_id, parent) in out:
+            out[(chat_id, msg_id)] = out[(chat_id, parent)]
+        else:
+            out[(chat_id, msg_id)] = _root_from_parent(parent_rows.get((chat_id, parent)), parent)
+    return out
@@ -0,0 +1,137 @@
+# apps/api/app/services/report_cache.py
+from __future__ import annotations
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, NamedTuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+# Veri versiyonu DB'de (admin_settings): bump tüm worker'lara ve CLI işlerinden de yansır
+REPORT_DATA_VERSION_KEY = "report_data_version"
+
+_VERSION_SQL = text("SELECT value FROM admin_settings WHERE key = :k")
+_BUMP_SQL = text("""
+INSERT INTO admin_settings (key, value, updated_at) VALUES (:k, '1', NOW())
+ON CONFLICT (key) DO UPDATE SET value = CAST(CAST(admin_settings.value AS BIGINT) + 1 AS TEXT), updated_at = NOW()
+""")
+
+
+class CachedReport(NamedTuple):
+    etag: str
+    body: Any
+    headers: Dict[str, str]
+
+
+class ReportCache:
+    """
+    /reports sonuçları için LRU. Anahtar = (path, sorted query), değer veri versiyonuna bağlı:
+      - açık aralık: MAX(events.id) + DB veri versiyonu → yeni event ya da bump() ile otomatik geçersiz
+      - kapalı aralık (to geçmişte): yalnızca DB veri versiyonu → bump'a kadar yeniden hesaplanmaz
+    bump(): eventleri/threads'i yerinde değiştiren işler (identity bind, rebuild/backfill) çağırır.
+    TTL: açık aralıklar ttl_sec, kapalılar closed_ttl_sec (DB dışı değişikliklere karşı emniyet payı).
+    """
+
+    def __init__(self, maxsize: int = 256, ttl_sec: float = 600.0, closed_ttl_sec: float = 21600.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl_sec = ttl_sec
+        self.closed_ttl_sec = closed_ttl_sec
+        self._data: "OrderedDict[str, tuple[float, CachedReport]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.version: str | None = None  # bu süreçte son görülen DB veri versiyonu
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    @staticmethod
+    def etag_for(key: str, version: str) -> str:
+        return 'W/"' + hashlib.sha1(f"{key}|{version}".encode()).hexdigest()[:20] + '"'
+
+    def get(self, key: str, etag: str) -> CachedReport | None:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1].etag != etag or item[0] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, entry: CachedReport, closed: bool) -> None:
+        expires = time.monotonic() + (self.closed_ttl_sec if closed else self.ttl_sec)
+        with self._lock:
+            self._data[key] = (expires, entry)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def sync(self, version: str) -> None:
+        """DB versiyonu değiştiyse (başka worker/CLI bump'ı) yerel sonuçları bırakır."""
+        with self._lock:
+            if self.version != version:
+                self.version = version
+                self._data.clear()
+
+    def bump(self, db: Union[Session, Connection]) -> None:
+        """
+        DB veri versiyonunu artırır (yeni ETag, tüm worker'larda geçersiz) ve yerel sonuçları bırakır.
+        Değişikliği yapan transaction içinde çağrılmalı; commit çağırana aittir.
+        """
+        db.execute(_BUMP_SQL, {"k": REPORT_DATA_VERSION_KEY})
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_sec": self.ttl_sec,
+                "closed_ttl_sec": self.closed_ttl_sec,
+                "version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+            }
+
+
+report_cache = ReportCache(
+    settings.REPORT_CACHE_SIZE, settings.REPORT_CACHE_TTL_SEC, settings.REPORT_CACHE_CLOSED_TTL_SEC
+)
+
+
+def is_closed_range(dt_to: datetime) -> bool:
+    """Aralık sonu, geç gelen eventler için tanınan süreden de eskiyse kapalı sayılır."""
+    grace = timedelta(seconds=settings.REPORT_CACHE_CLOSED_GRACE_SEC)
+    return dt_to + grace <= datetime.now(timezone.utc)
+
+
+def report_data_version(db: Session) -> str:
+    """admin_settings'teki veri versiyonu (PK'den tek satır); yerel cache'ler de buna senkronlanır."""
+    version = db.execute(_VERSION_SQL, {"k": REPORT_DATA_VERSION_KEY}).scalar() or "0"
+    report_cache.sync(version)
+    return version
+
+
+def data_version(db: Session, closed: bool) -> str:
+    """
+    Kapalı aralık: yalnızca DB veri versiyonu. Açık aralık: MAX(events.id) (PK index'ten tek satır)
+    + veri versiyonu + TTL dilimi (varsayılan 'to'/trend penceresi zamanla kayar; ETag da en geç TTL'de değişir).
+    """
+    version = report_data_version(db)
+    if closed:
+        return f"closed:{version}"
+    max_id = db.execute(text("SELECT COALESCE(MAX(id), 0) FROM events")).scalar()
+    bucket = int(time.time() // max(1, report_cache.ttl_sec))
+    return f"{max_id}:{version}:{bucket}"
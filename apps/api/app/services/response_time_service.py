@@ -0,0 +1,139 @@
+# apps/api/app/services/response_time_service.py
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Histogram kova sınırları (sn): [0,30) [30,60) ... [3600,∞)
+DEFAULT_BUCKET_EDGES: Sequence[int] = (30, 60, 120, 300, 600, 1200, 1800, 3600)
+PERCENTILES: Sequence[float] = (0.5, 0.9, 0.95)
+
+
+def _sql(n_buckets: int) -> str:
+    hist = ", ".join(f"COUNT(*) FILTER (WHERE b = {i})" for i in range(n_buckets))
+    return f"""
+    WITH
+    -- threads: ilk yanıt (first_reply_emp) ve ilk kapanış (closer_emp) süreleri, kök = origin
+    d AS (
+      SELECT 'first' AS kind, t.first_reply_emp AS employee_id,
+             EXTRACT(EPOCH FROM (t.first_reply_ts - t.origin_ts)) AS sec
+      FROM threads t
+      WHERE t.source_channel = :ch
+        AND t.first_reply_ts >= :frm AND t.first_reply_ts < :to
+        AND t.origin_ts IS NOT NULL
+      UNION ALL
+      SELECT 'close', t.closer_emp,
+             EXTRACT(EPOCH FROM (t.first_close_ts - t.origin_ts))
+      FROM threads t
+      WHERE t.source_channel = :ch
+        AND t.first_close_ts >= :frm AND t.first_close_ts < :to
+        AND t.origin_ts IS NOT NULL
+    ),
+    ds AS (
+      SELECT d.kind, d.employee_id, CAST(d.sec AS float8) AS sec,
+             width_bucket(CAST(d.sec AS float8), CAST(:edges AS float8[])) AS b
+      FROM d
+      WHERE d.sec >= 0
+        AND (CAST(:dept AS TEXT) IS NULL
+             OR d.employee_id IN (SELECT em.employee_id FROM employees em WHERE em.department = :dept))
+    )
+    SELECT ds.kind,
+           ds.employee_id,
+           GROUPING(ds.employee_id) = 1 AS is_team,
+           COUNT(*) AS n,
+           AVG(ds.sec) AS avg_sec,
+           percentile_cont(CAST(:pcts AS float8[])) WITHIN GROUP (ORDER BY ds.sec) AS pct,
+           ARRAY[{hist}] AS hist
+    FROM ds
+    GROUP BY GROUPING SETS ((ds.kind, ds.employee_id), (ds.kind))
+    """
+
+
+def _dist(r, pcts: Sequence[float]) -> Dict[str, Any]:
+    pct = r["pct"] or [None] * len(pcts)
+    out: Dict[str, Any] = {
+        "n": int(r["n"]),
+        "avg_sec": int(round(float(r["avg_sec"]))) if r["avg_sec"] is not None else None,
+    }
+    for p, v in zip(pcts, pct):
+        out[f"p{int(round(p * 100))}_sec"] = int(round(v)) if v is not None else None
+    out["hist"] = [int(x) for x in r["hist"]]
+    return out
+
+
+def _empty(pcts: Sequence[float], n_buckets: int) -> Dict[str, Any]:
+    out: Dict[str, Any] = {"n": 0, "avg_sec": None}
+    for p in pcts:
+        out[f"p{int(round(p * 100))}_sec"] = None
+    out["hist"] = [0] * n_buckets
+    return out
+
+
+def compute_response_time_distribution(
+    db: Session,
+    channel: Literal["bonus", "finans"],
+    dt_from: datetime,
+    dt_to: datetime,
+    department: str | None = None,
+    edges: Sequence[int] = DEFAULT_BUCKET_EDGES,
+    pcts: Sequence[float] = PERCENTILES,
+) -> Dict[str, Any]:
+    """
+    İlk yanıt (origin→first_reply) ve sonuçlandırma (origin→first_close) süre dağılımı:
+    ekip + kişi bazında n / ortalama / p50-p90-p95 (percentile_cont) / sabit kovalı histogram.
+    Tek sorgu (GROUPING SETS); threads özetini (ch, ts) index'leriyle aralıkta tarar.
+    {
+      "buckets": [{"lo":0,"hi":30}, ..., {"lo":3600,"hi":None}],
+      "team": {"first": {...}, "close": {...}},
+      "per_emp": [{"employee_id":..,"full_name":..,"department":..,"first":{...},"close":{...}}, ...]
+    }
+    """
+    edges = sorted(int(e) for e in edges)
+    n_buckets = len(edges) + 1
+    res = db.execute(
+        text(_sql(n_buckets)),
+        {
+            "ch": channel, "frm": dt_from, "to": dt_to,
+            "dept": department, "edges": edges, "pcts": list(pcts),
+        },
+    ).mappings().all()
+
+    team = {"first": _empty(pcts, n_buckets), "close": _empty(pcts, n_buckets)}
+    per: Dict[str, Dict[str, Any]] = {}
+    for r in res:
+        if r["is_team"]:
+            team[r["kind"]] = _dist(r, pcts)
+        elif r["employee_id"] is not None:
+            e = per.setdefault(r["employee_id"], {
+                "first": _empty(pcts, n_buckets), "close": _empty(pcts, n_buckets),
+            })
+            e[r["kind"]] = _dist(r, pcts)
+
+    names: Dict[str, tuple] = {}
+    if per:
+        names = {
+            x["employee_id"]: (x["full_name"], x["department"])
+            for x in db.execute(
+                text("SELECT employee_id, full_name, department FROM employees")
+            ).mappings()
+        }
+
+    per_emp: List[Dict[str, Any]] = []
+    for emp_id, d in per.items():
+        full_name, dept = names.get(emp_id, (None, None))
+        per_emp.append({
+            "employee_id": emp_id,
+            "full_name": full_name or emp_id,
+            "department": dept or "-",
+            **d,
+        })
+    per_emp.sort(key=lambda x: (-x["close"]["n"], x["full_name"]))
+
+    bounds = [0] + edges
+    return {
+        "buckets": [{"lo": lo, "hi": (edges[i] if i < len(edges) else None)} for i, lo in enumerate(bounds)],
+        "team": team,
+        "per_emp": per_emp,
+    }
@@ -0,0 +1,315 @@
+# apps/api/app/services/sla_watchdog.py
+from __future__ import annotations
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+from pytz import timezone as pytz_timezone
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services.admin_settings_service import get_bool
+from app.services.metrics_reports import CHANNELS, send_channel_report
+from app.services.threads_service import CLOSE_TYPES
+
+IST = pytz_timezone("Europe/Istanbul")
+
+# Aynı thread için tek uyarı (restart / çoklu worker dahil): admin_notifications_log(channel, type, corr)
+ALERT_TYPE = "sla_first"
+
+# Yeniden kurulum: son N saatte origin'i olup henüz ilk yanıtı/kapanışı olmayan thread'ler
+_REBUILD_SQL = text("""
+SELECT correlation_id, source_channel, origin_ts
+FROM threads
+WHERE source_channel = ANY(CAST(:chs AS text[]))
+  AND origin_ts >= :since
+  AND first_reply_ts IS NULL
+  AND first_close_ts IS NULL
+""")
+
+# Süre dolunca son kontrol: başka worker'ın yazdığı yanıt / sıra dışı gelen eventler burada elenir
+_STILL_WAITING_SQL = text("""
+SELECT t.correlation_id, t.source_channel, t.origin_ts,
+       COALESCE(
+         rm.json->'message'->>'text',
+         rm.json->'edited_message'->>'text',
+         rm.json->'message'->>'caption',
+         rm.json->'edited_message'->>'caption'
+       ) AS origin_text
+FROM threads t
+LEFT JOIN raw_messages rm ON rm.chat_id = t.chat_id AND rm.msg_id = t.origin_msg_id
+WHERE t.correlation_id = ANY(CAST(:corrs AS text[]))
+  AND t.first_reply_ts IS NULL
+  AND t.first_close_ts IS NULL
+ORDER BY t.origin_ts
+""")
+
+_MARK_SQL = text("""
+INSERT INTO admin_notifications_log (channel, type, period_key)
+VALUES (:ch, :typ, :pk)
+ON CONFLICT (channel, type, period_key) DO NOTHING
+RETURNING id
+""")
+
+# Gönderilemeyen uyarıların işareti geri alınır (sonraki deneme / restart rebuild'i tekrar gönderebilsin)
+_UNMARK_SQL = text("""
+DELETE FROM admin_notifications_log
+WHERE channel = :ch AND type = :typ AND period_key = ANY(CAST(:pks AS text[]))
+""")
+
+# Telegram mesaj sınırı 4096; başlık + pay için altında kalınır. Talep metni satır başına kısaltılır.
+_MSG_MAX = 4000
+_ORIGIN_TEXT_MAX = 80
+# Gönderim hatasında tekrar deneme aralığı (sn)
+_RETRY_SEC = 60
+
+
+def _epoch(ts: datetime) -> float:
+    # DB'deki zamanlar naive UTC, ingest'ten gelenler aware
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _md_text(s: str | None) -> str:
+    """Müşteri metni → tek satır, kısaltılmış, Markdown (legacy) özel karakterleri kaçışlı."""
+    s = " ".join((s or "").split())
+    if len(s) > _ORIGIN_TEXT_MAX:
+        s = s[: _ORIGIN_TEXT_MAX - 1].rstrip() + "…"
+    if not s:
+        return "—"
+    for ch in ("_", "*", "`", "["):
+        s = s.replace(ch, "\\" + ch)
+    return s
+
+
+def _tg_len(s: str) -> int:
+    return len(s.encode("utf-16-le")) // 2  # Telegram uzunluğu UTF-16 birimiyle sayar
+
+
+def _chunks(header: List[str], lines: List[str], limit: int = _MSG_MAX) -> List[Tuple[str, int, int]]:
+    """Satırları limit'i aşmayan mesajlara böler; (metin, ilk satır idx, son idx hariç) döner."""
+    out: List[Tuple[str, int, int]] = []
+    base = "\n".join(header)
+    buf, start, size = [], 0, _tg_len(base)
+    for i, line in enumerate(lines):
+        n = 1 + _tg_len(line)
+        if buf and size + n > limit:
+            out.append(("\n".join([base, *buf]), start, i))
+            buf, start, size = [], i, _tg_len(base)
+        buf.append(line)
+        size += n
+    if buf:
+        out.append(("\n".join([base, *buf]), start, len(lines)))
+    return out
+
+
+def _mmss(seconds: float) -> str:
+    s = int(max(0.0, seconds))
+    return f"{s//60:02d}:{s%60:02d}"
+
+
+class SlaWatchdog:
+    """
+    İlk yanıt SLA'sı için süreç içi zamanlayıcı (min-heap, anahtar = origin_ts + eşik).
+    - observe(): ingest'te yazılan eventler; origin → kur, reply_first / kapanış → temizle (O(log n))
+    - arka plan thread'i en yakın süreye kadar uyur; süre dolan thread'ler DB'den son kez
+      doğrulanır ve kanal grubuna tek mesajda bildirilir
+    - rebuild(): restart sonrası son N saatin yanıtsız origin'lerinden yeniden kurar
+    Temizlenen kayıtlar heap'ten hemen silinmez (lazy); heap şişince yeniden kurulur.
+    """
+
+    def __init__(self, first_sec: int = 30, channels: Sequence[str] = ("bonus",), rebuild_hours: int = 6):
+        self.first_sec = max(1, int(first_sec))
+        self.channels = tuple(ch for ch in channels if ch in CHANNELS)
+        self.rebuild_hours = max(0, int(rebuild_hours))
+        self._heap: List[Tuple[float, str]] = []
+        self._pending: Dict[str, Tuple[float, str]] = {}   # corr → (deadline, kanal)
+        self._cv = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._stopping = False
+        self.stats = {"armed": 0, "cleared": 0, "due": 0, "alerted": 0, "stale": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self) -> None:
+        with self._cv:
+            if self.running:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="sla-watchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cv:
+            if not self.running:
+                return
+            self._stopping = True
+            self._cv.notify()
+        self._thread.join(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cv:
+            nxt = self._heap[0][0] if self._pending and self._heap else None
+            return {
+                **self.stats,
+                "pending": len(self._pending),
+                "heap": len(self._heap),
+                "next_due_in_sec": round(max(0.0, nxt - time.time()), 1) if nxt is not None else None,
+                "first_sec": self.first_sec,
+                "channels": list(self.channels),
+                "running": self.running,
+            }
+
+    # ---------------- besleme ----------------
+    def observe(self, events: Iterable[Dict[str, Any]]) -> None:
+        """Yeni yazılmış event satırları (events kolon adlarıyla dict). Çalışmıyorsa no-op."""
+        if not self.running:
+            return
+        with self._cv:
+            wake = False
+            for ev in events:
+                ch = ev.get("source_channel")
+                if ch not in self.channels:
+                    continue
+                typ = ev.get("type")
+                if typ == "origin":
+                    wake |= self._arm(ev["correlation_id"], ch, _epoch(ev["ts"]) + self.first_sec)
+                elif typ == "reply_first" or typ in CLOSE_TYPES:
+                    if self._pending.pop(ev["correlation_id"], None) is not None:
+                        self.stats["cleared"] += 1
+            self._maybe_compact()
+            if wake:
+                self._cv.notify()
+
+    def rebuild(self, db: Session) -> int:
+        """Son rebuild_hours saatin yanıtsız origin'lerini heap'e yükler (süresi geçmişler hemen kontrol edilir)."""
+        if not self.channels or not self.rebuild_hours:
+            return 0
+        since = datetime.now(timezone.utc) - timedelta(hours=self.rebuild_hours)
+        rows = db.execute(_REBUILD_SQL, {"chs": list(self.channels), "since": since}).all()
+        with self._cv:
+            for corr, ch, origin_ts in rows:
+                self._arm(corr, ch, _epoch(origin_ts) + self.first_sec)
+            self._cv.notify()
+        return len(rows)
+
+    # ---------------- internal ----------------
+    def _arm(self, corr: str, ch: str, deadline: float) -> bool:
+        cur = self._pending.get(corr)
+        if cur is not None and cur[0] <= deadline:
+            return False
+        self._pending[corr] = (deadline, ch)
+        heapq.heappush(self._heap, (deadline, corr))
+        self.stats["armed"] += 1
+        return self._heap[0][1] == corr
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 2 * len(self._pending) + 1024:
+            self._heap = [(d, c) for c, (d, _) in self._pending.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self) -> List[Tuple[str, str]] | None:
+        """Süresi dolanları döner; bekleme gerekiyorsa koşul üzerinde uyur. Durdurulunca None."""
+        with self._cv:
+            while not self._stopping:
+                while self._heap:
+                    deadline, corr = self._heap[0]
+                    cur = self._pending.get(corr)
+                    if cur is None or cur[0] != deadline:
+                        heapq.heappop(self._heap)   # temizlenmiş / ertelenmiş kayıt
+                        continue
+                    break
+                if not self._heap:
+                    self._cv.wait()
+                    continue
+                wait = self._heap[0][0] - time.time()
+                if wait > 0:
+                    self._cv.wait(wait)
+                    continue
+                now = time.time()
+                due: List[Tuple[str, str]] = []
+                while self._heap and self._heap[0][0] <= now:
+                    deadline, corr = heapq.heappop(self._heap)
+                    cur = self._pending.get(corr)
+                    if cur is not None and cur[0] == deadline:
+                        del self._pending[corr]
+                        due.append((corr, cur[1]))
+                if due:
+                    self.stats["due"] += len(due)
+                    return due
+            return None
+
+    def _run(self) -> None:
+        while True:
+            due = self._pop_due()
+            if due is None:
+                return
+            try:
+                self._alert(due)
+            except Exception as e:
+                self.stats["failed"] += len(due)
+                print(f"[sla-watchdog] alert err ({len(due)} kayıt): {e}")
+
+    def _alert(self, due: List[Tuple[str, str]]) -> None:
+        db = SessionLocal()
+        try:
+            rows = db.execute(_STILL_WAITING_SQL, {"corrs": [c for c, _ in due]}).mappings().all()
+            self.stats["stale"] += len(due) - len(rows)
+
+            by_ch: Dict[str, List[Dict[str, Any]]] = {}
+            enabled: Dict[str, bool] = {}
+            for r in rows:
+                ch = r["source_channel"]
+                if ch not in enabled:
+                    enabled[ch] = bool(get_bool(db, CHANNELS[ch][1], False))
+                if not enabled[ch]:
+                    continue
+                # tek uyarı garantisi: log'a ilk yazan gönderir
+                if db.execute(_MARK_SQL, {"ch": ch, "typ": ALERT_TYPE, "pk": r["correlation_id"][:64]}).first():
+                    by_ch.setdefault(ch, []).append(r)
+            db.commit()
+        finally:
+            db.close()
+
+        now = time.time()
+        for ch, items in by_ch.items():
+            header = [f"⏰ *{CHANNELS[ch][0]} • İlk KT {self.first_sec} sn'yi aştı*", ""]
+            lines = []
+            for r in items:
+                origin_hm = r["origin_ts"].replace(tzinfo=timezone.utc).astimezone(IST).strftime("%H:%M")
+                waited = _mmss(now - _epoch(r["origin_ts"]))
+                lines.append(f"• {origin_hm} {_md_text(r.get('origin_text'))} — _bekliyor {waited}_")
+            for message, lo, hi in _chunks(header, lines):
+                if send_channel_report(ch, message):
+                    self.stats["alerted"] += hi - lo
+                else:
+                    self.stats["failed"] += hi - lo
+                    self._retry(ch, items[lo:hi], now)
+
+    def _retry(self, ch: str, items: List[Dict[str, Any]], now: float) -> None:
+        """Gönderilemeyen uyarılar: log işareti silinir, rebuild penceresindekiler _RETRY_SEC sonra tekrar kurulur."""
+        db = SessionLocal()
+        try:
+            db.execute(_UNMARK_SQL, {"ch": ch, "typ": ALERT_TYPE, "pks": [r["correlation_id"][:64] for r in items]})
+            db.commit()
+        finally:
+            db.close()
+        horizon = now - self.rebuild_hours * 3600
+        with self._cv:
+            for r in items:
+                if _epoch(r["origin_ts"]) >= horizon:
+                    self._arm(r["correlation_id"], ch, now + _RETRY_SEC)
+            self._cv.notify()
+
+sla_watchdog = SlaWatchdog(
+    first_sec=settings.SLA_WATCHDOG_FIRST_SEC,
+    channels=[c.strip() for c in settings.SLA_WATCHDOG_CHANNELS.split(",") if c.strip()],
+    rebuild_hours=settings.SLA_WATCHDOG_REBUILD_HOURS,
+)
@@ -0,0 +1,233 @@
+# apps/api/app/services/telegram_ingest.py
+from __future__ import annotations
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.events import RawMessage, Event
+from app.services.identity_resolver import publish_staged, resolve_many
+from app.services.reply_roots import roots_for_batch
+from app.services.sla_watchdog import sla_watchdog
+from app.services.threads_service import upsert_thread_events
+
+_STOP = object()
+
+
+def write_batch(db: Session, recs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Parse edilmiş webhook kayıtlarını (routes_telegram._parse_update çıktısı) tek seferde yazar:
+      - identity: tek SELECT (+ gerekirse pending INSERT)
+      - raw_messages / events: çok satırlı INSERT ... ON CONFLICT DO NOTHING
+      - threads: yalnızca gerçekten eklenen eventler için upsert
+    Commit çağırana aittir; commit sonrası publish_staged(db) ve sla_watchdog.observe(new_events)
+    çağrılmalı (rollback olursa ikisi de yapılmaz; sync yol ile aynı sıra).
+    """
+    if not recs:
+        return {"raw": 0, "events": 0, "new_events": []}
+
+    hints: Dict[str, str | None] = {}
+    for r in recs:
+        key = r["actor_key"]
+        if key != "unknown" and not hints.get(key):
+            hints[key] = r["name_hint"]
+    emp_by_key = resolve_many(db, hints)
+    roots = roots_for_batch(db, [(r["chat_id"], r["msg_id"], r["parent_msg_id"]) for r in recs])
+
+    raw_rows: Dict[tuple, Dict[str, Any]] = {}
+    ev_rows: Dict[tuple, Dict[str, Any]] = {}
+    for r in recs:
+        # aynı batch içinde tekrar gelen update'lerde ilk gelen kazanır (sync yol ile aynı)
+        raw_rows.setdefault((r["chat_id"], r["msg_id"]), {
+            "update_id": r["update_id"],
+            "chat_id": r["chat_id"],
+            "msg_id": r["msg_id"],
+            "from_user_id": r["from_user_id"],
+            "from_username": r["from_username"],
+            "ts": r["ts"],
+            "channel_tag": r["channel_tag"],
+            "kind": r["kind"],
+            "parent_msg_id": r["parent_msg_id"],
+            "root_msg_id": roots.get((r["chat_id"], r["msg_id"])),
+            "json": r["json"],
+        })
+        ev_rows.setdefault((r["correlation_id"], r["ev_type"]), {
+            "source_channel": r["channel_tag"],
+            "type": r["ev_type"],
+            "chat_id": r["chat_id"],
+            "msg_id": r["msg_id"],
+            "correlation_id": r["correlation_id"],
+            "parent_msg_id": r["parent_msg_id"],
+            "root_msg_id": roots.get((r["chat_id"], r["msg_id"])),
+            "ts": r["ts"],
+            "from_user_id": r["from_user_id"],
+            "from_username": r["from_username"],
+            "employee_id": emp_by_key.get(r["actor_key"]),
+            "payload_json": r["payload"],
+        })
+
+    db.execute(
+        pg_insert(RawMessage).on_conflict_do_nothing(constraint="uq_rawmsg_chat_msg"),
+        list(raw_rows.values()),
+    )
+    inserted = db.execute(
+        pg_insert(Event)
+        .on_conflict_do_nothing(constraint="uq_event_corr_type")
+        .returning(Event.correlation_id, Event.type),
+        list(ev_rows.values()),
+    ).all()
+    new_events = [ev_rows[(c, t)] for c, t in inserted]
+    upsert_thread_events(db, new_events)
+    return {"raw": len(raw_rows), "events": len(ev_rows), "new_events": new_events}
+
+
+class IngestWriter:
+    """
+    Webhook kuyruğu + arka plan yazıcı thread.
+    - submit(): event loop'u bloklamadan kuyruğa atar (doluysa False)
+    - batch_size dolunca ya da ilk kayıttan flush_ms sonra toplu yazar
+    - stop(): kuyrukta kalanları yazıp thread'i kapatır (shutdown hook)
+    """
+
+    def __init__(self, batch_size: int = 200, flush_ms: int = 500, maxsize: int = 10000):
+        self.batch_size = max(1, batch_size)
+        self.flush_sec = max(0.01, flush_ms / 1000.0)
+        self._q: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()  # submit (event loop) / yazıcı / snapshot aynı anda günceller-okur
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "failed": 0, "rejected": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="tg-ingest-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, rec: Dict[str, Any]) -> bool:
+        if not self.running:
+            return False
+        try:
+            self._q.put_nowait(rec)
+        except queue.Full:
+            self._inc(rejected=1)
+            return False
+        self._inc(queued=1)
+        return True
+
+    def stop(self, timeout: float = 30.0) -> None:
+        with self._lock:
+            if not self.running:
+                return
+            self._q.put(_STOP)
+            self._thread.join(timeout)
+            if not self.running:
+                return
+            # yazıcı süre içinde bitiremedi: kabul edilmiş (200 dönülmüş) kayıtlar bu thread'de yazılır
+            rest = self._drain()
+            print(f"[tg-ingest] stop: writer {timeout}s içinde bitmedi, kalan {len(rest)} kayıt senkron yazılıyor")
+            self._flush_all(rest)
+            self._q.put(_STOP)  # _drain işareti de aldı; yazıcı elindeki batch'ten sonra çıksın
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {**stats, "pending": self._q.qsize(), "running": self.running}
+
+    def _inc(self, **counts: int) -> None:
+        with self._stats_lock:
+            for k, n in counts.items():
+                self.stats[k] += n
+
+    # ---------------- internal ----------------
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._q.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.flush_sec
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._q.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+        # shutdown: kuyrukta kalan her şeyi yaz
+        self._flush_all(self._drain())
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        rest = []
+        while True:
+            try:
+                item = self._q.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        return rest
+
+    def _flush_all(self, items: List[Dict[str, Any]]) -> None:
+        for i in range(0, len(items), self.batch_size):
+            self._flush(items[i:i + self.batch_size])
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            out = write_batch(db, batch)
+            db.commit()
+            publish_staged(db)
+            sla_watchdog.observe(out["new_events"])
+            self._inc(written=len(batch), batches=1)
+            return
+        except Exception as e:
+            db.rollback()
+            print(f"[tg-ingest] batch err ({len(batch)} kayıt), tek tek deneniyor: {e}")
+        finally:
+            db.close()
+
+        # Hatalı bir kayıt tüm batch'i düşürmesin
+        for rec in batch:
+            db = SessionLocal()
+            try:
+                out = write_batch(db, [rec])
+                db.commit()
+                publish_staged(db)
+                sla_watchdog.observe(out["new_events"])
+                self._inc(written=1)
+            except Exception as e:
+                db.rollback()
+                self._inc(failed=1)
+                print(f"[tg-ingest] drop chat={rec.get('chat_id')} msg={rec.get('msg_id')}: {e}")
+            finally:
+                db.close()
+
+
+ingest_writer = IngestWriter(
+    batch_size=settings.TG_INGEST_BATCH_SIZE,
+    flush_ms=settings.TG_INGEST_FLUSH_MS,
+    maxsize=settings.TG_INGEST_QUEUE_MAX,
+)
+
+
+def queue_mode_enabled() -> bool:
+    return (settings.TG_INGEST_MODE or "").strip().lower() == "queue"
@@ -4,6 +4,7 @@ from app.core.admin_tasks_config import (
     ADMIN_TASKS_TG_TOKEN,
     ADMIN_TASKS_TG_CHAT_ID,
     BONUS_TG_CHAT_ID,
+    FINANCE_TG_CHAT_ID,
 )
 
 def _post(chat_id: int | str, text: str, parse_mode: str = "Markdown") -> bool:
@@ -35,3 +36,15 @@ def send_bonus_to_both(text: str, parse_mode: str = "Markdown") -> bool:
     ok_bonus = send_bonus(text, parse_mode=parse_mode)
     ok_general = send_text(text, parse_mode=parse_mode)
     return bool(ok_bonus or ok_general)
+
+def send_finance(text: str, parse_mode: str = "Markdown") -> bool:
+    """Finans’a özel grup (FINANCE_TG_CHAT_ID). Tanımlı değilse False döner."""
+    if not FINANCE_TG_CHAT_ID:
+        return False
+    return _post(FINANCE_TG_CHAT_ID, text, parse_mode=parse_mode)
+
+def send_finance_to_both(text: str, parse_mode: str = "Markdown") -> bool:
+    """Finans mesajını hem genel gruba hem finans grubuna yollar (en az biri başarılıysa True)."""
+    ok_finance = send_finance(text, parse_mode=parse_mode)
+    ok_general = send_text(text, parse_mode=parse_mode)
+    return bool(ok_finance or ok_general)
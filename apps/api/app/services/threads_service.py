@@ -0,0 +1,153 @@
+# apps/api/app/services/threads_service.py
+from __future__ import annotations
+from datetime import datetime
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+CLOSE_TYPES = ("reply_close", "approve", "reject")
+THREAD_EVENT_TYPES = ("origin", "reply_first") + CLOSE_TYPES
+
+
+def _earlier(col: str) -> str:
+    return f"(EXCLUDED.{col} IS NOT NULL AND (t.{col} IS NULL OR EXCLUDED.{col} < t.{col}))"
+
+
+# threads çakışma birleştirmesi (ingest upsert'i ve threads_rebuild ortak): her alan grubunda daha erken ts
+# kazanır, NULL hiçbir zaman mevcut değeri silmez; aynı ts'te boş employee alanı doldurulur (sonradan bind).
+# Eşzamanlı yazımlar sırası ne olursa olsun aynı sonuca varır.
+MERGE_SET_SQL = f"""
+  source_channel     = COALESCE(t.source_channel, EXCLUDED.source_channel),
+  chat_id            = COALESCE(t.chat_id, EXCLUDED.chat_id),
+  origin_ts          = CASE WHEN {_earlier('origin_ts')} THEN EXCLUDED.origin_ts ELSE t.origin_ts END,
+  origin_msg_id      = CASE WHEN {_earlier('origin_ts')} THEN EXCLUDED.origin_msg_id ELSE t.origin_msg_id END,
+  first_reply_ts     = CASE WHEN {_earlier('first_reply_ts')} THEN EXCLUDED.first_reply_ts ELSE t.first_reply_ts END,
+  first_reply_emp    = CASE WHEN {_earlier('first_reply_ts')} THEN EXCLUDED.first_reply_emp
+                            WHEN EXCLUDED.first_reply_ts = t.first_reply_ts THEN COALESCE(t.first_reply_emp, EXCLUDED.first_reply_emp)
+                            ELSE t.first_reply_emp END,
+  first_close_ts     = CASE WHEN {_earlier('first_close_ts')} THEN EXCLUDED.first_close_ts ELSE t.first_close_ts END,
+  close_type         = CASE WHEN {_earlier('first_close_ts')} THEN EXCLUDED.close_type ELSE t.close_type END,
+  closer_emp         = CASE WHEN {_earlier('first_close_ts')} THEN EXCLUDED.closer_emp
+                            WHEN EXCLUDED.first_close_ts = t.first_close_ts THEN COALESCE(t.closer_emp, EXCLUDED.closer_emp)
+                            ELSE t.closer_emp END,
+  first_close_msg_id = CASE WHEN {_earlier('first_close_ts')} THEN EXCLUDED.first_close_msg_id ELSE t.first_close_msg_id END,
+  updated_at         = now() AT TIME ZONE 'UTC'"""
+
+# Her event yalnızca kendi alan grubunu doldurur; çakışmada MERGE_SET_SQL kuralları geçerli
+# (events üzerindeki MIN(ts) / DISTINCT ON (corr) ORDER BY ts ile aynı sonuç).
+# İlk yanıt / kapanış daha erkene kayarsa eski saat metrics_hourly_dirty'ye yazılır (rollup orayı da tazeler).
+_UPSERT_SQL = text(f"""
+WITH prev AS (
+  INSERT INTO metrics_hourly_dirty (source_channel, hour)
+  SELECT p.source_channel, date_trunc('hour', v.ts)
+  FROM threads p
+  CROSS JOIN LATERAL (VALUES
+    (CASE WHEN p.first_reply_ts > :first_reply_ts THEN p.first_reply_ts END),
+    (CASE WHEN p.first_close_ts > :first_close_ts THEN p.first_close_ts END)
+  ) AS v(ts)
+  WHERE p.correlation_id = :corr AND v.ts IS NOT NULL
+  ON CONFLICT DO NOTHING
+)
+INSERT INTO threads AS t (
+  correlation_id, source_channel, chat_id,
+  origin_ts, origin_msg_id,
+  first_reply_ts, first_reply_emp,
+  first_close_ts, close_type, closer_emp, first_close_msg_id,
+  updated_at
+) VALUES (
+  :corr, :ch, :chat_id,
+  :origin_ts, :origin_msg_id,
+  :first_reply_ts, :first_reply_emp,
+  :first_close_ts, :close_type, :closer_emp, :first_close_msg_id,
+  now() AT TIME ZONE 'UTC'
+)
+ON CONFLICT (correlation_id) DO UPDATE SET
+{MERGE_SET_SQL}
+""")
+
+
+def _thread_params(ev: Dict[str, Any]) -> Dict[str, Any]:
+    typ = ev["type"]
+    is_origin = typ == "origin"
+    is_first = typ == "reply_first"
+    is_close = typ in CLOSE_TYPES
+    return {
+        "corr": ev["correlation_id"],
+        "ch": ev["source_channel"],
+        "chat_id": ev["chat_id"],
+        "origin_ts": ev["ts"] if is_origin else None,
+        "origin_msg_id": ev["msg_id"] if is_origin else None,
+        "first_reply_ts": ev["ts"] if is_first else None,
+        "first_reply_emp": ev["employee_id"] if is_first else None,
+        "first_close_ts": ev["ts"] if is_close else None,
+        "close_type": typ if is_close else None,
+        "closer_emp": ev["employee_id"] if is_close else None,
+        "first_close_msg_id": ev["msg_id"] if is_close else None,
+    }
+
+
+def upsert_thread_events(db: Session, events: Iterable[Dict[str, Any]]) -> int:
+    """
+    Yeni yazılmış event satırlarını (events kolon adlarıyla dict) threads'e işler.
+    Yalnızca gerçekten INSERT edilen eventler verilmeli (ON CONFLICT ile düşenler değil).
+    Commit çağırana aittir.
+    """
+    params: List[Dict[str, Any]] = [_thread_params(e) for e in events if e["type"] in THREAD_EVENT_TYPES]
+    if params:
+        db.execute(_UPSERT_SQL, params)
+    return len(params)
+
+
+# Actor'ın eşlenmemiş eventlerine employee_id yazar ve aynı statement'ta yalnızca dokunulan
+# thread'lerin first_reply_emp / closer_emp boşluklarını doldurur (satırlar istemciye taşınmaz).
+_ATTRIBUTE_SQL = {
+    col: text(f"""
+WITH upd AS (
+  UPDATE events SET employee_id = :emp
+  WHERE {col} = :actor
+    AND employee_id IS NULL
+    AND (CAST(:since AS TIMESTAMP) IS NULL OR ts >= :since)
+  RETURNING correlation_id, type
+),
+c AS (
+  SELECT correlation_id, bool_or(type = 'reply_first') AS has_first, array_agg(type) AS types
+  FROM upd GROUP BY correlation_id
+),
+thr AS (
+  UPDATE threads t SET
+    first_reply_emp = CASE WHEN t.first_reply_emp IS NULL AND c.has_first THEN :emp ELSE t.first_reply_emp END,
+    closer_emp      = CASE WHEN t.closer_emp IS NULL AND t.close_type = ANY(c.types) THEN :emp ELSE t.closer_emp END,
+    updated_at      = now() AT TIME ZONE 'UTC'
+  FROM c
+  WHERE t.correlation_id = c.correlation_id
+    AND ((t.first_reply_emp IS NULL AND c.has_first) OR (t.closer_emp IS NULL AND t.close_type = ANY(c.types)))
+  RETURNING 1
+)
+SELECT (SELECT COUNT(*) FROM upd), (SELECT COUNT(*) FROM thr)
+""")
+    for col in ("from_user_id", "from_username")
+}
+
+
+def attribute_actor_events(
+    db: Session,
+    employee_id: str,
+    from_user_id: int | None = None,
+    from_username: str | None = None,
+    since: datetime | None = None,
+) -> Dict[str, int]:
+    """
+    /identities/bind: actor'ın (uid ya da username) since'ten beri (None → tüm geçmiş)
+    employee_id'si boş eventlerini tek UPDATE ile bağlar. Commit çağırana aittir.
+    """
+    if from_user_id is not None:
+        col, actor = "from_user_id", from_user_id
+    elif from_username:
+        col, actor = "from_username", from_username
+    else:
+        return {"events": 0, "threads": 0}
+    ev, thr = db.execute(
+        _ATTRIBUTE_SQL[col], {"emp": employee_id, "actor": actor, "since": since}
+    ).one()
+    return {"events": int(ev), "threads": int(thr)}
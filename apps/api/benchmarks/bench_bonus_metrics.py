@@ -0,0 +1,174 @@
+# apps/api/benchmarks/bench_bonus_metrics.py
+"""
+Bonus gün sonu / 2 saatlik context gecikmesi — geçmiş büyürken (1M → 20M event).
+
+Çalıştırma (apps/api içinden, BOŞ/ATILABİLİR bir veritabanına karşı):
+    python -m benchmarks.bench_bonus_metrics --dsn postgresql+psycopg2://u:p@host/bench \
+        [--sizes 1000000,5000000,10000000,20000000] [--repeat 5] [--legacy] [--reset]
+
+Her adımda geçmiş GERİYE doğru büyütülür (bugünün penceresi sabit kalır), sonra
+compute_bonus_daily_context / compute_bonus_periodic_context süreleri ölçülür
+(metrics_hourly önce ölçüm dışında tazelenir; ölçülen süre rollup sınırı sorgusu + toplamadır).
+--legacy: events üzerinde tüm geçmişi toplayan eski CTE'yi de ölçer (büyük boyutlarda yavaştır).
+"""
+from __future__ import annotations
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+
+
+def _setup_env(dsn: str) -> None:
+    # app.* importlarından ÖNCE: settings DATABASE_URL'i import anında okur
+    os.environ["DATABASE_URL"] = dsn
+    os.environ.setdefault("JWT_SECRET", "bench")
+
+
+# ---------------- eski sorgu (bonus_metrics_service'in önceki hali) ----------------
+LEGACY_DAILY_SQL = """
+WITH
+origin AS (
+  SELECT e.correlation_id AS corr, MIN(e.ts) AS origin_ts
+  FROM events e WHERE e.source_channel='bonus' AND e.type='origin' GROUP BY 1
+),
+fr AS (
+  SELECT e.correlation_id AS corr, MIN(e.ts) AS first_ts
+  FROM events e WHERE e.source_channel='bonus' AND e.type='reply_first' GROUP BY 1
+),
+fc AS (
+  SELECT DISTINCT ON (e.correlation_id) e.correlation_id AS corr, e.employee_id AS closer_emp, e.ts AS close_ts
+  FROM events e WHERE e.source_channel='bonus' AND e.type IN ('approve','reply_close','reject')
+  ORDER BY e.correlation_id, e.ts
+),
+day_fr AS (
+  SELECT fr.corr, fr.first_ts, o.origin_ts FROM fr JOIN origin o ON o.corr=fr.corr
+  WHERE fr.first_ts >= :frm AND fr.first_ts <= :to
+),
+day_fc AS (
+  SELECT fc.corr, fc.closer_emp, fc.close_ts FROM fc WHERE fc.close_ts >= :frm AND fc.close_ts <= :to
+)
+SELECT (SELECT COUNT(*) FROM day_fc) AS total_close,
+       (SELECT AVG(EXTRACT(EPOCH FROM (first_ts - origin_ts))) FROM day_fr) AS avg_first_sec
+"""
+
+# ---------------- sentetik veri ----------------
+# Thread g: origin = now - g*spacing; reply_first +10..129 sn; approve +60..1859 sn.
+# g büyüdükçe thread eskir → yeni adımlar geçmişi geriye uzatır.
+_GEN_EVENTS_SQL = """
+INSERT INTO events (source_channel, type, chat_id, msg_id, correlation_id, ts,
+                    from_user_id, employee_id, payload_json, inserted_at)
+SELECT 'bonus', t.typ, -100, (g * 3 + t.k)::int, '-100:' || (g * 3),
+       :now - make_interval(secs => g * :spacing)
+            + CASE t.k WHEN 0 THEN interval '0'
+                       WHEN 1 THEN make_interval(secs => 10 + (g * 7919) % 120)
+                       ELSE make_interval(secs => 60 + (g * 104729) % 1800) END,
+       1000 + g % 20, 'BENCH-' || (g % 20), '{}'::json, NOW()
+FROM generate_series(CAST(:lo AS BIGINT), CAST(:hi AS BIGINT) - 1) g
+CROSS JOIN (VALUES ('origin', 0), ('reply_first', 1), ('approve', 2)) AS t(typ, k)
+"""
+
+_GEN_THREADS_SQL = """
+INSERT INTO threads (correlation_id, source_channel, chat_id, origin_ts, origin_msg_id,
+                     first_reply_ts, first_reply_emp, first_close_ts, close_type, closer_emp,
+                     first_close_msg_id, updated_at)
+SELECT '-100:' || (g * 3), 'bonus', -100,
+       :now - make_interval(secs => g * :spacing), (g * 3)::int,
+       :now - make_interval(secs => g * :spacing) + make_interval(secs => 10 + (g * 7919) % 120),
+       'BENCH-' || (g % 20),
+       :now - make_interval(secs => g * :spacing) + make_interval(secs => 60 + (g * 104729) % 1800),
+       'approve', 'BENCH-' || (g % 20), (g * 3 + 2)::int, LOCALTIMESTAMP - interval '1 day'
+FROM generate_series(CAST(:lo AS BIGINT), CAST(:hi AS BIGINT) - 1) g
+"""
+
+
+def _timed(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dsn", required=True, help="SQLAlchemy URL (boş bir bench veritabanı)")
+    ap.add_argument("--sizes", default="1000000,5000000,10000000,20000000", help="event sayıları (artan)")
+    ap.add_argument("--spacing", type=float, default=17.0, help="threadler arası sn (~5k thread/gün)")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--legacy", action="store_true", help="eski tüm-geçmiş CTE'sini de ölç")
+    ap.add_argument("--reset", action="store_true", help="events/threads tablolarını boşaltarak başla")
+    args = ap.parse_args()
+
+    _setup_env(args.dsn)
+    from pytz import timezone
+    from sqlalchemy import text
+    from app.db.base import Base
+    from app.db.session import engine, SessionLocal
+    import app.models.events  # noqa: F401
+    import app.models.models  # noqa: F401
+    from app.services.bonus_metrics_service import (
+        compute_bonus_daily_context, compute_bonus_periodic_context, _ist_day_edges_utc,
+    )
+    from app.services.metrics_rollup import METRICS_HOURLY_WATERMARK_KEY, refresh_metrics_hourly
+    import app.db.models_admin_settings  # noqa: F401
+
+    ist = timezone("Europe/Istanbul")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        # create_all mevcut tabloya sonradan eklenen index'i kurmaz (uygulamada MIGRATIONS_SQL kurar)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_threads_updated_at ON threads(updated_at)"))
+        has_rows = conn.execute(text("SELECT EXISTS (SELECT 1 FROM events)")).scalar()
+        if has_rows and not args.reset:
+            sys.exit("events tablosu dolu; bench için boş bir veritabanı verin ya da --reset kullanın")
+        conn.execute(text("TRUNCATE events, threads, metrics_hourly"))
+        conn.execute(text("DELETE FROM admin_settings WHERE key = :k"), {"k": METRICS_HOURLY_WATERMARK_KEY})
+        conn.execute(text(
+            "INSERT INTO employees (employee_id, full_name, department, status, created_at) "
+            "SELECT 'BENCH-' || i, 'Bench ' || i, 'Bonus', 'active', NOW() FROM generate_series(0, 19) i "
+            "ON CONFLICT DO NOTHING"
+        ))
+
+    now_utc = datetime.utcnow().replace(microsecond=0)
+    now_ist = datetime.now(ist)
+    today = now_ist.date()
+    sizes = sorted(int(x) for x in args.sizes.split(",") if x.strip())
+
+    print(f"{'events':>12} {'daily_ms':>10} {'periodic_ms':>12}" + (f" {'legacy_daily_ms':>16}" if args.legacy else ""))
+    threads_done = 0
+    for size in sizes:
+        target = size // 3
+        step = 500_000
+        for lo in range(threads_done, target, step):
+            hi = min(target, lo + step)
+            with engine.begin() as conn:
+                params = {"lo": lo, "hi": hi, "now": now_utc, "spacing": args.spacing}
+                conn.execute(text(_GEN_EVENTS_SQL), params)
+                conn.execute(text(_GEN_THREADS_SQL), params)
+        threads_done = target
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE events"))
+            conn.execute(text("ANALYZE threads"))
+
+        db = SessionLocal()
+        try:
+            # Üretilen thread'ler "eski" işaretli (updated_at dün) → rollup'ı ölçüm dışında baştan kur
+            refresh_metrics_hourly(db, full=True)
+            daily = _timed(lambda: compute_bonus_daily_context(db, today, 60), args.repeat)
+            periodic = _timed(lambda: compute_bonus_periodic_context(db, now_ist, 2, 30), args.repeat)
+            line = f"{target * 3:>12,} {daily:>10.1f} {periodic:>12.1f}"
+            if args.legacy:
+                frm, to = _ist_day_edges_utc(today)
+                legacy = _timed(
+                    lambda: db.execute(text(LEGACY_DAILY_SQL), {"frm": frm, "to": to}).first(), args.repeat
+                )
+                line += f" {legacy:>16.1f}"
+            print(line, flush=True)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    main()
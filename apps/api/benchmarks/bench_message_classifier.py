@@ -0,0 +1,107 @@
+# apps/api/benchmarks/bench_message_classifier.py
+"""
+Mesaj sınıflandırıcı mikro-benchmark'ı (eski routes_telegram helper'ları vs MessageClassifier).
+
+Çalıştırma (apps/api içinden):
+    python -m benchmarks.bench_message_classifier [--n 200000] [--repeat 5] [--seed 42]
+
+Sentetik Türkçe operatör yanıtlarından bir korpus üretir, önce iki motorun
+birebir aynı sınıfı döndürdüğünü doğrular, sonra saniyedeki mesaj sayısını yazar.
+"""
+from __future__ import annotations
+import argparse
+import random
+import re
+import time
+
+from app.services.message_classifier import MessageClassifier
+
+
+# ---------------- eski motor (routes_telegram'daki önceki hali) ----------------
+def _legacy_norm(s: str) -> str:
+    return (s or "").lower()\
+        .replace("ı","i").replace("ş","s").replace("ğ","g")\
+        .replace("ç","c").replace("ö","o").replace("ü","u")
+
+def _legacy_first_match(text: str) -> bool:
+    s = _legacy_norm(text)
+    return bool(
+        re.search(r"(?:^|\s)k(?:\s|$)", s)
+        or re.search(r"\bk\s*t+\b", s)
+        or re.search(r"\bkt+\b", s)
+        or "bakiyorum" in s
+        or "ilgileniyorum" in s
+        or re.search(r"kontrol(\s+ediyorum)?", s)
+    )
+
+_LEGACY_APPROVE = [r"\bonay\b", r"onayland[ıi]", r"\btamam\b", r"\bok\b", "✅", "👍"]
+_LEGACY_REJECT  = [r"\bred\b", r"\biptal\b", r"\bolumsuz\b", r"\bhata\b", "❌", "🚫"]
+
+def _legacy_is_approve(text: str) -> bool: return any(re.search(p, _legacy_norm(text)) for p in _LEGACY_APPROVE)
+def _legacy_is_reject(text: str) -> bool:  return any(re.search(p, _legacy_norm(text)) for p in _LEGACY_REJECT)
+
+def legacy_classify(text: str) -> str:
+    if _legacy_first_match(text): return "reply_first"
+    if _legacy_is_reject(text): return "reject"
+    if _legacy_is_approve(text): return "approve"
+    return "reply_close"
+
+
+# ---------------- sentetik korpus ----------------
+_FIRST = ["k", "K", "kt", "KT", "k t", "ktt", "Bakıyorum", "bakıyorum hemen", "İlgileniyorum",
+          "kontrol ediyorum", "Kontrol", "k bakıyorum"]
+_APPROVE = ["onay", "Onaylandı", "tamam", "TAMAM yüklendi", "ok", "✅", "👍 yapıldı", "bonus tanımlandı onay"]
+_REJECT = ["red", "RED — IBAN yanlış", "iptal", "olumsuz", "hata var", "❌", "🚫 çevrim eksik",
+           "talep iptal edildi"]
+_CLOSE = ["yüklendi", "Tanımlandı", "çevrim şartı tamamlanmamış", "hesaba geçti", "müşteriye bilgi verildi",
+          "yatırım bulunamadı", "bonus hakkı yok", "işlem yapıldı 500 TL", "Şans bonusu eklendi",
+          "kullanıcı adı hatalı görünüyor değil mi"]
+_FILLER = ["", "", " abi", " hocam", " 🙏", " (12:45)", " @bonusdestek", " lütfen"]
+
+
+def build_corpus(n: int, seed: int) -> list[str]:
+    rnd = random.Random(seed)
+    pools = [(_FIRST, 0.35), (_CLOSE, 0.40), (_APPROVE, 0.15), (_REJECT, 0.10)]
+    words, weights = zip(*pools)
+    out = []
+    for _ in range(n):
+        pool = rnd.choices(words, weights=weights)[0]
+        out.append(rnd.choice(pool) + rnd.choice(_FILLER))
+    return out
+
+
+def _bench(fn, corpus: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for t in corpus:
+            fn(t)
+        best = min(best, time.perf_counter() - t0)
+    return len(corpus) / best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    corpus = build_corpus(args.n, args.seed)
+    clf = MessageClassifier()
+    new_classify = lambda t: clf.classify(t, is_reply=True)
+
+    mismatches = [t for t in corpus if legacy_classify(t) != new_classify(t)]
+    if mismatches:
+        raise SystemExit(f"sınıflandırma farkı: {len(mismatches)} mesaj, örn: {mismatches[:5]!r}")
+
+    before = _bench(legacy_classify, corpus, args.repeat)
+    after = _bench(new_classify, corpus, args.repeat)
+    print(f"corpus={len(corpus)} repeat={args.repeat} (best-of)")
+    print(f"legacy      : {before:,.0f} msg/s")
+    print(f"classifier  : {after:,.0f} msg/s")
+    print(f"speedup     : x{after / before:.2f}")
+
+
+if __name__ == "__main__":
+    main()